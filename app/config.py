@@ -8,7 +8,103 @@ class Settings(BaseSettings):
     """
 
     OPENAI_API_KEY: str
-    REDIS_URL: str
+    REDIS_URL: str  # redis:// URL for SESSION_STORE=redis; the Upstash REST URL for "upstash"
+    REDIS_TOKEN: str = ""  # Upstash REST token (SESSION_STORE=upstash)
+    # Point the OpenAI client at a compatible server (e.g. a local fake for benchmarks).
+    OPENAI_BASE_URL: str | None = None
+
+    # Embedding generation
+    EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    EMBEDDING_BATCH_SIZE: int = 256  # Max inputs per embeddings request (API limit: 2048)
+    EMBEDDING_BATCH_MAX_TOKENS: int = 250_000  # Estimated token budget per request (API limit: 300k)
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # Embedding requests in flight at once
+    EMBEDDING_MAX_RETRIES: int = 3  # Retries per failed sub-batch
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache/embeddings.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200_000  # ~1.2 GB of ada-002 vectors at float32
+
+    # Semantic response cache in front of the analyze_query / recommend_products LLM calls
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.97  # Min cosine similarity between query embeddings
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+
+    # Fetch products for the raw query while analyze_query's LLM call runs
+    SPECULATIVE_RETRIEVAL: bool = True
+
+    # Vector store engine: "chroma" (PersistentClient) or "numpy" (in-process exact index)
+    VECTOR_STORE: str = "chroma"
+    VECTOR_STORE_PATH: str = "./vector_store"  # Where the numpy engine persists its collections
+    VECTOR_STORE_MMAP: bool = False  # Memory-map persisted numpy matrices instead of loading them
+    # Multi-worker serving: ingestion publishes read-only index generations here and every
+    # worker memory-maps the current one (numpy engine). Empty = VECTOR_STORE_PATH / LEXICAL_INDEX_PATH.
+    SHARED_INDEX_PATH: str = ""
+    SHARED_INDEX_POLL_SECONDS: float = 2.0  # How often workers look for a newly published generation
+    SHARED_INDEX_KEEP_GENERATIONS: int = 2
+
+    # Hybrid retrieval: BM25 over product fields fused with vector results (reciprocal rank fusion)
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20  # Candidates taken from each ranking before fusion
+    RRF_K: int = 60
+    LEXICAL_INDEX_PATH: str = "./lexical_index"
+    PRODUCT_N_RESULTS: int = 3  # Products sent to recommend_products
+
+    # Fast-path intent routing: skip analyze_query when keyword rules and the
+    # embedding classifier agree on the turn's intent
+    ROUTER_ENABLED: bool = True
+    ROUTER_MIN_MARGIN: float = 0.02  # Min cosine gap between the best and second-best intent centroid
+
+    # Extra attempts when a JSON-mode LLM reply fails schema validation
+    STRUCTURED_OUTPUT_RETRIES: int = 1
+
+    # Re-ranking of retrieved products before recommend_products
+    RERANK_ENABLED: bool = True
+    RERANK_CANDIDATES: int = 12  # Products retrieved for re-ranking; the best PRODUCT_N_RESULTS are kept
+    RERANK_SCORER: str = "local"  # "local" (lexical + metadata match) or "llm" (one batched LLM call)
+    RERANK_LLM_MODEL: str = "gpt-4o-mini"
+    RERANK_BUDGET_MS: int = 400  # Time allowed for a non-local scorer before the local order is used
+    PRICE_BUCKETS: list[int] = [20, 35, 50]  # Upper bounds of the precomputed price buckets
+
+    # Conversation history
+    HISTORY_TOKEN_BUDGET: int = 1500  # Max tokens of history sent with a prompt
+    HISTORY_KEEP_RECENT_TURNS: int = 6  # Turns kept verbatim when older ones are summarized
+    HISTORY_MAX_STORED_TURNS: int = 100  # Hard cap on turns kept per session in Redis
+    HISTORY_SUMMARY_MODEL: str = "gpt-4o-mini"
+
+    # Session storage
+    SESSION_STORE: str = "upstash"  # "upstash", "redis" (REDIS_URL, pooled) or "memory"
+    SESSION_TTL_SECONDS: int = 3600
+    SESSION_WRITE_BEHIND: bool = True  # Batch session writes off the request path
+    SESSION_WRITE_BEHIND_INTERVAL_MS: int = 50
+    SESSION_WRITE_BEHIND_MAX_BUFFERED: int = 10000  # Turns kept for retry while the store is down; oldest dropped beyond
+    SESSION_MEMORY_MAX_SESSIONS: int = 10000  # LRU bound of the in-memory store
+    REDIS_POOL_SIZE: int = 20
+
+    # Instrumentation
+    RESPONSE_TIMINGS: bool = False  # Attach a per-request timing/token breakdown to every response
+    # USD per million [input, output] tokens, for the cost counters
+    MODEL_PRICES: dict[str, list[float]] = {
+        "gpt-4o": [2.5, 10.0],
+        "gpt-4o-mini": [0.15, 0.6],
+        "text-embedding-ada-002": [0.1, 0.0],
+        "text-embedding-3-small": [0.02, 0.0],
+        "text-embedding-3-large": [0.13, 0.0],
+    }
+
+    # Startup and health checks
+    STARTUP_INGESTION: bool = True  # Refresh the index in the background when the server starts
+    READINESS_TIMEOUT_SECONDS: float = 2.0  # Per dependency check in /readyz
+
+    # Ingestion
+    INGEST_BATCH_SIZE: int = 500  # Documents buffered per vector-store upsert
+    INGEST_READ_CHUNK_ROWS: int = 5000  # Catalogue rows parsed at a time
+    INGEST_PIPELINE_DEPTH: int = 2  # Batches queued per embed/write stage before the reader waits
+    KNOWLEDGE_BASE_DIR: str = ""  # .docx/.md/.txt documents for 'skincare_combined'; empty = bundled data/
+    KB_CHUNKER: str = "structure"  # structure | recursive
+    KB_CHUNK_SIZE: int = 500  # Characters per chunk
+    KB_CHUNK_OVERLAP: int = 80  # Only used where a passage has to be split by size
+    KB_INGEST_WORKERS: int = 0  # Document parser processes; 0 = one per CPU
+    KB_PARALLEL_MIN_FILES: int = 32  # Fewer documents are parsed in-process (each spawned worker takes ~1s to start)
 
     class Config:
         env_file = ".env"
@@ -1,48 +1,150 @@
-from openai import OpenAI
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-# from upstash_redis import Redis, UpstashError
-from upstash_redis import Redis
+import threading
+import time
+
 from loguru import logger
 from .config import settings
 
 # -----------------------------------------------------------
-# Initialize OpenAI client
+# Lazily initialized clients
 # -----------------------------------------------------------
-try:
-    openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    logger.info("OpenAI client initialized successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize OpenAI client: {e}")
+# Importing this module builds nothing and touches no network: each client (and its
+# SDK import) is created on first use, or by ``warm_up_clients`` in the background
+# once the server has started. A dependency that is down at boot therefore fails
+# readiness checks and the requests that need it, not the worker's startup.
 
-# -----------------------------------------------------------
-# Initialize ChromaDB client
-# -----------------------------------------------------------
-try:
-    chroma_client = chromadb.PersistentClient(
-        path="./chroma_db", settings=ChromaSettings(anonymized_telemetry=False)
-    )
-    logger.info("ChromaDB PersistentClient initialized at './chroma_db'.")
-except Exception as e:
-    logger.error(f"Failed to initialize ChromaDB PersistentClient: {e}")
 
-# -----------------------------------------------------------
-# Initialize Redis client
-# -----------------------------------------------------------
-# try:
-#     redis_client = Redis.from_url(settings.REDIS_URL)
-#     redis_client.ping()
-#     logger.info("Redis client initialized and connected successfully.")
-# # except error as e:
-# #     logger.error(f"Failed to connect to Upstash Redis: {e}")
-# except Exception as e:
-#     logger.error(f"Failed to initialize Redis client: {e}")
-
-
-try:
-    # redis_client = Redis(url=settings.REDIS_URL)
-    redis_client = Redis(url="https://big-wasp-38128.upstash.io", token="AZTwAAIjcDEyYTdlOGM2ZmQ2NmI0NzYyODg0NTNiMDc2MDQ3OTYxM3AxMA")
-    redis_client.ping()
-    logger.info("Redis client initialized and connected successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize Redis client: {e}")
\ No newline at end of file
+class ClientProvider:
+    """
+    Creates a client on first use and forwards attribute access to it, so callers
+    use the provider exactly like the client (``openai_client.embeddings.create``).
+
+    A failed creation is logged and re-raised, and retried on the next use. The
+    optional ``health_check`` takes the client and raises if it is not usable.
+    """
+
+    def __init__(self, name: str, factory, health_check=None):
+        self.name = name
+        self._factory = factory
+        self._health_check = health_check
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._client is not None
+
+    def get(self):
+        """Returns the client, creating it on first use."""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    try:
+                        self._client = self._factory()
+                    except Exception as e:
+                        logger.error(f"Failed to initialize {self.name} client: {e}")
+                        raise
+                    logger.info(f"{self.name} client initialized in {(time.perf_counter() - started) * 1000:.0f} ms.")
+                client = self._client
+        return client
+
+    def check(self):
+        """Creates the client if needed and runs its health check; raises if it is not usable."""
+        client = self.get()
+        if self._health_check is not None:
+            self._health_check(client)
+
+    def reset(self):
+        """Drops the client; the next use creates a new one."""
+        with self._lock:
+            self._client = None
+
+    def __getattr__(self, attr):
+        # Only reached for attributes the provider itself does not have.
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+
+def _openai_client():
+    from openai import OpenAI
+
+    return OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+
+
+def _async_openai_client():
+    from openai import AsyncOpenAI
+
+    # Async client for the request path, so OpenAI calls don't block the event loop.
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+
+
+def _chroma_client():
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+
+    return chromadb.PersistentClient(path="./chroma_db", settings=ChromaSettings(anonymized_telemetry=False))
+
+
+def _vector_store_client():
+    if settings.SHARED_INDEX_PATH:
+        from .services.index_generations import generations
+        from .services.vector_store import NumpyVectorStoreClient
+
+        # Workers map the published generation read-only; the generation watcher
+        # re-points the client when ingestion publishes a new one.
+        current = generations.current()
+        path = generations.directory(current) / "vector_store" if current else None
+        logger.info(f"Serving shared index generation {current} (memory-mapped).")
+        return NumpyVectorStoreClient(str(path) if path else None, mmap=True)
+    if settings.VECTOR_STORE == "numpy":
+        from .services.vector_store import NumpyVectorStoreClient
+
+        logger.info(f"Using in-process NumPy vector store at '{settings.VECTOR_STORE_PATH}'.")
+        return NumpyVectorStoreClient(settings.VECTOR_STORE_PATH, mmap=settings.VECTOR_STORE_MMAP)
+    if settings.VECTOR_STORE == "chroma":
+        return chroma_client.get()
+    raise ValueError(f"Unknown VECTOR_STORE '{settings.VECTOR_STORE}' (expected 'chroma' or 'numpy').")
+
+
+def _vector_store_health(client):
+    # Chroma can report on itself; the NumPy engine is in-process and usable once created.
+    if hasattr(client, "heartbeat"):
+        client.heartbeat()
+
+
+def _redis_client():
+    from upstash_redis import Redis
+
+    return Redis(url=settings.REDIS_URL, token=settings.REDIS_TOKEN)
+
+
+def _async_redis_client():
+    from upstash_redis.asyncio import Redis as AsyncRedis
+
+    return AsyncRedis(url=settings.REDIS_URL, token=settings.REDIS_TOKEN)
+
+
+openai_client = ClientProvider("OpenAI", _openai_client)
+async_openai_client = ClientProvider("Async OpenAI", _async_openai_client)
+chroma_client = ClientProvider("ChromaDB", _chroma_client, health_check=lambda client: client.heartbeat())
+vector_store_client = ClientProvider("Vector store", _vector_store_client, health_check=_vector_store_health)
+# Upstash clients, used when SESSION_STORE is "upstash"; they connect on first command.
+redis_client = ClientProvider("Redis", _redis_client, health_check=lambda client: client.ping())
+async_redis_client = ClientProvider("Async Redis", _async_redis_client)
+
+# Clients the request path needs, created by ``warm_up_clients``.
+SERVING_CLIENTS = [openai_client, async_openai_client, vector_store_client]
+
+
+def warm_up_clients():
+    """
+    Creates the serving clients ahead of the first request. Failures are only
+    logged: the client is retried on first use and readiness reports it.
+    """
+    for provider in SERVING_CLIENTS:
+        try:
+            provider.get()
+        except Exception:
+            pass
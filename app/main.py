@@ -1,25 +1,38 @@
 import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+import threading
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
+from .config import settings
+from .dependencies import warm_up_clients
 from .routers import search
-from scripts.ingest_data import main as ingest_main
-# Create FastAPI app
-app = FastAPI(
-    title="Conversational Search API - V2",
-    description="An improved backend for conversational search and recommendations using Redis, decoupled ingestion, and externalized prompts.",
-    version="2.0.0",
-)
+from .services.embedding_cache import embedding_cache
+from .services.health import check_readiness
+from .services.index_generations import IndexLocked
+from .services.intent_router import intent_router
+from .services.jobs import JobSkipped, ingestion_jobs
+from .services.metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, registry
+from .services.rag import index_watcher
+from .services.semantic_cache import semantic_cache_stats
+from .services.session_store import session_store
+from .utils.pipeline import async_pipeline_registry, reload_pipelines
 
-# Configure CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # IMPORTANT: Restrict this in production!
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+def ingest_main(**kwargs):
+    """
+    Runs ``scripts.ingest_data.main``; the ingestion stack (pandas, python-docx, text
+    splitters) is imported on first run. In shared index mode, a generation already
+    being built by another worker makes the job "skipped" rather than failed.
+    """
+    from scripts.ingest_data import main
+
+    try:
+        return main(**kwargs)
+    except IndexLocked as e:
+        raise JobSkipped(str(e)) from e
 
 #
 # @asynccontextmanager
@@ -47,25 +60,175 @@ app.add_middleware(
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Initializing application lifespan.")
-    try:
-        # Run ingestion in a separate thread to avoid blocking
-        await asyncio.to_thread(ingest_main)
-        logger.success("Skincare data ingested successfully.")
-    except Exception as e:
-        logger.error(f"Error during skincare data ingestion: {e}")
-        # Optionally raise to prevent server startup if ingestion is critical
-        # raise e
+    # Compile the conversation pipeline once; every request reuses it.
+    async_pipeline_registry.build()
+    if index_watcher is not None:
+        # Shared index mode: map the published generation and follow new ones.
+        await asyncio.to_thread(index_watcher.check)
+        index_watcher.start()
+    # Clients are created off the startup path; /readyz reports when they are usable.
+    threading.Thread(target=warm_up_clients, name="warm-up-clients", daemon=True).start()
+    if settings.ROUTER_ENABLED:
+        threading.Thread(target=intent_router.warm_up, name="warm-up-intent-router", daemon=True).start()
+    if settings.STARTUP_INGESTION:
+        # Refresh the index in the background; requests are served from the existing
+        # index meanwhile, so readiness does not wait for ingestion. In shared index
+        # mode every worker tries, the first one to take the ingestion lock builds the
+        # generation and the others' jobs end as "skipped".
+        job, _ = ingestion_jobs.submit(ingest_main, incremental=True)
+        logger.info(f"Startup ingestion running in background as job {job.id}.")
 
     yield
+
+    if active := ingestion_jobs.active():
+        active.cancel()
+    if index_watcher is not None:
+        index_watcher.stop()
+    # Flush session writes still buffered by the write-behind store.
+    session_store.close()
     logger.info("Application shutdown completed.")
 
+# Create FastAPI app
+app = FastAPI(
+    title="Conversational Search API - V2",
+    description="An improved backend for conversational search and recommendations using Redis, decoupled ingestion, and externalized prompts.",
+    version="2.0.0",
+    lifespan=lifespan,
+)
+
+# Configure CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # IMPORTANT: Restrict this in production!
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    """Counts requests and observes their latency, labelled by route template (not raw path)."""
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, path=path)
+        HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+
 # Include API routers
 app.include_router(search.router)
 
-@app.post("/ingest-data")
-async def ingest_data_endpoint():
-    ingest_main()  # Use ingest_main instead of ingest_data
-    return {"message": "Data ingestion completed"}
+@app.post("/ingest-data", status_code=202, tags=["Ingestion"])
+async def ingest_data_endpoint(force: bool = False):
+    """
+    Starts an ingestion job in the background and returns its job ID.
+
+    Only one ingestion runs at a time; if one is already active, 409 is returned
+    with that job's status. In shared index mode, a job started while another
+    worker is building a generation ends as "skipped".
+    """
+    job, created = ingestion_jobs.submit(ingest_main, force=force, incremental=not force)
+    if not created:
+        return JSONResponse(status_code=409, content={"message": "Ingestion already running", **job.to_dict()})
+    return {"message": "Data ingestion started", **job.to_dict()}
+
+
+@app.get("/ingest-data/jobs", tags=["Ingestion"])
+async def list_ingestion_jobs():
+    """
+    Lists recent ingestion jobs, newest first.
+    """
+    return [job.to_dict() for job in ingestion_jobs.list()]
+
+
+@app.get("/ingest-data/jobs/{job_id}", tags=["Ingestion"])
+async def get_ingestion_job(job_id: str):
+    """
+    Returns the status and progress of an ingestion job.
+    """
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.delete("/ingest-data/jobs/{job_id}", tags=["Ingestion"])
+async def cancel_ingestion_job(job_id: str):
+    """
+    Requests cancellation of an ingestion job; it stops at the next batch boundary.
+    """
+    job = ingestion_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.post("/reload-pipeline")
+async def reload_pipeline_endpoint():
+    """
+    Re-reads the prompt files and swaps in a freshly compiled pipeline.
+    """
+    await asyncio.to_thread(reload_pipelines)
+    return {"message": "Pipeline reloaded"}
+
+
+@app.get("/cache/stats", tags=["Status"])
+async def cache_stats():
+    """
+    Hit/miss counters of the persistent embedding cache and the semantic response
+    caches (including the LLM latency the latter have saved).
+    """
+    return {
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "semantic_cache": semantic_cache_stats(),
+    }
+
+
+@app.get("/router/stats", tags=["Status"])
+async def router_stats():
+    """
+    Share of conversation turns the intent router sent down each path (the
+    recommend / follow_up fast paths or the full LLM analysis) and the LLM calls
+    the fast paths saved, in total and per turn.
+    """
+    return intent_router.stats()
+
+
+@app.get("/metrics", tags=["Status"], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Latency histograms and token/cost counters in the Prometheus text format:
+    per pipeline stage, LLM call, embedding request, retrieval and session operation.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz", tags=["Status"])
+async def healthz():
+    """
+    Liveness probe: the process is up and serving. Touches no dependency, so a
+    slow or unreachable backend never gets a healthy worker restarted.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz", tags=["Status"])
+async def readyz():
+    """
+    Readiness probe: the pipeline is compiled, the OpenAI and vector store clients
+    are usable, the product collection has documents and the session store
+    answers. Returns 503 with each check's result until all of them pass.
+    """
+    ready, checks = await check_readiness()
+    content = {"status": "ready" if ready else "not ready", "checks": checks}
+    return JSONResponse(status_code=200 if ready else 503, content=content)
 
 
 @app.get("/", tags=["Status"])
@@ -6,6 +6,7 @@ from loguru import logger
 class SearchRequest(BaseModel):
     query: str
     session_id: str = None
+    include_timings: bool = False  # Attach a per-request timing/token breakdown to the response
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -14,6 +15,25 @@ class SearchRequest(BaseModel):
         )
 
 
+# Hard product constraints extracted from the conversation (price, ingredients, category)
+class ProductConstraints(BaseModel):
+    min_price: float | None = None
+    max_price: float | None = None
+    include_ingredients: list[str] = []  # Products must contain all of these
+    exclude_ingredients: list[str] = []  # Products must contain none of these
+    categories: list[str] = []  # Products must be in one of these
+
+    def is_empty(self) -> bool:
+        return self == ProductConstraints()
+
+
+# Structured reply of the follow_up node (JSON mode), validated before it is applied
+class FollowUpDecision(BaseModel):
+    ready_for_recommendation: bool
+    optimized_query: str = ""  # Retrieval query summarizing the user's needs
+    follow_up_question: str = ""  # Empty when ready_for_recommendation is true
+
+
 # ----------- LangGraph Setup -----------
 
 
@@ -32,6 +52,11 @@ class ConversationState(BaseModel):
         False  # Flag indicating readiness for recommendation
     )
     follow_up_count: int = 0  # Track number of follow-ups
+    prefetched_query: str = ""  # Query the speculative product retrieval ran with
+    prefetched_documents: list = []  # Speculatively retrieved products, consumed by retrieve_documents
+    stage_timings: dict = {}  # Wall time per pipeline stage, in milliseconds
+    constraints: dict = {}  # ProductConstraints pushed down into product retrieval
+    route: str = ""  # Intent router decision: "recommend" / "follow_up" fast path, or "llm"
 
 
     def __init__(self, **data):
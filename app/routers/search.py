@@ -1,51 +1,84 @@
+import asyncio
+import json
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.config import settings
 from app.models.schemas import SearchRequest, ConversationState
-from app.services.session import get_or_create_session, update_session
-from app.utils.pipeline import build_graph
+from app.services.metrics import request_metrics
+from app.services.rag import request_scope
+from app.services.session import aappend_turns, aget_or_create_session, asummarize_session, history_manager
+from app.utils.pipeline import async_pipeline_registry, asummarize_history
 from loguru import logger
 
 router = APIRouter(prefix="/api", tags=["search"])
 
+# Strong references to background summarization tasks until they finish.
+_background_tasks = set()
+
+
+def _record_assistant_turns(conversation_history: list, result: dict):
+    """Appends the assistant's follow-up question and/or recommendation to ``conversation_history``."""
+    follow_up = result.get("follow_up_question")
+    if follow_up:
+        conversation_history.append({"role": "assistant", "content": follow_up})
+        logger.debug(f"Appended assistant response to cache: {follow_up}")
+
+    if result.get("recommendation"):
+        # Append the recommendation content
+        conversation_history.append(
+            {"role": "assistant", "content": f"Recommendation: {result['recommendation']}"}
+        )
+        logger.debug(f"Appended recommendation to conversation history: {result['recommendation'][:50]}...")
+
+
+async def _save_turns(session_id: str, stored_history: list, new_turns: list):
+    """Appends this request's turns and, if the session is over budget, summarizes it in the background."""
+    await aappend_turns(session_id, new_turns)
+    history = stored_history + new_turns
+    if history_manager.turns_to_summarize(history):
+        task = asyncio.create_task(asummarize_session(session_id, history, asummarize_history))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
 
 @router.post("/search")
 async def search(data: SearchRequest):
     """
     Handles search requests, uses Redis for session management, and invokes the graph pipeline.
+
+    Every I/O step (Redis, OpenAI, Chroma via a worker thread) is awaited, so one
+    worker can serve many requests concurrently. With ``include_timings`` (or
+    RESPONSE_TIMINGS) the response carries a per-stage timing and token breakdown.
     """
     try:
-        # 1. Get or create the session and conversation history from Redis
-        session_id, conversation_history = get_or_create_session(data.session_id)
-        logger.info(f"Received search query: '{data.query}' | session_id: {session_id}")
-
-        # 2. Append the user's new query to the history
-        conversation_history.append({"role": "user", "content": data.query})
-
-        # 3. Build and invoke the conversational pipeline
-        product_pipeline = build_graph()
-        logger.debug("Invoking product pipeline with current conversation state.")
-        result = product_pipeline.invoke(
-            ConversationState(conversation=conversation_history, query=data.query)
-        )
+        with request_metrics() as breakdown:
+            # 1. Get or create the session and conversation history from Redis
+            session_id, stored_history = await aget_or_create_session(data.session_id)
+            logger.info(f"Received search query: '{data.query}' | session_id: {session_id}")
+
+            # 2. Add the user's new query and fit the history into the prompt token budget
+            new_turns = [{"role": "user", "content": data.query}]
+            conversation_history = history_manager.fit(stored_history + new_turns)
 
-        # 4. Append the assistant's response to the history
-        follow_up = result.get("follow_up_question")
-        if follow_up:
-            conversation_history.append({"role": "assistant", "content": follow_up})
-            logger.debug(f"Appended assistant response to cache: {follow_up}")
+            # 3. Invoke the shared, already-compiled conversational pipeline
+            product_pipeline = async_pipeline_registry.get()
+            logger.debug("Invoking product pipeline with current conversation state.")
+            with request_scope():
+                result = await product_pipeline.ainvoke(
+                    ConversationState(conversation=conversation_history, query=data.query)
+                )
 
-        # 5. Append the recommendation content
-        if result.get("recommendation"):
-            # Append the recommendation content
-            conversation_history.append(
-                {"role": "assistant", "content": f"Recommendation: {result['recommendation']}"}
-            )
-            logger.debug(f"Appended recommendation to conversation history: {result['recommendation'][:50]}...")
+            # 4. Record the assistant's follow-up and/or recommendation
+            _record_assistant_turns(new_turns, result)
 
-        # 6. Save the updated conversation back to Redis
-        update_session(session_id, conversation_history)
+            # 5. Append the new turns to the session in Redis
+            await _save_turns(session_id, stored_history, new_turns)
 
         # Add session_id to the response
         result["session_id"] = session_id
+        if data.include_timings or settings.RESPONSE_TIMINGS:
+            result["metrics"] = breakdown.to_dict()
 
         logger.success("Search query processed successfully.")
         return result
@@ -53,3 +86,58 @@ async def search(data: SearchRequest):
     except Exception as e:
         logger.error(f"Error processing search query: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _sse(event: str, data: dict) -> str:
+    """Formats one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/search/stream")
+async def search_stream(data: SearchRequest):
+    """
+    Streaming variant of /search using Server-Sent Events.
+
+    Emits a ``session`` event first, ``status`` events as the pipeline moves through
+    its stages (analyzing, retrieving, ...), ``follow_up_token`` / ``recommendation_token``
+    events as the LLM generates text, and finally a ``done`` event carrying the same
+    payload /search returns. The session is saved once the pipeline has finished.
+    """
+    session_id, stored_history = await aget_or_create_session(data.session_id)
+    logger.info(f"Received streaming search query: '{data.query}' | session_id: {session_id}")
+    new_turns = [{"role": "user", "content": data.query}]
+    conversation_history = history_manager.fit(stored_history + new_turns)
+
+    async def event_stream():
+        yield _sse("session", {"session_id": session_id})
+        try:
+            with request_scope(), request_metrics() as breakdown:
+                product_pipeline = async_pipeline_registry.get()
+                result = None
+                async for mode, chunk in product_pipeline.astream(
+                    ConversationState(conversation=conversation_history, query=data.query),
+                    stream_mode=["custom", "values"],
+                ):
+                    if mode == "custom":
+                        event = chunk.pop("event")
+                        yield _sse(event, chunk)
+                    else:
+                        result = chunk
+
+                _record_assistant_turns(new_turns, result)
+                await _save_turns(session_id, stored_history, new_turns)
+                result["session_id"] = session_id
+                if data.include_timings or settings.RESPONSE_TIMINGS:
+                    result["metrics"] = breakdown.to_dict()
+                logger.success("Streaming search query processed successfully.")
+                yield _sse("done", result)
+        except Exception as e:
+            logger.error(f"Error processing streaming search query: {str(e)}", exc_info=True)
+            yield _sse("error", {"detail": "Internal server error"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so events reach the client as they are produced.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
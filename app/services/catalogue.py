@@ -0,0 +1,82 @@
+import math
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+from loguru import logger
+from app.config import settings
+
+
+def _clean(value):
+    """Empty cells come back as NaN (pandas) or None (openpyxl); both become ''."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return value
+
+
+def _iter_csv(file_path: str, chunk_rows: int) -> Iterator[dict]:
+    # chunksize makes read_csv return an iterator of DataFrames of at most chunk_rows rows.
+    with pd.read_csv(file_path, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            for row in chunk.to_dict("records"):
+                yield {key: _clean(value) for key, value in row.items()}
+
+
+def _iter_xlsx(file_path: str) -> Iterator[dict]:
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the sheet XML instead of building the whole workbook.
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name).strip() if name is not None else "" for name in header]
+        for values in rows:
+            if values is None or all(value is None for value in values):
+                continue
+            yield {column: _clean(value) for column, value in zip(columns, values) if column}
+    finally:
+        workbook.close()
+
+
+def _iter_parquet(file_path: str, chunk_rows: int) -> Iterator[dict]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError("Reading Parquet catalogues requires the 'pyarrow' package.") from e
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows):
+        for row in batch.to_pylist():
+            yield {key: _clean(value) for key, value in row.items()}
+
+
+def iter_catalogue_rows(file_path: str, chunk_rows: int | None = None) -> Iterator[dict]:
+    """
+    Yields the rows of a product catalogue as dicts keyed by column name.
+
+    CSV is read in chunks of ``chunk_rows``, ``.xlsx`` with openpyxl's read-only row
+    iterator and Parquet by record batch (needs pyarrow), so memory use does not grow
+    with the file size. Legacy ``.xls`` files can only be loaded whole. Empty cells
+    are returned as ''.
+
+    Args:
+        file_path (str): Path to a .csv, .xlsx, .xls or .parquet file.
+        chunk_rows (int | None): Rows parsed at a time. Defaults to settings.INGEST_READ_CHUNK_ROWS.
+
+    Raises:
+        ValueError: If the file format is not supported.
+    """
+    chunk_rows = chunk_rows or settings.INGEST_READ_CHUNK_ROWS
+    suffix = Path(file_path).suffix.lower()
+    if suffix == ".csv":
+        return _iter_csv(file_path, chunk_rows)
+    if suffix == ".xlsx":
+        return _iter_xlsx(file_path)
+    if suffix == ".parquet":
+        return _iter_parquet(file_path, chunk_rows)
+    if suffix == ".xls":
+        logger.warning(f"'{file_path}' is a legacy .xls file and is loaded whole; convert it to .xlsx to stream it.")
+        df = pd.read_excel(file_path)
+        return ({key: _clean(value) for key, value in row.items()} for row in df.to_dict("records"))
+    raise ValueError(f"Unsupported file format for product catalogue: {suffix}")
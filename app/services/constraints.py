@@ -0,0 +1,315 @@
+import re
+
+from loguru import logger
+from app.config import settings
+from app.models.schemas import ProductConstraints
+from app.services.lexical_index import IndexRegistry
+
+# (category, keywords matched against the product name); first match wins, so
+# more specific categories come first.
+PRODUCT_CATEGORIES = [
+    ("eye cream", ("eye cream",)),
+    ("hair mask", ("hair mask",)),
+    ("shampoo", ("shampoo",)),
+    ("body wash", ("body wash", "shower gel")),
+    ("serum", ("serum",)),
+    ("toner", ("toner",)),
+    ("face mask", ("mask",)),
+    ("exfoliator", ("scrub", "exfoliat", "peel")),
+    ("moisturizer", ("moisturizer", "moisturiser", "cream", "gel", "lotion")),
+    ("tool", ("roller", "brush")),
+]
+
+# Words in a user message that ask for a category.
+_CATEGORY_TERMS = {
+    "eye cream": ("eye cream",),
+    "hair mask": ("hair mask",),
+    "shampoo": ("shampoo",),
+    "body wash": ("body wash", "shower gel"),
+    "serum": ("serum",),
+    "toner": ("toner",),
+    "face mask": ("face mask", "clay mask", "mask"),
+    "exfoliator": ("scrub", "exfoliator", "exfoliant"),
+    "moisturizer": ("moisturizer", "moisturiser", "face cream", "night cream", "cream"),
+    "tool": ("roller",),
+}
+
+# Ingredient words too generic to be a constraint on their own.
+_GENERIC_INGREDIENT_WORDS = frozenset(
+    "extract based natural root seed water leaf blend complex cleanser filter".split()
+)
+
+
+def infer_category(product_name: str) -> str:
+    """Product category from keywords in its name, or 'other'."""
+    name = str(product_name or "").lower()
+    for category, keywords in PRODUCT_CATEGORIES:
+        if any(keyword in name for keyword in keywords):
+            return category
+    return "other"
+
+
+def price_bucket(price: float) -> str:
+    """Label of the PRICE_BUCKETS range containing ``price``, e.g. '20-35' or '50+'."""
+    lower = 0
+    for upper in settings.PRICE_BUCKETS:
+        if price < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}+"
+
+
+def _bucket_range(label: str) -> tuple[float, float]:
+    if label.endswith("+"):
+        return float(label[:-1]), float("inf")
+    lower, upper = label.split("-")
+    return float(lower), float(upper)
+
+
+def ingredient_terms(top_ingredients) -> set:
+    """
+    Normalized ingredient names plus their distinctive single words in singular form
+    ('Essential Oils' -> 'essential oils', 'essential', 'oil').
+    """
+    terms = set()
+    if not isinstance(top_ingredients, str):
+        return terms
+    for ingredient in top_ingredients.split(","):
+        name = " ".join(re.findall(r"[a-z0-9%]+", ingredient.lower()))
+        if not name:
+            continue
+        terms.add(name)
+        for word in name.split():
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            if len(word) >= 3 and word not in _GENERIC_INGREDIENT_WORDS and not word[0].isdigit():
+                terms.add(word)
+    return terms
+
+
+class FacetIndex:
+    """
+    Precomputed product facets for constrained retrieval.
+
+    Maps each ingredient term, price bucket and category to the IDs of the products
+    that have it, so the candidate set for a set of constraints is a few set
+    operations instead of a scan over every product's metadata. Only products in a
+    bucket that straddles a price bound have their price checked individually.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.prices = {}
+        self.ingredients = {}
+        self.price_buckets = {}
+        self.categories = {}
+
+    def build(self, ids: list, metadatas: list) -> "FacetIndex":
+        ingredients, buckets, categories = {}, {}, {}
+        for doc_id, metadata in zip(ids, metadatas):
+            metadata = metadata or {}
+            price = float(metadata.get("price") or 0.0)
+            self.prices[doc_id] = price
+            bucket = metadata.get("price_bucket") or price_bucket(price)
+            buckets.setdefault(bucket, set()).add(doc_id)
+            category = metadata.get("category") or infer_category(metadata.get("product_name"))
+            categories.setdefault(category, set()).add(doc_id)
+            for term in ingredient_terms(metadata.get("top_ingredients")):
+                ingredients.setdefault(term, set()).add(doc_id)
+        self.ids = list(ids)
+        self.ingredients, self.price_buckets, self.categories = ingredients, buckets, categories
+        return self
+
+    @property
+    def vocabulary(self) -> list:
+        """Ingredient terms, longest first so multi-word names match before their words."""
+        return sorted(self.ingredients, key=len, reverse=True)
+
+    def ingredient_ids(self, term: str) -> set:
+        return self.ingredients.get(term, set())
+
+    def _price_ids(self, min_price: float | None, max_price: float | None) -> set:
+        low = float("-inf") if min_price is None else min_price
+        high = float("inf") if max_price is None else max_price
+        selected = set()
+        for label, ids in self.price_buckets.items():
+            bucket_low, bucket_high = _bucket_range(label)
+            if bucket_low >= low and bucket_high <= high:
+                selected |= ids
+            elif bucket_high > low and bucket_low <= high:
+                selected |= {doc_id for doc_id in ids if low <= self.prices[doc_id] <= high}
+        return selected
+
+    def candidate_ids(self, constraints: ProductConstraints) -> set | None:
+        """IDs of the products satisfying ``constraints``, or None if nothing constrains them."""
+        if constraints.is_empty():
+            return None
+        candidates = set(self.ids)
+        if constraints.categories:
+            candidates &= set().union(*(self.categories.get(c, set()) for c in constraints.categories))
+        if constraints.min_price is not None or constraints.max_price is not None:
+            candidates &= self._price_ids(constraints.min_price, constraints.max_price)
+        for term in constraints.include_ingredients:
+            candidates &= self.ingredient_ids(term)
+        for term in constraints.exclude_ingredients:
+            candidates -= self.ingredient_ids(term)
+        return candidates
+
+    def to_dict(self) -> dict:
+        return {
+            "ids": self.ids,
+            "prices": self.prices,
+            "ingredients": {term: sorted(ids) for term, ids in self.ingredients.items()},
+            "price_buckets": {label: sorted(ids) for label, ids in self.price_buckets.items()},
+            "categories": {category: sorted(ids) for category, ids in self.categories.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FacetIndex":
+        index = cls()
+        index.ids = data["ids"]
+        index.prices = data["prices"]
+        index.ingredients = {term: set(ids) for term, ids in data["ingredients"].items()}
+        index.price_buckets = {label: set(ids) for label, ids in data["price_buckets"].items()}
+        index.categories = {category: set(ids) for category, ids in data["categories"].items()}
+        return index
+
+
+facet_indexes = IndexRegistry(settings.LEXICAL_INDEX_PATH, FacetIndex, suffix=".facets")
+
+
+# ----------- Extraction -----------
+
+_AMOUNT = r"(?:\$\s*(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*(?:\$|dollars?|usd|bucks))"
+_PRICE_RANGE = re.compile(
+    r"(?:between\s+\$?\s*(\d+(?:\.\d+)?)\s*(?:and|-|to)\s*\$?\s*(\d+(?:\.\d+)?)"
+    r"|\$\s*(\d+(?:\.\d+)?)\s*(?:-|to)\s*\$?\s*(\d+(?:\.\d+)?))"
+)
+_PRICE_MAX = re.compile(
+    r"(?:under|below|less than|cheaper than|no more than|not more than|at most|max(?:imum)?|up to|within)\s+" + _AMOUNT
+    + r"|budget(?:\s+is|\s+of)?\s*(?:around\s+|about\s+)?\$?\s*(\d+(?:\.\d+)?)"
+)
+_PRICE_MIN = re.compile(r"(?:over|above|more than|at least|starting at|min(?:imum)?)\s+" + _AMOUNT)
+
+_EXCLUDE_CUE = r"(?:without|no|not|free of|free from|avoid\w*|allergic to|sensitive to|don'?t want)\s+(?:any\s+)?(?:[a-z]+\s+){0,2}?"
+_INCLUDE_CUE = r"(?:with|containing|contains?|includ\w*|has|have|want)\s+(?:some\s+)?(?:[a-z]+\s+){0,1}?"
+
+
+def _first_amount(match: re.Match) -> float:
+    return float(next(group for group in match.groups() if group is not None))
+
+
+def _term_pattern(term: str) -> str:
+    stem = term[:-1] if len(term) > 3 and term.endswith("s") else term
+    return re.escape(stem).replace(r"\ ", r"[\s-]+") + r"s?"
+
+
+def _extract_ingredients(text: str, vocabulary: list, include: list, exclude: list):
+    for term in vocabulary:
+        pattern = _term_pattern(term)
+        excluded = re.search(rf"\b{_EXCLUDE_CUE}{pattern}\b|\b{pattern}[\s-]free\b", text)
+        if excluded:
+            if term not in exclude:
+                exclude.append(term)
+            if term in include:
+                include.remove(term)
+            # Blank the match so the words of a multi-word name don't match again.
+            text = text[:excluded.start()] + " " * (excluded.end() - excluded.start()) + text[excluded.end():]
+            continue
+        included = re.search(rf"\b{_INCLUDE_CUE}{pattern}\b", text)
+        if included and term not in exclude:
+            if term not in include:
+                include.append(term)
+            text = text[:included.start()] + " " * (included.end() - included.start()) + text[included.end():]
+
+
+def _extract_categories(text: str, known: set | None) -> list:
+    found = []
+    for category, terms in _CATEGORY_TERMS.items():
+        for term in sorted(terms, key=len, reverse=True):
+            match = re.search(rf"\b{_term_pattern(term)}\b", text)
+            if match:
+                if known is None or category in known:
+                    found.append(category)
+                text = text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+                break
+    return found
+
+
+def extract_constraints(messages: list, facets: FacetIndex | None = None) -> ProductConstraints:
+    """
+    Rule-based extraction of hard product constraints from the user's messages.
+
+    Recognizes price bounds ("under $20", "between 10 and 30 dollars", "budget of 40"),
+    ingredient inclusions and exclusions ("with niacinamide", "no fragrance",
+    "oil-free") and product categories ("a serum", "moisturiser"). Ingredients and
+    categories are only kept if the catalogue's facet index knows them, so they can
+    always be enforced. Later messages override earlier price bounds; ingredient and
+    category constraints accumulate.
+
+    Args:
+        messages (list): User message texts, oldest first.
+        facets (FacetIndex | None): The product facet index, if built.
+
+    Returns:
+        ProductConstraints: The constraints found (empty if none).
+    """
+    constraints = ProductConstraints()
+    vocabulary = facets.vocabulary if facets is not None else []
+    known_categories = set(facets.categories) if facets is not None else None
+    for message in messages:
+        text = str(message or "").lower()
+        if match := _PRICE_RANGE.search(text):
+            bounds = [float(group) for group in match.groups() if group is not None]
+            constraints.min_price, constraints.max_price = min(bounds), max(bounds)
+        else:
+            if match := _PRICE_MAX.search(text):
+                constraints.max_price = _first_amount(match)
+            if match := _PRICE_MIN.search(text):
+                constraints.min_price = _first_amount(match)
+        _extract_ingredients(text, vocabulary, constraints.include_ingredients, constraints.exclude_ingredients)
+        for category in _extract_categories(text, known_categories):
+            if category not in constraints.categories:
+                constraints.categories.append(category)
+    return constraints
+
+
+def constraint_filter(collection_name: str, constraints: dict | None) -> tuple[dict | None, set | None]:
+    """
+    Translates constraints into a ``where`` filter plus the set of matching product IDs.
+
+    Price and category become native metadata filters; ingredient constraints are
+    resolved through the facet index to ID ``$in`` / ``$nin`` filters, since the
+    stores cannot search inside the ingredient string.
+
+    Returns:
+        tuple[dict | None, set | None]: The ``where`` filter and candidate IDs, both
+        None when there is nothing to filter (or no facet index for the collection).
+    """
+    if not constraints:
+        return None, None
+    parsed = ProductConstraints(**constraints)
+    facets = facet_indexes.get(collection_name)
+    if parsed.is_empty() or facets is None:
+        return None, None
+    clauses = []
+    if parsed.min_price is not None:
+        clauses.append({"price": {"$gte": parsed.min_price}})
+    if parsed.max_price is not None:
+        clauses.append({"price": {"$lte": parsed.max_price}})
+    if parsed.categories:
+        clauses.append({"category": {"$in": parsed.categories}})
+    if parsed.include_ingredients:
+        included = set(facets.ids)
+        for term in parsed.include_ingredients:
+            included &= facets.ingredient_ids(term)
+        clauses.append({"id": {"$in": sorted(included)}})
+    if parsed.exclude_ingredients:
+        excluded = set().union(*(facets.ingredient_ids(term) for term in parsed.exclude_ingredients))
+        if excluded:
+            clauses.append({"id": {"$nin": sorted(excluded)}})
+    candidates = facets.candidate_ids(parsed)
+    logger.debug(f"Constraints {parsed.model_dump(exclude_defaults=True)} leave {len(candidates)} candidates.")
+    if not clauses:
+        return None, candidates
+    return (clauses[0] if len(clauses) == 1 else {"$and": clauses}), candidates
@@ -0,0 +1,301 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Iterator
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from loguru import logger
+from app.config import settings
+
+# A parsed document is a list of blocks: (kind, text, level) with kind one of
+# "heading" (level 1..6), "text" or "table" (one rendered row per line).
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$")
+_TABLE_SEPARATOR_RE = re.compile(r"^\|?[\s:|-]+\|?$")
+_BOLD_HEADING_LEVEL = 2  # Level given to short all-bold paragraphs in .docx files
+_BOLD_HEADING_MAX_CHARS = 80
+
+
+def _render_table(rows: list) -> str:
+    """Renders table rows one per line, each cell labelled with its column header."""
+    rows = [row for row in rows if any(row)]
+    if len(rows) < 2:
+        return "\n".join("; ".join(cell for cell in row if cell) for row in rows)
+    header, lines = rows[0], []
+    for row in rows[1:]:
+        cells = [f"{name}: {cell}" if name else cell for name, cell in zip(header, row) if cell]
+        if cells:
+            lines.append("; ".join(cells))
+    return "\n".join(lines)
+
+
+def _markdown_blocks(lines: list) -> list:
+    """Splits Markdown lines into heading, paragraph and table blocks (fenced code stays in one block)."""
+    blocks, paragraph, table = [], [], []
+    in_fence = False
+
+    def end_paragraph():
+        if text := "\n".join(paragraph).strip():
+            blocks.append(("text", text, 0))
+        paragraph.clear()
+
+    def end_table():
+        if text := _render_table(table):
+            blocks.append(("table", text, 0))
+        table.clear()
+
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_fence = not in_fence
+        if in_fence or stripped.startswith("```"):
+            paragraph.append(line.rstrip())
+            continue
+        if table and stripped and not stripped.startswith("|"):
+            end_table()
+        if match := _HEADING_RE.match(stripped):
+            end_paragraph()
+            blocks.append(("heading", match.group(2).strip("* "), len(match.group(1))))
+        elif stripped.startswith("|"):
+            end_paragraph()
+            if not _TABLE_SEPARATOR_RE.match(stripped):
+                table.append([cell.strip() for cell in stripped.strip("|").split("|")])
+        elif not stripped:
+            end_paragraph()
+        else:
+            paragraph.append(line.rstrip())
+    end_paragraph()
+    end_table()
+    return blocks
+
+
+def parse_markdown(path: Path) -> list:
+    return _markdown_blocks(path.read_text(encoding="utf-8", errors="replace").splitlines())
+
+
+def parse_text(path: Path) -> list:
+    """Plain text has no markup; blank lines separate paragraphs."""
+    content = path.read_text(encoding="utf-8", errors="replace")
+    return [("text", paragraph.strip(), 0) for paragraph in re.split(r"\n\s*\n", content) if paragraph.strip()]
+
+
+def _docx_heading_level(paragraph) -> int:
+    """Heading level from the paragraph style, or from a short all-bold paragraph; 0 if not a heading."""
+    style = paragraph.style.name if paragraph.style is not None else ""
+    if style == "Title":
+        return 1
+    if style.startswith("Heading"):
+        level = style.removeprefix("Heading").strip()
+        return int(level) if level.isdigit() else 1
+    text = paragraph.text.strip()
+    runs = [run for run in paragraph.runs if run.text.strip()]
+    if runs and len(text) <= _BOLD_HEADING_MAX_CHARS and "\n" not in text and all(run.bold for run in runs):
+        return _BOLD_HEADING_LEVEL
+    return 0
+
+
+def parse_docx(path: Path) -> list:
+    """
+    Walks the document body in order, so tables stay where they appear.
+
+    Heading-styled and short all-bold paragraphs become headings; the remaining
+    paragraphs are read as Markdown, since documents are often pasted from it.
+    """
+    from docx import Document
+    from docx.table import Table
+
+    blocks, lines = [], []
+    for item in Document(str(path)).iter_inner_content():
+        if isinstance(item, Table):
+            blocks.extend(_markdown_blocks(lines))
+            lines = []
+            rows = [[cell.text.strip() for cell in row.cells] for row in item.rows]
+            if text := _render_table(rows):
+                blocks.append(("table", text, 0))
+        elif level := _docx_heading_level(item):
+            lines.extend(["#" * level + " " + item.text.strip(), ""])
+        else:
+            lines.extend(item.text.splitlines() + [""])
+    blocks.extend(_markdown_blocks(lines))
+    return blocks
+
+
+# File suffix -> parser returning blocks. Register new formats here.
+PARSERS = {
+    ".docx": parse_docx,
+    ".md": parse_markdown,
+    ".markdown": parse_markdown,
+    ".txt": parse_text,
+}
+
+
+def _split_rows(text: str, chunk_size: int) -> list:
+    """Groups table rows into parts of at most chunk_size characters; a row is never split."""
+    parts, current = [], []
+    for row in text.split("\n"):
+        if current and sum(len(line) + 1 for line in current) + len(row) > chunk_size:
+            parts.append("\n".join(current))
+            current = []
+        current.append(row)
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+
+def chunk_by_structure(blocks: list, chunk_size: int, chunk_overlap: int) -> list:
+    """
+    Packs consecutive paragraphs of the same section into chunks of up to chunk_size
+    characters. A heading always starts a new chunk, tables are never mixed with
+    prose and are only split between rows, and paragraphs longer than chunk_size
+    fall back to the recursive splitter.
+
+    Returns:
+        list: (section, text, kind) tuples, section being the heading path ("A > B").
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks, headings, buffer = [], [], []
+
+    def section() -> str:
+        return " > ".join(title for _, title in headings)
+
+    def flush():
+        if buffer:
+            chunks.append((section(), "\n".join(buffer), "text"))
+            buffer.clear()
+
+    for kind, text, level in blocks:
+        if kind == "heading":
+            flush()
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, text))
+        elif kind == "table":
+            flush()
+            chunks.extend((section(), part, "table") for part in _split_rows(text, chunk_size))
+        elif len(text) > chunk_size:
+            flush()
+            chunks.extend((section(), part, "text") for part in splitter.split_text(text))
+        else:
+            if buffer and sum(len(line) + 1 for line in buffer) + len(text) > chunk_size:
+                flush()
+            buffer.append(text)
+    flush()
+    return chunks
+
+
+def chunk_recursive(blocks: list, chunk_size: int, chunk_overlap: int) -> list:
+    """Flattens the document and splits it by size only, ignoring its structure."""
+    full_text = "\n".join(text for _, text, _ in blocks)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [("", chunk, "text") for chunk in splitter.split_text(full_text)]
+
+
+# Chunker name -> function(blocks, chunk_size, chunk_overlap) returning (section, text, kind) tuples.
+CHUNKERS = {
+    "structure": chunk_by_structure,
+    "recursive": chunk_recursive,
+}
+
+
+def dedupe_key(text: str) -> str:
+    """Chunk text with whitespace normalised, so re-wrapped copies of a passage compare equal."""
+    return " ".join(text.split())
+
+
+def chunk_file(path: str, source: str, chunker: str, chunk_size: int, chunk_overlap: int) -> list:
+    """
+    Parses and chunks one document. Runs in a worker process during parallel ingestion.
+
+    Returns:
+        list: (dedupe_key, text, metadata) tuples in document order. The text is
+        prefixed with the chunk's section path; the dedupe key is built from the
+        chunk body only.
+    """
+    path = Path(path)
+    try:
+        blocks = PARSERS[path.suffix.lower()](path)
+        chunks = []
+        for position, (section, body, kind) in enumerate(CHUNKERS[chunker](blocks, chunk_size, chunk_overlap)):
+            text = f"{section}\n{body}" if section else body
+            metadata = {"source": source, "section": section, "position": position, "kind": kind}
+            chunks.append((dedupe_key(body), text, metadata))
+        return chunks
+    except Exception as e:
+        raise ValueError(f"Failed to parse '{source}': {e}") from e
+
+
+def find_documents(path: str) -> list:
+    """
+    Lists the supported documents under a directory (recursively, sorted), or the
+    file itself. Hidden files and Word lock files (~$name.docx) are skipped.
+    """
+    root = Path(path)
+    if root.is_file():
+        return [root]
+    return sorted(
+        file
+        for file in root.rglob("*")
+        if file.is_file()
+        and file.suffix.lower() in PARSERS
+        and not file.name.startswith(("~$", "."))
+    )
+
+
+def iter_chunked_documents(
+    path: str,
+    chunker: str | None = None,
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None,
+    workers: int | None = None,
+) -> Iterator[tuple[str, list]]:
+    """
+    Parses and chunks every supported document under ``path``, yielding
+    (source, chunks) per file in sorted path order (see ``chunk_file``).
+
+    With more than one worker and at least KB_PARALLEL_MIN_FILES files, documents are
+    parsed in a process pool so parsing scales with the number of cores. Workers are
+    spawned rather than forked, since the server process runs threads.
+
+    Args:
+        path (str): A directory, or a single document.
+        chunker (str | None): Key of CHUNKERS. Defaults to settings.KB_CHUNKER.
+        chunk_size (int | None): Target chunk length in characters. Defaults to settings.KB_CHUNK_SIZE.
+        chunk_overlap (int | None): Overlap used when a passage has to be split by size. Defaults to settings.KB_CHUNK_OVERLAP.
+        workers (int | None): Parser processes; 0 means one per CPU. Defaults to settings.KB_INGEST_WORKERS.
+
+    Raises:
+        ValueError: If the chunker is unknown or a document cannot be parsed.
+    """
+    chunker = chunker or settings.KB_CHUNKER
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker '{chunker}'. Available: {', '.join(CHUNKERS)}")
+    work = partial(
+        chunk_file,
+        chunker=chunker,
+        chunk_size=chunk_size or settings.KB_CHUNK_SIZE,
+        chunk_overlap=settings.KB_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+    )
+    root = Path(path)
+    files = find_documents(path)
+    sources = [file.name if root.is_file() else file.relative_to(root).as_posix() for file in files]
+    workers = settings.KB_INGEST_WORKERS if workers is None else workers
+    workers = min(workers or get_context("spawn").cpu_count(), len(files))
+    if len(files) < settings.KB_PARALLEL_MIN_FILES:
+        workers = 1
+    logger.info(f"Found {len(files)} documents under '{path}'; parsing with {max(workers, 1)} process(es).")
+
+    if workers <= 1:
+        for file, source in zip(files, sources):
+            yield source, work(str(file), source)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    try:
+        futures = [pool.submit(work, str(file), source) for file, source in zip(files, sources)]
+        for source, future in zip(sources, futures):
+            yield source, future.result()
+    finally:
+        # Also reached when the consumer stops early (error or cancellation).
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,6 +1,32 @@
-from app.dependencies import openai_client
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+from app.config import settings
+from app.dependencies import async_openai_client, openai_client
+from app.services.embedding_cache import embedding_cache
+from app.services.metrics import record_embedding, record_embedding_cache_hits
 from loguru import logger
 
+# Hard limits of the embeddings endpoint.
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_INPUT = 8191
+
+
+@cache
+def retryable_errors() -> tuple:
+    """Errors worth retrying: throttling, timeouts, dropped connections and 5xx responses."""
+    # Imported on first use; the OpenAI SDK is slow to import and not needed at boot.
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
 
 # Function to generate embedding for a given text using OpenAI API
 def generate_embedding(text: str) -> list:
@@ -17,13 +43,229 @@ def generate_embedding(text: str) -> list:
         Exception: If the embedding generation fails.
     """
     try:
+        if embedding_cache is not None:
+            cached = embedding_cache.get(settings.EMBEDDING_MODEL, text)
+            if cached is not None:
+                logger.debug("Embedding cache hit for text: '{}'", text)
+                record_embedding_cache_hits(settings.EMBEDDING_MODEL)
+                return cached
         logger.debug("Generating embedding for text: '{}'", text)
         # Call OpenAI API to generate embedding
+        started = time.perf_counter()
         response = openai_client.embeddings.create(
-            input=text, model="text-embedding-ada-002"
+            input=truncate_input(text), model=settings.EMBEDDING_MODEL
         )
+        record_embedding(settings.EMBEDDING_MODEL, time.perf_counter() - started, usage=response.usage)
         logger.info("Embedding generated successfully.")
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        if embedding_cache is not None:
+            embedding_cache.put(settings.EMBEDDING_MODEL, text, embedding)
+        return embedding
+    except Exception as e:
+        logger.error("Failed to generate embedding: {}", str(e), exc_info=True)
+        raise
+
+
+async def agenerate_embedding(text: str) -> list:
+    """
+    Async variant of ``generate_embedding`` using the async OpenAI client.
+
+    Args:
+        text (str): The input text to generate embedding for.
+
+    Returns:
+        list: The embedding vector as a list of floats.
+    """
+    try:
+        if embedding_cache is not None:
+            # The cache is SQLite-backed; keep its disk I/O off the event loop.
+            cached = await asyncio.to_thread(embedding_cache.get, settings.EMBEDDING_MODEL, text)
+            if cached is not None:
+                logger.debug("Embedding cache hit for text: '{}'", text)
+                record_embedding_cache_hits(settings.EMBEDDING_MODEL)
+                return cached
+        logger.debug("Generating embedding (async) for text: '{}'", text)
+        started = time.perf_counter()
+        response = await async_openai_client.embeddings.create(
+            input=truncate_input(text), model=settings.EMBEDDING_MODEL
+        )
+        record_embedding(settings.EMBEDDING_MODEL, time.perf_counter() - started, usage=response.usage)
+        embedding = response.data[0].embedding
+        if embedding_cache is not None:
+            await asyncio.to_thread(embedding_cache.put, settings.EMBEDDING_MODEL, text, embedding)
+        return embedding
     except Exception as e:
         logger.error("Failed to generate embedding: {}", str(e), exc_info=True)
         raise
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap, conservative token estimate used for packing batches.
+
+    English text averages ~4 characters per token for OpenAI tokenizers; dividing
+    by 3 over-estimates slightly so a packed batch stays under the request limit.
+    """
+    return len(text) // 3 + 1
+
+
+# Longest input whose estimate stays within MAX_TOKENS_PER_INPUT.
+MAX_CHARS_PER_INPUT = (MAX_TOKENS_PER_INPUT - 1) * 3
+
+
+def truncate_input(text: str) -> str:
+    """
+    Cuts ``text`` so its estimated size fits MAX_TOKENS_PER_INPUT; the endpoint
+    rejects the whole request otherwise, failing every other input batched with it.
+    """
+    if len(text) <= MAX_CHARS_PER_INPUT:
+        return text
+    logger.warning(
+        f"Input is ~{estimate_tokens(text)} tokens, above the {MAX_TOKENS_PER_INPUT} token limit; "
+        f"embedding its first {MAX_CHARS_PER_INPUT} characters."
+    )
+    return text[:MAX_CHARS_PER_INPUT]
+
+
+def _pack_batches(texts: list, batch_size: int, max_tokens: int) -> list:
+    """
+    Groups text indices into batches bounded by input count and estimated tokens.
+    Inputs are expected to be truncated already (see ``truncate_input``).
+
+    Returns:
+        list[list[int]]: Batches of indices into ``texts``, in input order.
+    """
+    batch_size = max(1, min(batch_size, MAX_INPUTS_PER_REQUEST))
+    batches, current, current_tokens = [], [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= batch_size or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_batch(batch_texts: list, max_retries: int) -> list:
+    """
+    Embeds one sub-batch, retrying only this sub-batch on transient errors.
+
+    Returns:
+        list: Embedding vectors in the same order as ``batch_texts``.
+    """
+    attempt = 0
+    while True:
+        try:
+            started = time.perf_counter()
+            response = openai_client.embeddings.create(
+                input=batch_texts, model=settings.EMBEDDING_MODEL
+            )
+            record_embedding(
+                settings.EMBEDDING_MODEL, time.perf_counter() - started, len(batch_texts), response.usage
+            )
+            # The API tags each result with its input index; don't rely on response order.
+            ordered = sorted(response.data, key=lambda item: item.index)
+            return [item.embedding for item in ordered]
+        except retryable_errors() as e:
+            if attempt >= max_retries:
+                raise
+            delay = min(2 ** attempt, 30)
+            attempt += 1
+            logger.warning(
+                f"Embedding sub-batch of {len(batch_texts)} failed ({e}); "
+                f"retry {attempt}/{max_retries} in {delay}s."
+            )
+            time.sleep(delay)
+
+
+def generate_embeddings(
+    texts: list,
+    batch_size: int | None = None,
+    max_concurrency: int | None = None,
+    max_batch_tokens: int | None = None,
+    max_retries: int | None = None,
+) -> list:
+    """
+    Generate embedding vectors for many texts with as few API round-trips as possible.
+
+    Texts already in the embedding cache are served from it. The rest are packed into
+    sub-batches bounded by ``batch_size`` inputs and an estimated token budget, and up
+    to ``max_concurrency`` sub-batches are sent at once. A sub-batch that hits a
+    transient error is retried on its own; the others are kept.
+
+    Args:
+        texts (list): The input texts to embed.
+        batch_size (int | None): Max inputs per request. Defaults to settings.EMBEDDING_BATCH_SIZE.
+        max_concurrency (int | None): Max requests in flight. Defaults to settings.EMBEDDING_MAX_CONCURRENCY.
+        max_batch_tokens (int | None): Estimated tokens per request. Defaults to settings.EMBEDDING_BATCH_MAX_TOKENS.
+        max_retries (int | None): Retries per failed sub-batch. Defaults to settings.EMBEDDING_MAX_RETRIES.
+
+    Returns:
+        list: One embedding vector per input text, in input order.
+
+    Raises:
+        Exception: If a sub-batch still fails after its retries are exhausted.
+    """
+    if not texts:
+        return []
+    if embedding_cache is not None:
+        embeddings = embedding_cache.get_many(settings.EMBEDDING_MODEL, texts)
+        missing = [i for i, vector in enumerate(embeddings) if vector is None]
+        if len(missing) < len(texts):
+            record_embedding_cache_hits(settings.EMBEDDING_MODEL, len(texts) - len(missing))
+        if not missing:
+            logger.debug(f"All {len(texts)} embeddings served from cache.")
+            return embeddings
+        # Embed each distinct missing text once, then fan results back out.
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        vectors = _generate_uncached_embeddings(
+            missing_texts, batch_size, max_concurrency, max_batch_tokens, max_retries
+        )
+        embedding_cache.put_many(settings.EMBEDDING_MODEL, missing_texts, vectors)
+        fresh = dict(zip(missing_texts, vectors))
+        for i in missing:
+            embeddings[i] = fresh[texts[i]]
+        return embeddings
+    return _generate_uncached_embeddings(texts, batch_size, max_concurrency, max_batch_tokens, max_retries)
+
+
+def _generate_uncached_embeddings(
+    texts: list,
+    batch_size: int | None,
+    max_concurrency: int | None,
+    max_batch_tokens: int | None,
+    max_retries: int | None,
+) -> list:
+    """Batched, concurrent embedding calls behind ``generate_embeddings`` (no cache)."""
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+    max_batch_tokens = max_batch_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+    max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+
+    texts = [truncate_input(text) for text in texts]
+    batches = _pack_batches(texts, batch_size, max_batch_tokens)
+    logger.debug(f"Embedding {len(texts)} texts in {len(batches)} sub-batches.")
+
+    embeddings = [None] * len(texts)
+
+    def run(batch: list):
+        vectors = _embed_batch([texts[i] for i in batch], max_retries)
+        for index, vector in zip(batch, vectors):
+            embeddings[index] = vector
+
+    try:
+        if len(batches) == 1 or max_concurrency <= 1:
+            for batch in batches:
+                run(batch)
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as pool:
+                # list() re-raises the first sub-batch failure, if any.
+                list(pool.map(run, batches))
+        logger.info(f"Generated {len(texts)} embeddings in {len(batches)} requests.")
+        return embeddings
+    except Exception as e:
+        logger.error("Failed to generate batch embeddings: {}", str(e), exc_info=True)
+        raise
@@ -0,0 +1,151 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from loguru import logger
+from app.config import settings
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially different copies of a text share a cache entry."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache keyed by (model, normalized-text hash).
+
+    Vectors are stored as float32 blobs in SQLite, so the cache survives restarts
+    and is shared by ingestion runs and the query path. When the number of entries
+    exceeds ``max_entries`` the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content address of ``text`` embedded with ``model``."""
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: list) -> list:
+        """
+        Looks up cached vectors.
+
+        Returns:
+            list: One vector (list of floats) or None per input text, in input order.
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    hit_keys = [row[0] for row in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [time.time(), *hit_keys],
+                    )
+            results = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(array("f", blob).tolist())
+        return results
+
+    def get(self, model: str, text: str) -> list | None:
+        """Returns the cached vector for ``text`` or None."""
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: list, vectors: list):
+        """Stores vectors for ``texts`` and evicts least recently used entries if over capacity."""
+        now = time.time()
+        rows = {
+            self.make_key(model, text): (model, array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        }
+        with self._lock:
+            before = self._conn.total_changes
+            # INSERT OR IGNORE keeps the size counter exact: existing keys are left alone.
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(key, *row) for key, row in rows.items()],
+            )
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                self._evict()
+
+    def put(self, model: str, text: str, vector: list):
+        """Stores a single vector."""
+        self.put_many(model, [text], [vector])
+
+    def _evict(self):
+        """Drops the least recently used entries, leaving 10% headroom to amortize evictions."""
+        target = int(self.max_entries * 0.9)
+        excess = self._size - target
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Embedding cache evicted {excess} least recently used entries.")
+
+    def clear(self):
+        """Removes every cached vector."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._size = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process and the current number of entries."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+        }
+
+
+# -----------------------------------------------------------
+# Initialize the shared embedding cache
+# -----------------------------------------------------------
+embedding_cache = None
+if settings.EMBEDDING_CACHE_ENABLED:
+    try:
+        embedding_cache = EmbeddingCache(
+            settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES
+        )
+        logger.info(f"Embedding cache opened at '{settings.EMBEDDING_CACHE_PATH}'.")
+    except Exception as e:
+        logger.error(f"Failed to open embedding cache, continuing without it: {e}")
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from loguru import logger
+from app.config import settings
+from app.dependencies import async_openai_client, vector_store_client
+from app.services.rag import retrieval_service
+from app.services.session_store import session_store
+from app.utils.pipeline import async_pipeline_registry
+
+# Collection that has to hold documents before the API can answer.
+REQUIRED_COLLECTION = "skincare"
+
+
+def _check_pipeline():
+    if not async_pipeline_registry.is_built:
+        raise RuntimeError("Pipeline has not been compiled yet.")
+
+
+def _check_vector_store():
+    vector_store_client.check()
+    if retrieval_service.collection(REQUIRED_COLLECTION).count() == 0:
+        raise RuntimeError(f"Collection '{REQUIRED_COLLECTION}' is empty.")
+
+
+# Readiness checks: each raises if its dependency cannot serve requests.
+READINESS_CHECKS = {
+    "pipeline": _check_pipeline,
+    "openai": async_openai_client.check,
+    "vector_store": _check_vector_store,
+    "session_store": lambda: session_store.ping(),
+}
+
+
+async def _run_check(name: str, check, timeout: float) -> dict:
+    started = time.perf_counter()
+    try:
+        # Checks may block (client creation, network pings); run them off the event loop.
+        await asyncio.wait_for(asyncio.to_thread(check), timeout)
+        result = {"status": "ok"}
+    except asyncio.TimeoutError:
+        result = {"status": "error", "error": f"timed out after {timeout}s"}
+    except Exception as e:
+        result = {"status": "error", "error": str(e)}
+    result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    if result["status"] != "ok":
+        logger.warning(f"Readiness check '{name}' failed: {result['error']}")
+    return result
+
+
+async def check_readiness(timeout: float | None = None) -> tuple[bool, dict]:
+    """
+    Runs every readiness check concurrently.
+
+    Args:
+        timeout (float | None): Seconds allowed per check. Defaults to settings.READINESS_TIMEOUT_SECONDS.
+
+    Returns:
+        tuple[bool, dict]: Whether all checks passed, and each check's status and duration.
+    """
+    timeout = timeout or settings.READINESS_TIMEOUT_SECONDS
+    names = list(READINESS_CHECKS)
+    results = await asyncio.gather(*(_run_check(name, READINESS_CHECKS[name], timeout) for name in names))
+    checks = dict(zip(names, results))
+    return all(result["status"] == "ok" for result in results), checks
@@ -0,0 +1,252 @@
+import fcntl
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from loguru import logger
+from app.config import settings
+
+
+class IndexLocked(RuntimeError):
+    """Raised when another process is already building an index generation."""
+
+
+class IndexGenerations:
+    """
+    Versioned, read-only index directories shared by several worker processes.
+
+    Layout under ``root``::
+
+        CURRENT                      name of the published generation
+        ingest.lock                  held (fcntl) by the process building a generation
+        readers/<pid>                generation served by each worker process
+        generations/<name>/vector_store/<collection>/...
+        generations/<name>/lexical_index/...
+
+    Ingestion builds a new generation next to the published one and then publishes
+    it by replacing CURRENT with ``os.replace``, which is atomic: a reader sees the
+    old generation or the new one, never a mix. Published generations are never
+    modified. A new generation starts as hard links to the current one's files;
+    since every index file is rewritten via a temp file and rename, writes replace
+    the links and the published files stay untouched. Workers open collections
+    lazily, so each one records the generation it serves and ``prune`` keeps it.
+    """
+
+    def __init__(self, root: str, keep: int = 2):
+        self.root = Path(root)
+        self.keep = max(keep, 1)
+        (self.root / "generations").mkdir(parents=True, exist_ok=True)
+        (self.root / "readers").mkdir(exist_ok=True)
+
+    def directory(self, generation: str) -> Path:
+        return self.root / "generations" / generation
+
+    def current(self) -> str | None:
+        """Name of the published generation, or None if nothing was published yet."""
+        try:
+            return (self.root / "CURRENT").read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def lock(self):
+        """
+        Holds the ingestion lock for the duration of the block.
+
+        Raises:
+            IndexLocked: If another process (or thread) holds it.
+        """
+        with open(self.root / "ingest.lock", "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError as e:
+                raise IndexLocked("Another process is building an index generation.") from e
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def register_reader(self, generation: str, pid: int | None = None):
+        """Records that process ``pid`` (default: this one) serves ``generation``."""
+        marker = self.root / "readers" / str(pid or os.getpid())
+        tmp = marker.with_suffix(".tmp")
+        tmp.write_text(generation, encoding="utf-8")
+        os.replace(tmp, marker)
+
+    def in_use(self) -> set:
+        """Generations served by live worker processes; markers of dead ones are removed."""
+        used = set()
+        for marker in (self.root / "readers").iterdir():
+            if not marker.name.isdigit():
+                continue
+            if not _alive(int(marker.name)):
+                marker.unlink(missing_ok=True)
+                continue
+            try:
+                used.add(marker.read_text(encoding="utf-8").strip())
+            except FileNotFoundError:
+                pass
+        return used
+
+    def stage(self, seed: bool = True) -> tuple[str, Path]:
+        """
+        Creates a new, unpublished generation. Call while holding ``lock``.
+
+        Args:
+            seed (bool): Start from (hard links to) the current generation's files,
+                so incremental ingestion only rewrites what changed.
+
+        Returns:
+            tuple[str, Path]: The generation name and its directory.
+        """
+        generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        directory = self.directory(generation)
+        current = self.current()
+        if seed and current is not None and self.directory(current).exists():
+            shutil.copytree(self.directory(current), directory, copy_function=_link_or_copy)
+        else:
+            directory.mkdir(parents=True)
+        logger.info(f"Staged index generation {generation} (seeded from {current if seed else None}).")
+        return generation, directory
+
+    def publish(self, generation: str):
+        """Atomically makes ``generation`` the current one."""
+        tmp = self.root / "CURRENT.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.root / "CURRENT")
+        logger.success(f"Published index generation {generation}.")
+
+    def discard(self, generation: str):
+        shutil.rmtree(self.directory(generation), ignore_errors=True)
+
+    def prune(self):
+        """
+        Deletes all but the current generation and the ``keep - 1`` before it, plus
+        abandoned unpublished ones. Call while holding ``lock``. Generations a live
+        worker still serves are kept, since it may not have opened every file yet.
+        """
+        current = self.current()
+        if current is None:
+            return
+        names = sorted(path.name for path in (self.root / "generations").iterdir() if path.is_dir())
+        kept = [name for name in names if name <= current][-self.keep:]
+        in_use = self.in_use()
+        for name in names:
+            if name in in_use and name not in kept:
+                logger.info(f"Keeping index generation {name}: a worker still serves it.")
+            elif name not in kept:
+                self.discard(name)
+                logger.info(f"Pruned index generation {name}.")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class IndexSet:
+    """The vector store client and lexical / facet index registries that ingestion writes to."""
+
+    def __init__(self, vectors, lexical, facets):
+        self.vectors = vectors
+        self.lexical = lexical
+        self.facets = facets
+
+    @classmethod
+    def at(cls, directory: Path) -> "IndexSet":
+        """Private indexes in a staged generation directory."""
+        from app.services.constraints import FacetIndex
+        from app.services.lexical_index import BM25Index, IndexRegistry
+        from app.services.vector_store import NumpyVectorStoreClient
+
+        lexical_path = directory / "lexical_index"
+        return cls(
+            NumpyVectorStoreClient(str(directory / "vector_store")),
+            IndexRegistry(str(lexical_path), BM25Index),
+            IndexRegistry(str(lexical_path), FacetIndex, suffix=".facets"),
+        )
+
+
+class GenerationWatcher:
+    """
+    Polls CURRENT and calls ``on_change(directory)`` when a new generation is published,
+    so every worker switches to it within ``interval`` seconds.
+    """
+
+    def __init__(self, generations: IndexGenerations, on_change, interval: float):
+        self.generations = generations
+        self.generation = None
+        self._on_change = on_change
+        self._interval = interval
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def check(self) -> bool:
+        """Switches to the published generation if it changed; returns whether it did."""
+        with self._lock:
+            current = self.generations.current()
+            if current is None or current == self.generation:
+                return False
+            # Register before switching so a concurrent prune keeps the new generation.
+            self.generations.register_reader(current)
+            if not self.generations.directory(current).exists():
+                self._register_previous()
+                return False
+            try:
+                self._on_change(self.generations.directory(current))
+            except Exception:
+                self._register_previous()
+                raise
+            logger.info(f"Serving index generation {current} (was {self.generation}).")
+            self.generation = current
+            return True
+
+    def _register_previous(self):
+        if self.generation is not None:
+            self.generations.register_reader(self.generation)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Failed to switch index generation: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-generation-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# -----------------------------------------------------------
+# Shared index mode (SHARED_INDEX_PATH set)
+# -----------------------------------------------------------
+generations = None
+if settings.SHARED_INDEX_PATH:
+    try:
+        generations = IndexGenerations(settings.SHARED_INDEX_PATH, settings.SHARED_INDEX_KEEP_GENERATIONS)
+        logger.info(f"Shared index mode: generations under '{settings.SHARED_INDEX_PATH}'.")
+    except Exception as e:
+        logger.error(f"Failed to open shared index at '{settings.SHARED_INDEX_PATH}': {e}")
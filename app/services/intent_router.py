@@ -0,0 +1,205 @@
+import re
+import threading
+
+import numpy as np
+from loguru import logger
+from app.config import settings
+from app.services.constraints import PRODUCT_CATEGORIES
+from app.services.embedding import generate_embeddings
+from app.services.metrics import INTENT_ROUTES, LLM_CALLS_SAVED
+
+# Routes. "recommend" and "follow_up" are fast paths that skip analyze_query; "llm"
+# runs the full graph.
+RECOMMEND, FOLLOW_UP, LLM = "recommend", "follow_up", "llm"
+
+# LLM calls a fast path avoids compared with the full graph taking the same branch:
+# both skip analyze_query.
+LLM_CALLS_SAVED_BY_ROUTE = {RECOMMEND: 1, FOLLOW_UP: 1, LLM: 0}
+
+# Labelled example queries; the classifier compares a query with each label's centroid.
+INTENT_EXAMPLES = {
+    RECOMMEND: [
+        "I have oily skin with breakouts, what serum should I use?",
+        "Looking for a gentle moisturizer for dry sensitive skin",
+        "My combination skin gets dull, I want something to brighten it",
+        "Need a shampoo for frizzy and dry hair",
+        "Which toner helps with large pores on oily skin?",
+        "I'm 40 with dry skin and fine lines, recommend a night cream",
+        "Suggest something for dandruff and an itchy scalp",
+        "What should I use for dark spots on sensitive skin?",
+    ],
+    FOLLOW_UP: [
+        "hi",
+        "hello there",
+        "hey, can you help me?",
+        "I need skincare",
+        "skin",
+        "I want to buy something",
+        "help me with my routine",
+        "what do you have?",
+    ],
+    LLM: [
+        "What does retinol do?",
+        "Is niacinamide safe to use with vitamin C?",
+        "Where is my order?",
+        "How do I return a product?",
+        "How long does delivery take?",
+        "Are your products cruelty free?",
+        "What are the reviews like for the hydration serum?",
+        "Nothing works for my skin and I'm so frustrated",
+    ],
+}
+
+SKIN_OR_HAIR_TYPES = (
+    "oily", "dry", "combination", "combo", "sensitive", "normal skin", "acne-prone", "acne prone",
+    "mature", "dehydrated", "frizzy", "curly", "wavy", "straight hair", "fine hair", "thick hair",
+    "thin hair", "coarse", "damaged hair", "colored hair", "coloured hair", "greasy", "flaky",
+)
+CONCERNS = (
+    "acne", "breakout", "pimple", "blackhead", "whitehead", "pore", "dark spot", "pigmentation",
+    "hyperpigmentation", "dull", "glow", "bright", "wrinkle", "fine line", "aging", "ageing",
+    "redness", "irritat", "dryness", "hydrat", "moistur", "dark circle", "puffiness", "uneven",
+    "texture", "scar", "dandruff", "hair fall", "hair loss", "frizz", "split end", "itchy", "tan",
+    "sun damage", "oil control",
+)
+# Product interest: the keywords the catalogue's categories are inferred from.
+PRODUCT_INTEREST = tuple(keyword for _, keywords in PRODUCT_CATEGORIES for keyword in keywords)
+# Questions analyze_query answers itself (general knowledge, orders), so they never take a fast path.
+INFO_PATTERNS = re.compile(
+    r"^(is|are|does|should|why|when)\b|\b(what (does|do|is|are)|how (do|does|to|long|much)|safe|can i use|"
+    r"difference between|order|refund|return|deliver|shipping|track|review|cruelty|vegan|frustrat|"
+    r"nothing works|broke me out)\b"
+)
+
+
+def _mentions(text: str, terms: tuple) -> bool:
+    return any(re.search(rf"\b{re.escape(term)}", text) for term in terms)
+
+
+def profile_terms(text: str) -> list:
+    """The skin/hair types and concerns ``text`` mentions, sorted."""
+    text = text.lower()
+    return sorted(term for term in (*SKIN_OR_HAIR_TYPES, *CONCERNS) if _mentions(text, (term,)))
+
+
+def rule_route(user_messages: list, query: str) -> str:
+    """
+    Route from keywords alone: ``recommend`` when the conversation names a skin/hair
+    type and a concern or product, ``follow_up`` when it names none of the three,
+    ``llm`` otherwise or when the query is a general or order question.
+    """
+    if INFO_PATTERNS.search(query.lower()):
+        return LLM
+    text = " ".join(user_messages).lower()
+    has_type = _mentions(text, SKIN_OR_HAIR_TYPES)
+    has_need = _mentions(text, CONCERNS) or _mentions(text, PRODUCT_INTEREST)
+    if has_type and has_need:
+        return RECOMMEND
+    if not has_type and not has_need:
+        return FOLLOW_UP
+    return LLM
+
+
+class IntentRouter:
+    """
+    Fast-path router that decides, before any LLM call, whether a turn can skip
+    analyze_query.
+
+    A nearest-centroid classifier over query embeddings (centroids of the
+    INTENT_EXAMPLES, embedded once on first use) and the keyword rules of
+    ``rule_route`` each pick a route. A fast path is taken only when both agree and
+    the classifier's best centroid beats the runner-up by at least ``min_margin``
+    cosine similarity; anything else runs the full graph.
+
+    Per-route counts and the LLM calls saved are kept for ``stats`` and exported as
+    the intent_routes_total / llm_calls_saved_total metrics.
+    """
+
+    def __init__(self, examples: dict, min_margin: float):
+        self.examples = examples
+        self.min_margin = min_margin
+        self._labels = list(examples)
+        self._centroids = None
+        self._lock = threading.Lock()
+        self._counts = {label: 0 for label in LLM_CALLS_SAVED_BY_ROUTE}
+        self._saved = 0
+
+    def _centroid_matrix(self) -> np.ndarray:
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    texts = [text for label in self._labels for text in self.examples[label]]
+                    vectors = np.asarray(generate_embeddings(texts), dtype=np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroids, start = [], 0
+                    for label in self._labels:
+                        end = start + len(self.examples[label])
+                        centroids.append(vectors[start:end].mean(axis=0))
+                        start = end
+                    centroids = np.stack(centroids)
+                    self._centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+                    logger.info(f"Intent router centroids built from {len(texts)} examples.")
+        return self._centroids
+
+    def warm_up(self):
+        """Embeds the examples ahead of the first request; failures are retried on first use."""
+        try:
+            self._centroid_matrix()
+        except Exception as e:
+            logger.warning(f"Intent router warm-up failed: {e}")
+
+    def classify(self, embedding: list) -> tuple[str, float]:
+        """Nearest intent centroid for a query embedding, and its margin over the runner-up."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        similarities = self._centroid_matrix() @ (vector / np.linalg.norm(vector))
+        second, best = np.argsort(similarities)[-2:]
+        return self._labels[best], float(similarities[best] - similarities[second])
+
+    def route(self, user_messages: list, query: str, embedding: list) -> tuple[str, dict]:
+        """
+        Picks the route for one turn and records it.
+
+        Args:
+            user_messages (list): Text of the user's messages so far (and the history summary).
+            query (str): The current user query.
+            embedding (list): The query's embedding.
+
+        Returns:
+            tuple[str, dict]: The route (RECOMMEND, FOLLOW_UP or LLM) and what it was decided from.
+        """
+        by_rules = rule_route(user_messages, query)
+        try:
+            by_classifier, margin = self.classify(embedding)
+        except Exception as e:
+            logger.warning(f"Intent classifier unavailable, running the full graph: {e}")
+            by_classifier, margin = LLM, 0.0
+        confident = by_rules == by_classifier and margin >= self.min_margin
+        route = by_rules if confident and by_rules != LLM else LLM
+        self._record(route)
+        return route, {"rules": by_rules, "classifier": by_classifier, "margin": round(margin, 4)}
+
+    def _record(self, route: str):
+        saved = LLM_CALLS_SAVED_BY_ROUTE[route]
+        with self._lock:
+            self._counts[route] += 1
+            self._saved += saved
+        INTENT_ROUTES.inc(route=route)
+        if saved:
+            LLM_CALLS_SAVED.inc(saved, route=route)
+
+    def stats(self) -> dict:
+        """Share of turns per route and the LLM calls the fast paths saved."""
+        with self._lock:
+            turns = sum(self._counts.values())
+            return {
+                "turns": turns,
+                "routes": {
+                    route: {"turns": count, "share": round(count / turns, 4) if turns else 0.0}
+                    for route, count in self._counts.items()
+                },
+                "llm_calls_saved": self._saved,
+                "llm_calls_saved_per_turn": round(self._saved / turns, 4) if turns else 0.0,
+            }
+
+
+intent_router = IntentRouter(INTENT_EXAMPLES, settings.ROUTER_MIN_MARGIN)
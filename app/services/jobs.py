@@ -0,0 +1,152 @@
+import threading
+import time
+from uuid import uuid4
+
+from loguru import logger
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's target when cancellation has been requested."""
+
+
+class JobSkipped(Exception):
+    """Raised by a job's target when there is nothing for it to do (e.g. another process is doing it)."""
+
+
+class Job:
+    """
+    A single background run with status, progress and cooperative cancellation.
+
+    The target receives the job and should call ``report`` as it makes progress and
+    ``check_cancelled`` at safe points (e.g. between batches) so it can be stopped.
+    """
+
+    def __init__(self, name: str):
+        self.id = str(uuid4())
+        self.name = name
+        self.status = "queued"  # queued | running | succeeded | skipped | failed | cancelled
+        self.stage = ""
+        self.done = 0
+        self.total = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def report(self, stage: str, done: int, total: int | None = None):
+        """Records progress for the current stage."""
+        self.stage = stage
+        self.done = done
+        self.total = total
+
+    def cancel(self):
+        """Requests cancellation; the target stops at its next ``check_cancelled``."""
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        """Raises JobCancelled if cancellation was requested."""
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled.")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_requested": self._cancel_event.is_set(),
+        }
+
+
+class JobManager:
+    """
+    Runs jobs on background threads, one at a time.
+
+    ``submit`` is single-flight: while a job is queued or running, further submissions
+    return the active job instead of starting another run. Finished jobs are kept
+    (up to ``max_history``) so their status can still be polled.
+    """
+
+    def __init__(self, name: str, max_history: int = 50):
+        self.name = name
+        self.max_history = max_history
+        self._jobs = {}
+        self._active = None
+        self._lock = threading.Lock()
+
+    def submit(self, target, **kwargs) -> tuple[Job, bool]:
+        """
+        Starts ``target(job=job, **kwargs)`` on a background thread.
+
+        Returns:
+            tuple[Job, bool]: The job, and whether it was newly created (False if an
+            active job was returned instead).
+        """
+        with self._lock:
+            if self._active is not None and self._active.is_active:
+                return self._active, False
+            job = Job(self.name)
+            self._jobs[job.id] = job
+            self._active = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job, target, kwargs), daemon=True).start()
+        logger.info(f"Started {self.name} job {job.id}.")
+        return job, True
+
+    def _run(self, job: Job, target, kwargs: dict):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            target(job=job, **kwargs)
+            job.status = "succeeded"
+            logger.success(f"{self.name} job {job.id} succeeded.")
+        except JobCancelled:
+            job.status = "cancelled"
+            logger.warning(f"{self.name} job {job.id} was cancelled.")
+        except JobSkipped as e:
+            job.status = "skipped"
+            job.stage = str(e)
+            logger.info(f"{self.name} job {job.id} skipped: {e}")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"{self.name} job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        """Drops the oldest finished jobs beyond ``max_history``."""
+        finished = [job for job in self._jobs.values() if not job.is_active]
+        for job in sorted(finished, key=lambda j: j.created_at)[: max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def list(self) -> list:
+        return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def active(self) -> Job | None:
+        job = self._active
+        return job if job is not None and job.is_active else None
+
+    def cancel(self, job_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is not None and job.is_active:
+            job.cancel()
+            logger.info(f"Cancellation requested for {self.name} job {job.id}.")
+        return job
+
+
+ingestion_jobs = JobManager("ingestion")
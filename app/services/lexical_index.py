@@ -0,0 +1,216 @@
+import json
+import math
+import os
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+from app.config import settings
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from have i in is it me my of on or "
+    "should so that the this to use what which with you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lowercased alphanumeric tokens without stopwords, with a trailing plural 's' stripped."""
+    if not isinstance(text, str):
+        return []
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over selected metadata fields of a collection.
+
+    Each field has a weight that multiplies its term frequencies, so a match in the
+    product name can count for more than one in the ingredient list. Postings are
+    kept as NumPy arrays; a search accumulates scores for the query terms' postings
+    only and takes the top k with ``argpartition``.
+    """
+
+    def __init__(self, fields: dict, k1: float = 1.5, b: float = 0.75):
+        self.fields = fields
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self._postings = {}  # term -> (doc indices int32, weighted term frequencies float32)
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+
+    def build(self, ids: list, metadatas: list) -> "BM25Index":
+        """Indexes one document per ID from the configured metadata fields."""
+        postings = {}
+        lengths = []
+        for doc, metadata in enumerate(metadatas):
+            frequencies = {}
+            for field, weight in self.fields.items():
+                for token in tokenize((metadata or {}).get(field, "")):
+                    frequencies[token] = frequencies.get(token, 0.0) + weight
+            lengths.append(sum(frequencies.values()))
+            for token, frequency in frequencies.items():
+                postings.setdefault(token, []).append((doc, frequency))
+        self.ids = list(ids)
+        self._doc_lengths = np.asarray(lengths, dtype=np.float32)
+        self._postings = {
+            token: (np.array([d for d, _ in entries], dtype=np.int32), np.array([f for _, f in entries], dtype=np.float32))
+            for token, entries in postings.items()
+        }
+        return self
+
+    def search(self, query: str, n_results: int = 10, allowed_ids: set | None = None) -> list:
+        """
+        Scores documents against ``query``, optionally only those in ``allowed_ids``.
+
+        Returns:
+            list[tuple[str, float]]: Up to ``n_results`` (id, score) pairs with a positive score, best first.
+        """
+        count = len(self.ids)
+        if not count:
+            return []
+        scores = np.zeros(count, dtype=np.float32)
+        average_length = float(self._doc_lengths.mean()) or 1.0
+        for token in set(tokenize(query)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            docs, frequencies = posting
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[docs] / average_length)
+            scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+        matched = np.flatnonzero(scores > 0)
+        if allowed_ids is not None:
+            matched = np.array([doc for doc in matched if self.ids[doc] in allowed_ids], dtype=np.int64)
+        if not len(matched):
+            return []
+        k = min(n_results, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[doc], float(scores[doc])) for doc in top]
+
+    def to_dict(self) -> dict:
+        return {
+            "fields": self.fields,
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "doc_lengths": self._doc_lengths.tolist(),
+            "postings": {
+                token: [docs.tolist(), frequencies.tolist()] for token, (docs, frequencies) in self._postings.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        index = cls(data["fields"], data["k1"], data["b"])
+        index.ids = data["ids"]
+        index._doc_lengths = np.asarray(data["doc_lengths"], dtype=np.float32)
+        index._postings = {
+            token: (np.asarray(docs, dtype=np.int32), np.asarray(frequencies, dtype=np.float32))
+            for token, (docs, frequencies) in data["postings"].items()
+        }
+        return index
+
+
+class IndexRegistry:
+    """
+    Per-collection derived indexes (BM25, facets, ...), persisted as JSON files.
+
+    Ingestion builds and saves an index from the collection's contents; ``get``
+    loads it on first use and reloads it when the file changes on disk (e.g. after
+    ingestion in another process). Collections without an index file get None.
+
+    ``index_type`` must provide ``build(ids, metadatas)``, ``to_dict`` and
+    ``from_dict``; ``build`` passes its keyword options to the constructor.
+    """
+
+    def __init__(self, path: str, index_type, suffix: str = ""):
+        self.path = Path(path)
+        self.index_type = index_type
+        self.suffix = suffix
+        self._indexes = {}  # name -> (mtime, index)
+        self._lock = threading.Lock()
+
+    def _file(self, name: str) -> Path:
+        return self.path / f"{name}{self.suffix}.json"
+
+    def reopen(self, path: str):
+        """Reads indexes from another directory from now on."""
+        with self._lock:
+            self.path = Path(path)
+            self._indexes = {}
+
+    def get(self, name: str):
+        file = self._file(name)
+        try:
+            mtime = file.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        cached = self._indexes.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with self._lock:
+            with open(file, "r", encoding="utf-8") as f:
+                index = self.index_type.from_dict(json.load(f))
+            self._indexes[name] = (mtime, index)
+        logger.info(f"Loaded {self.index_type.__name__} for '{name}' ({len(index.ids)} documents).")
+        return index
+
+    def build(self, name: str, collection, page_size: int = 10_000, **options):
+        """
+        Rebuilds the index for ``name`` from the collection's current contents and saves it.
+
+        Reading back from the collection (rather than from the source file) keeps the
+        index consistent with incremental ingestion's upserts and deletes.
+        """
+        ids, metadatas, offset = [], [], 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids.extend(page["ids"])
+            metadatas.extend(page["metadatas"])
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+        index = self.index_type(**options).build(ids, metadatas)
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = self._file(name)
+        tmp = file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index.to_dict(), f)
+        os.replace(tmp, file)
+        with self._lock:
+            self._indexes[name] = (file.stat().st_mtime, index)
+        logger.info(f"Built {self.index_type.__name__} for '{name}' over {len(ids)} documents.")
+        return index
+
+    def delete(self, name: str):
+        with self._lock:
+            self._indexes.pop(name, None)
+            self._file(name).unlink(missing_ok=True)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fuses several ranked ID lists: each ID scores sum(1 / (k + rank)) over the lists it appears in.
+
+    Returns:
+        list[tuple[str, float]]: IDs with their fused scores, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+lexical_indexes = IndexRegistry(settings.LEXICAL_INDEX_PATH, BM25Index)
@@ -0,0 +1,387 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.config import settings
+
+# Latency buckets in seconds, from in-process lookups up to slow LLM completions.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _sample_lines(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            lines.extend(self._sample_lines())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing total, one per combination of label values."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _sample_lines(self) -> list:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. requests in flight."""
+
+    type = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _sample_lines(self) -> list:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values (seconds, for latencies)."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count.
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the ``with`` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _sample_lines(self) -> list:
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-local collection of metrics, rendered in the Prometheus text format.
+
+    Each worker process keeps its own registry, so with several gunicorn workers
+    every scrape of ``/metrics`` reports the worker that served it; aggregate by
+    instance in Prometheus.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests served.", ("method", "path", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "path")
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests being served.")
+STAGE_LATENCY = registry.histogram(
+    "rag_stage_duration_seconds", "Wall time of each conversation pipeline stage.", ("stage",)
+)
+LLM_LATENCY = registry.histogram(
+    "llm_request_duration_seconds", "Chat completion latency.", ("model", "operation")
+)
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total", "Chat completion requests.", ("model", "operation", "status")
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Chat completion tokens reported by the API.", ("model", "operation", "type")
+)
+LLM_COST = registry.counter(
+    "llm_cost_usd_total", "Estimated chat completion spend (MODEL_PRICES).", ("model", "operation")
+)
+EMBEDDING_LATENCY = registry.histogram(
+    "embedding_request_duration_seconds", "Embedding API request latency.", ("model",)
+)
+EMBEDDING_TEXTS = registry.counter(
+    "embedding_texts_total", "Texts embedded, by whether the API or the cache served them.", ("model", "source")
+)
+EMBEDDING_TOKENS = registry.counter(
+    "embedding_tokens_total", "Embedding tokens reported by the API.", ("model",)
+)
+EMBEDDING_COST = registry.counter(
+    "embedding_cost_usd_total", "Estimated embedding spend (MODEL_PRICES).", ("model",)
+)
+RETRIEVAL_LATENCY = registry.histogram(
+    "retrieval_duration_seconds", "Collection query latency, including embedding.", ("collection",)
+)
+VECTOR_QUERY_LATENCY = registry.histogram(
+    "vector_store_query_duration_seconds", "Vector store query latency.", ("collection",)
+)
+STRUCTURED_OUTPUT_FAILURES = registry.counter(
+    "llm_structured_output_failures_total",
+    "JSON-mode replies that failed schema validation, by whether they were retried or the fallback was used.",
+    ("operation", "outcome"),
+)
+INTENT_ROUTES = registry.counter(
+    "intent_routes_total", "Conversation turns by intent route (recommend / follow_up fast paths, llm).", ("route",)
+)
+LLM_CALLS_SAVED = registry.counter(
+    "llm_calls_saved_total", "LLM calls skipped by the intent router's fast paths.", ("route",)
+)
+RERANK_RUNS = registry.counter(
+    "rerank_runs_total", "Product re-ranking runs, by scorer and outcome (ok, budget_exceeded, error).", ("scorer", "outcome")
+)
+SESSION_TURNS_DROPPED = registry.counter(
+    "session_write_behind_dropped_turns_total", "Buffered session turns dropped because the store stayed unavailable."
+)
+SESSION_LATENCY = registry.histogram(
+    "session_store_duration_seconds", "Session store latency as seen by the request.", ("operation",)
+)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+    """USD cost of a call from MODEL_PRICES (per million input/output tokens); 0 for unknown models."""
+    prices = settings.MODEL_PRICES.get(model)
+    if not prices:
+        return 0.0
+    input_price, output_price = (list(prices) + [0.0])[:2]
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+# ----------- Per-request breakdown -----------
+
+
+class RequestMetrics:
+    """Timings, token usage and cost accumulated while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.llm = {"calls": 0, "ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        self.embedding = {"calls": 0, "cache_hits": 0, "ms": 0.0, "tokens": 0}
+        self.retrieval = {"calls": 0, "ms": 0.0}
+        self.session = {}
+        self._lock = threading.Lock()
+
+    def add(self, section: str, **amounts):
+        with self._lock:
+            target = getattr(self, section)
+            for field, amount in amounts.items():
+                target[field] = target.get(field, 0) + amount
+
+    def to_dict(self) -> dict:
+        def rounded(values: dict) -> dict:
+            return {k: round(v, 6 if k == "cost_usd" else 2) if isinstance(v, float) else v for k, v in values.items()}
+
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages": rounded(self.stages),
+            "llm": rounded(self.llm),
+            "embedding": rounded(self.embedding),
+            "retrieval": rounded(self.retrieval),
+            "session": rounded(self.session),
+        }
+
+
+# Set by ``request_metrics``; like the embedding memo, the object is shared with the
+# threads and tasks spawned from the request.
+_request_metrics: ContextVar[RequestMetrics | None] = ContextVar("request_metrics", default=None)
+# Pipeline stage currently running, used to label LLM calls by the node that made them.
+_current_stage: ContextVar[str] = ContextVar("current_stage", default="")
+
+
+@contextmanager
+def request_metrics():
+    """Collects a ``RequestMetrics`` breakdown for the duration of one request."""
+    collected = RequestMetrics()
+    token = _request_metrics.set(collected)
+    try:
+        yield collected
+    finally:
+        try:
+            _request_metrics.reset(token)
+        except ValueError:
+            # An async generator closed from another context (e.g. client disconnect).
+            _request_metrics.set(None)
+
+
+def current_stage() -> str:
+    return _current_stage.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Times a pipeline stage and labels the LLM calls made inside it with ``name``."""
+    token = _current_stage.set(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_LATENCY.observe(seconds, stage=name)
+    collected = _request_metrics.get()
+    if collected is not None:
+        collected.add("stages", **{name: seconds * 1000})
+
+
+def record_llm_call(model: str, operation: str, seconds: float, usage=None, status: str = "ok"):
+    """Records one chat completion; ``usage`` is the response's usage object, if any."""
+    operation = operation or "other"
+    LLM_LATENCY.observe(seconds, model=model, operation=operation)
+    LLM_REQUESTS.inc(model=model, operation=operation, status=status)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    if usage is not None:
+        LLM_TOKENS.inc(prompt_tokens, model=model, operation=operation, type="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, operation=operation, type="completion")
+        LLM_COST.inc(cost, model=model, operation=operation)
+    collected = _request_metrics.get()
+    if collected is not None:
+        collected.add(
+            "llm",
+            calls=1,
+            ms=seconds * 1000,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_usd=cost,
+        )
+
+
+def record_embedding(model: str, seconds: float, texts: int = 1, usage=None):
+    """Records one embeddings API request covering ``texts`` inputs."""
+    tokens = getattr(usage, "prompt_tokens", 0) or 0
+    EMBEDDING_LATENCY.observe(seconds, model=model)
+    EMBEDDING_TEXTS.inc(texts, model=model, source="api")
+    EMBEDDING_TOKENS.inc(tokens, model=model)
+    EMBEDDING_COST.inc(estimate_cost(model, tokens), model=model)
+    collected = _request_metrics.get()
+    if collected is not None:
+        collected.add("embedding", calls=1, ms=seconds * 1000, tokens=tokens)
+
+
+def record_embedding_cache_hits(model: str, texts: int = 1):
+    EMBEDDING_TEXTS.inc(texts, model=model, source="cache")
+    collected = _request_metrics.get()
+    if collected is not None:
+        collected.add("embedding", cache_hits=texts)
+
+
+def record_retrieval(collection: str, seconds: float):
+    RETRIEVAL_LATENCY.observe(seconds, collection=collection)
+    collected = _request_metrics.get()
+    if collected is not None:
+        collected.add("retrieval", calls=1, ms=seconds * 1000)
+
+
+def record_session(operation: str, seconds: float):
+    SESSION_LATENCY.observe(seconds, operation=operation)
+    collected = _request_metrics.get()
+    if collected is not None:
+        collected.add("session", **{f"{operation}_ms": seconds * 1000})
@@ -1,34 +1,463 @@
-from app.services.embedding import generate_embedding
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+from app.config import settings
+from app.services.embedding import agenerate_embedding, generate_embedding, generate_embeddings
+from app.services.constraints import constraint_filter, facet_indexes
+from app.services.index_generations import GenerationWatcher, generations
+from app.services.lexical_index import lexical_indexes, reciprocal_rank_fusion
+from app.services.metrics import VECTOR_QUERY_LATENCY, record_retrieval
+from app.services.semantic_cache import invalidate_semantic_caches
 from loguru import logger
-from app.dependencies import chroma_client
+from app.dependencies import vector_store_client
+
+
+# Marks the end of the batch stream in PipelinedWriter's queues.
+_END_OF_BATCHES = object()
 
 
-def add_document(collection, text: str, metadata: dict):
+class PipelinedWriter:
     """
-    Adds a document to the specified collection with its embedding and metadata.
+    Embeds and upserts batches of documents on background threads while the caller keeps reading.
 
-    Args:
-        collection: The ChromaDB collection object.
-        text (str): The document text to embed and store.
-        metadata (dict): Metadata associated with the document (must include 'id').
+    Batches flow through two bounded queues: one thread embeds, a second writes
+    to the collection, so parsing, embedding I/O and vector store writes overlap.
+    ``submit`` blocks once ``depth`` batches are waiting to be embedded (backpressure),
+    so at most about ``2 * depth + 2`` batches are held in memory however large the
+    source is. The first error stops both stages and is re-raised from the next
+    ``submit`` or from ``close``.
+
+    Used as a context manager, leaving the block normally waits for every batch to be
+    written; leaving it with an exception discards what is still queued.
+    """
+
+    def __init__(self, collection, depth: int | None = None):
+        self.collection = collection
+        depth = depth or settings.INGEST_PIPELINE_DEPTH
+        self.written = 0
+        self._embed_queue = queue.Queue(maxsize=depth)
+        self._write_queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self._stopped = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._embed_loop, name="ingest-embed", daemon=True),
+            threading.Thread(target=self._write_loop, name="ingest-write", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _fail(self, error: Exception):
+        if self._error is None:
+            self._error = error
+        self._stopped.set()
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Blocks while ``target`` is full; returns False if the pipeline stopped meanwhile."""
+        while not self._stopped.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue):
+        """Blocks until ``source`` has an item; returns _END_OF_BATCHES once the pipeline stopped."""
+        while not self._stopped.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END_OF_BATCHES
+
+    def _embed_loop(self):
+        while True:
+            item = self._get(self._embed_queue)
+            if item is _END_OF_BATCHES:
+                self._put(self._write_queue, _END_OF_BATCHES)
+                return
+            texts, metadatas = item
+            try:
+                embeddings = generate_embeddings(texts)
+            except Exception as e:
+                logger.exception(f"Failed to embed documents {metadatas[0]['id']} .. {metadatas[-1]['id']}")
+                self._fail(e)
+                continue
+            self._put(self._write_queue, (texts, metadatas, embeddings))
+
+    def _write_loop(self):
+        while True:
+            item = self._get(self._write_queue)
+            if item is _END_OF_BATCHES:
+                return
+            texts, metadatas, embeddings = item
+            ids = [metadata["id"] for metadata in metadatas]
+            try:
+                self.collection.upsert(embeddings=embeddings, metadatas=metadatas, documents=texts, ids=ids)
+                self.written += len(ids)
+                logger.debug(f"Upserted {len(ids)} documents ({ids[0]} .. {ids[-1]}).")
+            except Exception as e:
+                logger.exception(f"Failed to upsert documents {ids[0]} .. {ids[-1]}")
+                self._fail(e)
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, texts: list, metadatas: list):
+        """
+        Queues one batch (metadata must include 'id'); blocks while the pipeline is full.
+
+        Raises:
+            Exception: The error that stopped the pipeline, if a batch failed.
+        """
+        self._raise_if_failed()
+        if texts and not self._put(self._embed_queue, (list(texts), list(metadatas))):
+            self._raise_if_failed()
+
+    def close(self) -> int:
+        """Waits for every queued batch to be written and returns the number of documents written."""
+        self._put(self._embed_queue, _END_OF_BATCHES)
+        for thread in self._threads:
+            thread.join()
+        self._raise_if_failed()
+        return self.written
+
+    def abort(self):
+        """Stops both stages, dropping batches that have not been written yet."""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def persist_collection(collection):
+    """
+    Flushes a collection to disk if its engine needs it.
+
+    Chroma writes through on every call; the NumPy engine keeps writes in memory
+    until ``persist`` is called, so ingestion calls this once per run.
     """
+    persist = getattr(collection, "persist", None)
+    if persist is not None:
+        persist()
+
+
+# ----------- Retrieval -----------
+
+# Embeddings computed during the current request, keyed by text. Set per request by
+# ``request_scope``; the dict is shared (not copied) with tasks and threads spawned
+# from the request, so every pipeline node sees the same memo.
+_request_embeddings: ContextVar[dict | None] = ContextVar("request_embeddings", default=None)
+
+
+@contextmanager
+def request_scope():
+    """Memoizes query embeddings for the duration of one request."""
+    token = _request_embeddings.set({})
     try:
-        logger.debug("Generating embedding for new document.")
+        yield
+    finally:
+        try:
+            _request_embeddings.reset(token)
+        except ValueError:
+            # An async generator closed from another context (e.g. client disconnect).
+            _request_embeddings.set(None)
+
+
+# query_many runs all but the first collection's query on this pool.
+_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+
+class RetrievalService:
+    """
+    Process-wide retrieval front end over the configured vector store client
+    (Chroma, or the NumPy engine in ``app.services.vector_store``).
+
+    Collection handles are looked up once and reused, and query embeddings are
+    memoized per request (see ``request_scope``), so embedding the same text in two
+    pipeline nodes costs one call. Collections with a lexical index get hybrid
+    (BM25 + vector) retrieval. ``query_many`` queries several collections
+    concurrently with one embedding.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str):
+        """Returns the cached handle for a collection, fetching it on first use."""
+        handle = self._collections.get(name)
+        if handle is None:
+            with self._lock:
+                handle = self._collections.get(name)
+                if handle is None:
+                    logger.debug(f"Retrieving '{name}' collection from vector store client.")
+                    handle = self._client.get_collection(name=name)
+                    self._collections[name] = handle
+        return handle
+
+    def invalidate(self, name: str | None = None):
+        """Forgets cached handles (all, or one), e.g. after a collection is deleted and recreated."""
+        with self._lock:
+            if name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(name, None)
+
+    def embed(self, text: str) -> list:
+        """Embeds ``text``, reusing an embedding already computed in this request."""
+        memo = _request_embeddings.get()
+        if memo is not None and text in memo:
+            return memo[text]
         embedding = generate_embedding(text)
-        logger.debug(f"Adding document with ID: {metadata.get('id')} to collection.")
-        collection.add(
-            embeddings=[embedding],
-            metadatas=[metadata],
-            documents=[text],
-            ids=[metadata["id"]],
+        if memo is not None:
+            memo[text] = embedding
+        return embedding
+
+    async def aembed(self, text: str) -> list:
+        """Async variant of ``embed``."""
+        memo = _request_embeddings.get()
+        if memo is not None and text in memo:
+            return memo[text]
+        embedding = await agenerate_embedding(text)
+        if memo is not None:
+            memo[text] = embedding
+        return embedding
+
+    def _vector_query(self, collection_name: str, embedding: list, n_results: int, where: dict | None = None) -> dict:
+        with VECTOR_QUERY_LATENCY.time(collection=collection_name):
+            try:
+                return self.collection(collection_name).query(
+                    query_embeddings=[embedding], n_results=n_results, where=where
+                )
+            except Exception:
+                # The collection may have been deleted and recreated by ingestion; retry once with a fresh handle.
+                self.invalidate(collection_name)
+                return self.collection(collection_name).query(
+                    query_embeddings=[embedding], n_results=n_results, where=where
+                )
+
+    def _run_query(
+        self, collection_name: str, query_text: str, embedding: list, n_results: int, constraints: dict | None = None
+    ) -> dict:
+        """
+        Vector query, fused with BM25 results when the collection has a lexical index.
+
+        Both rankings contribute up to HYBRID_CANDIDATES documents and are merged with
+        reciprocal rank fusion, so exact ingredient or product-name matches surface
+        even when their descriptions embed poorly. ``constraints`` are pushed down
+        into both rankings, so only matching products are returned.
+        """
+        where, allowed_ids = constraint_filter(collection_name, constraints)
+        if allowed_ids is not None:
+            if not allowed_ids:
+                logger.info(f"No documents in '{collection_name}' satisfy constraints {constraints}.")
+                return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+            n_results = min(n_results, len(allowed_ids))
+        index = lexical_indexes.get(collection_name) if settings.HYBRID_SEARCH_ENABLED else None
+        if index is None:
+            return self._vector_query(collection_name, embedding, n_results, where)
+        candidates = max(n_results, settings.HYBRID_CANDIDATES)
+        if allowed_ids is not None:
+            candidates = min(candidates, len(allowed_ids))
+        vector = self._vector_query(collection_name, embedding, candidates, where)
+        lexical = index.search(query_text, candidates, allowed_ids)
+        return self._fuse(collection_name, vector, lexical, n_results)
+
+    def _fuse(self, collection_name: str, vector: dict, lexical: list, n_results: int) -> dict:
+        """Merges vector and lexical rankings into one result in the collection's query format."""
+        rows = {
+            doc_id: (document, metadata, distance)
+            for doc_id, document, metadata, distance in zip(
+                vector["ids"][0], vector["documents"][0], vector["metadatas"][0], vector["distances"][0]
+            )
+        }
+        fused = reciprocal_rank_fusion(
+            [vector["ids"][0], [doc_id for doc_id, _ in lexical]], settings.RRF_K
+        )[:n_results]
+        missing = [doc_id for doc_id, _ in fused if doc_id not in rows]
+        if missing:
+            # Lexical-only hits: fetch their documents from the store.
+            extra = self.collection(collection_name).get(ids=missing, include=["metadatas", "documents"])
+            for doc_id, document, metadata in zip(extra["ids"], extra["documents"], extra["metadatas"]):
+                rows[doc_id] = (document, metadata, None)
+        # An ID can be missing from the store if the index is older than the collection.
+        fused = [(doc_id, score) for doc_id, score in fused if doc_id in rows]
+        logger.debug(
+            f"Hybrid retrieval on '{collection_name}': {len(vector['ids'][0])} vector + "
+            f"{len(lexical)} lexical candidates -> {len(fused)} results ({len(missing)} lexical-only)."
+        )
+        return {
+            "ids": [[doc_id for doc_id, _ in fused]],
+            "documents": [[rows[doc_id][0] for doc_id, _ in fused]],
+            "metadatas": [[rows[doc_id][1] for doc_id, _ in fused]],
+            "distances": [[rows[doc_id][2] for doc_id, _ in fused]],
+            "scores": [[score for _, score in fused]],
+        }
+
+    def query(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 5,
+        embedding: list | None = None,
+        constraints: dict | None = None,
+    ) -> dict:
+        """
+        Queries a collection for documents similar to ``query_text``.
+
+        Args:
+            collection_name (str): The name of the collection to query.
+            query_text (str): The text to query against the collection.
+            n_results (int): Number of top results to retrieve.
+            embedding (list | None): Precomputed embedding of ``query_text``.
+            constraints (dict | None): ProductConstraints fields to filter by.
+
+        Returns:
+            dict: Query results from the collection.
+        """
+        try:
+            started = time.perf_counter()
+            if embedding is None:
+                embedding = self.embed(query_text)
+            logger.debug(f"Querying '{collection_name}' for top {n_results} results.")
+            results = self._run_query(collection_name, query_text, embedding, n_results, constraints)
+            record_retrieval(collection_name, time.perf_counter() - started)
+            logger.info(
+                f"Retrieved {len(results['documents'][0])} documents for query: '{query_text}'"
+            )
+            return results
+        except Exception:
+            logger.exception(f"Failed to query collection '{collection_name}' for text: '{query_text}'")
+            raise
+
+    async def aquery(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 5,
+        embedding: list | None = None,
+        constraints: dict | None = None,
+    ) -> dict:
+        """
+        Async variant of ``query``. Vector store clients are blocking, so the query runs in a worker thread.
+        """
+        try:
+            started = time.perf_counter()
+            if embedding is None:
+                embedding = await self.aembed(query_text)
+            results = await asyncio.to_thread(
+                self._run_query, collection_name, query_text, embedding, n_results, constraints
+            )
+            record_retrieval(collection_name, time.perf_counter() - started)
+            logger.info(
+                f"Retrieved {len(results['documents'][0])} documents for query: '{query_text}'"
+            )
+            return results
+        except Exception:
+            logger.exception(f"Failed to query collection '{collection_name}' for text: '{query_text}'")
+            raise
+
+
+    def query_many(
+        self,
+        query_text: str,
+        n_results: dict,
+        constraints: dict | None = None,
+        embedding: list | None = None,
+        return_exceptions: bool = False,
+    ) -> dict:
+        """
+        Queries several collections concurrently with a single embedding of ``query_text``.
+
+        Args:
+            query_text (str): The text to query with.
+            n_results (dict): Mapping of collection name to number of results.
+            constraints (dict | None): Mapping of collection name to the ProductConstraints fields to filter it by.
+            embedding (list | None): Precomputed embedding of ``query_text``.
+            return_exceptions (bool): Return a failed collection's exception as its result instead of raising it.
+
+        Returns:
+            dict: Mapping of collection name to its query results.
+        """
+        if embedding is None:
+            embedding = self.embed(query_text)
+        constraints = constraints or {}
+        names = list(n_results)
+
+        def run(name: str) -> dict:
+            return self.query(name, query_text, n_results[name], embedding, constraints.get(name))
+
+        # The first collection is queried on this thread, the others alongside it.
+        futures = {name: _query_executor.submit(copy_context().run, run, name) for name in names[1:]}
+        results = {}
+        for name in names:
+            try:
+                results[name] = futures[name].result() if name in futures else run(name)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[name] = e
+        return results
+
+    async def aquery_many(
+        self,
+        query_text: str,
+        n_results: dict,
+        constraints: dict | None = None,
+        embedding: list | None = None,
+        return_exceptions: bool = False,
+    ) -> dict:
+        """Async variant of ``query_many``."""
+        if embedding is None:
+            embedding = await self.aembed(query_text)
+        constraints = constraints or {}
+        names = list(n_results)
+        results = await asyncio.gather(
+            *(self.aquery(name, query_text, n_results[name], embedding, constraints.get(name)) for name in names),
+            return_exceptions=return_exceptions,
         )
-        logger.info(f"Added document with ID: {metadata['id']}")
-    except Exception:
-        logger.exception(f"Failed to add document with ID: {metadata.get('id')}")
-        raise
+        return dict(zip(names, results))
+
+
+retrieval_service = RetrievalService(vector_store_client)
+
 
+def activate_index_generation(directory):
+    """Points the serving vector store and the lexical / facet indexes at a published index generation."""
+    vector_store_client.reopen(str(directory / "vector_store"))
+    lexical_indexes.reopen(str(directory / "lexical_index"))
+    facet_indexes.reopen(str(directory / "lexical_index"))
+    retrieval_service.invalidate()
+    # Cached answers may describe documents that changed or no longer exist.
+    invalidate_semantic_caches()
 
-def query_collection(collection_name: str, query_text: str, n_results: int = 5):
+
+# Switches this process to newly published generations in shared index mode (None otherwise).
+index_watcher = (
+    GenerationWatcher(generations, activate_index_generation, settings.SHARED_INDEX_POLL_SECONDS)
+    if generations is not None
+    else None
+)
+
+
+def query_collection(collection_name: str, query_text: str, n_results: int = 5, constraints: dict | None = None):
     """
     Queries the specified collection for documents similar to the query text.
 
@@ -36,23 +465,27 @@ def query_collection(collection_name: str, query_text: str, n_results: int = 5):
         collection_name (str): The name of the collection to query.
         query_text (str): The text to query against the collection.
         n_results (int): Number of top results to retrieve.
+        constraints (dict | None): ProductConstraints fields to filter by.
 
     Returns:
         dict: Query results from the collection.
     """
-    try:
-        logger.debug(f"Retrieving '{collection_name}' collection from Chroma client.")
-        collection_instance = chroma_client.get_collection(name=collection_name)
-        logger.debug("Generating embedding for query text.")
-        query_embedding = generate_embedding(query_text)
-        logger.debug(f"Querying collection for top {n_results} results.")
-        results = collection_instance.query(
-            query_embeddings=[query_embedding], n_results=n_results
-        )
-        logger.info(
-            f"Retrieved {len(results['documents'][0])} documents for query: '{query_text}'"
-        )
-        return results
-    except Exception:
-        logger.exception(f"Failed to query collection '{collection_name}' for text: '{query_text}'")
-        raise
+    return retrieval_service.query(collection_name, query_text, n_results, constraints=constraints)
+
+
+async def aquery_collection(
+    collection_name: str, query_text: str, n_results: int = 5, constraints: dict | None = None
+):
+    """
+    Async variant of ``query_collection``.
+
+    Args:
+        collection_name (str): The name of the collection to query.
+        query_text (str): The text to query against the collection.
+        n_results (int): Number of top results to retrieve.
+        constraints (dict | None): ProductConstraints fields to filter by.
+
+    Returns:
+        dict: Query results from the collection.
+    """
+    return await retrieval_service.aquery(collection_name, query_text, n_results, constraints=constraints)
@@ -0,0 +1,343 @@
+import asyncio
+import contextvars
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import numpy as np
+from loguru import logger
+from app.config import settings
+from app.dependencies import async_openai_client, openai_client
+from app.models.schemas import ProductConstraints
+from app.services.constraints import infer_category, ingredient_terms
+from app.services.intent_router import profile_terms
+from app.services.lexical_index import tokenize
+from app.services.metrics import RERANK_RUNS, current_stage, record_llm_call
+from app.services.rag import retrieval_service
+from app.services.semantic_cache import digest_ids, rerank_cache
+
+# Product fields the local scorer matches query terms against, with their weights;
+# the document text (the product description) counts least.
+RERANK_FIELDS = {"product_name": 3.0, "top_ingredients": 1.5, "benefits": 1.0}
+DESCRIPTION_WEIGHT = 0.5
+
+
+def _constraints(constraints) -> ProductConstraints:
+    if isinstance(constraints, ProductConstraints):
+        return constraints
+    return ProductConstraints(**(constraints or {}))
+
+
+class LocalScorer:
+    """
+    Cheap in-process relevance score: a lexical match of the query against the
+    product fields, a match of the product's metadata against the extracted
+    constraints, and the retrieval rank as a prior.
+
+    Every candidate is tokenized once; the scores are then a few matrix operations
+    over a (candidates x query terms) presence matrix, so a dozen candidates cost
+    well under a millisecond.
+    """
+
+    name = "local"
+    weights = {"lexical": 0.5, "metadata": 0.3, "retrieval": 0.2}
+
+    def _lexical(self, query: str, pairs: list) -> np.ndarray:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return np.zeros(len(pairs), dtype=np.float32)
+        columns = {term: j for j, term in enumerate(terms)}
+        fields = [*RERANK_FIELDS, None]
+        # presence[f, i, j]: query term j occurs in field f of candidate i.
+        presence = np.zeros((len(fields), len(pairs), len(terms)), dtype=np.float32)
+        for i, (document, metadata) in enumerate(pairs):
+            for f, field in enumerate(fields):
+                text = document if field is None else (metadata or {}).get(field)
+                for token in tokenize(text):
+                    j = columns.get(token)
+                    if j is not None:
+                        presence[f, i, j] = 1.0
+        field_weights = np.array([*RERANK_FIELDS.values(), DESCRIPTION_WEIGHT], dtype=np.float32)
+        weighted = np.tensordot(field_weights, presence, axes=1) / field_weights.sum()
+        # Terms that occur in fewer candidates separate them better.
+        document_frequency = presence.max(axis=0).sum(axis=0)
+        idf = np.log1p(len(pairs) / (1.0 + document_frequency))
+        return weighted @ idf / idf.sum()
+
+    def _metadata(self, pairs: list, constraints: ProductConstraints) -> np.ndarray:
+        columns = []
+        metadatas = [metadata or {} for _, metadata in pairs]
+        if constraints.categories:
+            wanted = set(constraints.categories)
+            columns.append(
+                [(m.get("category") or infer_category(m.get("product_name"))) in wanted for m in metadatas]
+            )
+        if constraints.include_ingredients:
+            wanted = set(constraints.include_ingredients)
+            columns.append(
+                [len(wanted & ingredient_terms(m.get("top_ingredients"))) / len(wanted) for m in metadatas]
+            )
+        if constraints.min_price is not None or constraints.max_price is not None:
+            low = -math.inf if constraints.min_price is None else constraints.min_price
+            high = math.inf if constraints.max_price is None else constraints.max_price
+            columns.append([low <= float(m.get("price") or 0.0) <= high for m in metadatas])
+        if not columns:
+            return np.zeros(len(pairs), dtype=np.float32)
+        return np.asarray(columns, dtype=np.float32).mean(axis=0)
+
+    def score(self, query: str, pairs: list, constraints, history: str = "") -> np.ndarray:
+        """
+        Scores the candidates; higher is more relevant.
+
+        Args:
+            query (str): The recommendation query.
+            pairs (list): (document, metadata) pairs in retrieval order.
+            constraints: ProductConstraints (or its dict form) extracted from the conversation.
+            history (str): Unused; part of the scorer interface.
+
+        Returns:
+            np.ndarray: One score in [0, 1] per candidate.
+        """
+        retrieval = 1.0 / (1.0 + np.arange(len(pairs), dtype=np.float32))
+        return (
+            self.weights["lexical"] * self._lexical(query, pairs)
+            + self.weights["metadata"] * self._metadata(pairs, _constraints(constraints))
+            + self.weights["retrieval"] * retrieval
+        )
+
+    async def ascore(self, query: str, pairs: list, constraints, history: str = "") -> np.ndarray:
+        return self.score(query, pairs, constraints, history)
+
+
+class LLMScorer:
+    """
+    Scores all candidates with one call to RERANK_LLM_MODEL using the
+    ``rerank_products.txt`` prompt (a 1-10 relevance score per product).
+
+    Scores are kept in a semantic cache keyed on the query embedding and the
+    candidate IDs, so a repeated or near-identical query over the same candidates
+    skips the call.
+    """
+
+    name = "llm"
+    # Per-product text sent to the model is cut to this many characters per field.
+    max_field_chars = 200
+
+    def _messages(self, query: str, pairs: list, history: str) -> list:
+        # Imported here: the pipeline module imports this one.
+        from app.utils.pipeline import prompt_template
+
+        products = [
+            {
+                "product_name": metadata.get("product_name"),
+                "price": metadata.get("price"),
+                "benefits": str(metadata.get("benefits") or "")[: self.max_field_chars],
+                "top_ingredients": str(metadata.get("top_ingredients") or "")[: self.max_field_chars],
+            }
+            for _, metadata in pairs
+        ]
+        prompt = prompt_template("rerank_products.txt").render(
+            user_query=query,
+            conversation_history=history,
+            product_list=json.dumps(products, indent=1),
+        )
+        return [{"role": "user", "content": prompt}]
+
+    def _request(self, messages: list) -> dict:
+        return {
+            "model": settings.RERANK_LLM_MODEL,
+            "messages": messages,
+            "max_tokens": 300,
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+        }
+
+    @staticmethod
+    def _parse(response: str, pairs: list) -> np.ndarray:
+        """
+        Maps the model's {product_name, relevance_score} entries back to the candidates.
+
+        Raises:
+            ValueError: If the response holds no score for any candidate.
+        """
+        # Imported here: the pipeline module imports this one.
+        from app.utils.pipeline import _parse_json_response
+
+        data = _parse_json_response(response, "rerank_products", {})
+        if isinstance(data, dict):
+            data = next((value for value in data.values() if isinstance(value, list)), [])
+        by_name = {}
+        for entry in data if isinstance(data, list) else []:
+            if isinstance(entry, dict) and entry.get("product_name") is not None:
+                try:
+                    by_name[str(entry["product_name"]).strip().lower()] = float(entry["relevance_score"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+        names = [str(metadata.get("product_name") or "").strip().lower() for _, metadata in pairs]
+        if not any(name in by_name for name in names):
+            raise ValueError("Re-ranking response scored none of the candidates.")
+        return np.array([by_name.get(name, 0.0) for name in names], dtype=np.float32)
+
+    def _cache_key(self, query: str, pairs: list) -> str:
+        return digest_ids([metadata.get("id") for _, metadata in pairs], profile_terms(query))
+
+    def score(self, query: str, pairs: list, constraints, history: str = "") -> np.ndarray:
+        digest, embedding = self._cache_key(query, pairs), None
+        if rerank_cache is not None:
+            embedding = retrieval_service.embed(query)
+            cached = rerank_cache.lookup(embedding, digest)
+            if cached is not None:
+                return cached
+        started = time.perf_counter()
+        try:
+            response = openai_client.chat.completions.create(**self._request(self._messages(query, pairs, history)))
+        except Exception:
+            record_llm_call(settings.RERANK_LLM_MODEL, current_stage(), time.perf_counter() - started, status="error")
+            raise
+        record_llm_call(settings.RERANK_LLM_MODEL, current_stage(), time.perf_counter() - started, response.usage)
+        scores = self._parse(response.choices[0].message.content, pairs)
+        if rerank_cache is not None:
+            rerank_cache.store(embedding, digest, scores, time.perf_counter() - started)
+        return scores
+
+    async def ascore(self, query: str, pairs: list, constraints, history: str = "") -> np.ndarray:
+        digest, embedding = self._cache_key(query, pairs), None
+        if rerank_cache is not None:
+            embedding = await retrieval_service.aembed(query)
+            cached = rerank_cache.lookup(embedding, digest)
+            if cached is not None:
+                return cached
+        started = time.perf_counter()
+        try:
+            response = await async_openai_client.chat.completions.create(
+                **self._request(self._messages(query, pairs, history))
+            )
+        except Exception:
+            record_llm_call(settings.RERANK_LLM_MODEL, current_stage(), time.perf_counter() - started, status="error")
+            raise
+        record_llm_call(settings.RERANK_LLM_MODEL, current_stage(), time.perf_counter() - started, response.usage)
+        scores = self._parse(response.choices[0].message.content, pairs)
+        if rerank_cache is not None:
+            rerank_cache.store(embedding, digest, scores, time.perf_counter() - started)
+        return scores
+
+
+# Scorers selectable with RERANK_SCORER.
+SCORERS = {"local": LocalScorer, "llm": LLMScorer}
+
+# The sync pipeline runs non-local scorers here so the budget can be enforced.
+_scorer_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rerank")
+
+
+def _discard_result(task: asyncio.Task):
+    # Retrieves the outcome of a scorer call that outlived its budget, so a late
+    # failure is not reported as an unretrieved task exception.
+    if not task.cancelled():
+        task.exception()
+
+
+class Reranker:
+    """
+    Re-orders retrieved products and keeps the best ``top_k``.
+
+    The local scorer always runs: it is the fallback and breaks ties of the
+    configured scorer. A non-local scorer gets ``budget_ms``; if it is slower, or
+    fails, the local order is used. A scorer call that misses the budget is left to
+    finish in the background, so its result still lands in its cache. If the local
+    scorer fails too, the retrieval order is kept.
+    """
+
+    def __init__(self, scorer, budget_ms: float):
+        self.scorer = scorer
+        self.local = scorer if isinstance(scorer, LocalScorer) else LocalScorer()
+        self.budget = budget_ms / 1000
+
+    def _order(self, pairs: list, top_k: int, primary, local) -> list:
+        # lexsort sorts by its last key first; negated for descending order.
+        order = np.lexsort((-local, -primary)) if primary is not None else np.argsort(-local, kind="stable")
+        return [pairs[i] for i in order[:top_k]]
+
+    def _local_scores(self, query: str, pairs: list, constraints):
+        try:
+            return self.local.score(query, pairs, constraints)
+        except Exception as e:
+            logger.error(f"Local re-ranking failed, keeping the retrieval order: {e}")
+            RERANK_RUNS.inc(scorer=self.local.name, outcome="error")
+            return None
+
+    def _finish(self, pairs: list, top_k: int, primary, local, outcome: str) -> list:
+        RERANK_RUNS.inc(scorer=self.scorer.name, outcome=outcome)
+        if local is None:
+            return pairs[:top_k]
+        return self._order(pairs, top_k, primary, local)
+
+    def rerank(self, query: str, pairs: list, constraints=None, history: str = "", top_k: int | None = None) -> list:
+        """
+        Re-ranks (document, metadata) pairs for ``query``.
+
+        Args:
+            query (str): The recommendation query.
+            pairs (list): (document, metadata) pairs in retrieval order.
+            constraints: ProductConstraints (or its dict form) extracted from the conversation.
+            history (str): The conversation so far, for scorers that read it.
+            top_k (int | None): How many pairs to keep. Defaults to all of them.
+
+        Returns:
+            list: The best ``top_k`` pairs, most relevant first.
+        """
+        top_k = top_k or len(pairs)
+        if len(pairs) <= 1:
+            return pairs[:top_k]
+        local = self._local_scores(query, pairs, constraints)
+        if self.scorer is self.local:
+            return self._finish(pairs, top_k, None, local, "ok")
+        future = _scorer_executor.submit(
+            contextvars.copy_context().run, self.scorer.score, query, pairs, constraints, history
+        )
+        try:
+            primary = future.result(timeout=self.budget)
+        except FutureTimeoutError:
+            logger.warning(f"Re-ranking with '{self.scorer.name}' exceeded {self.budget * 1000:.0f} ms; using the local order.")
+            return self._finish(pairs, top_k, None, local, "budget_exceeded")
+        except Exception as e:
+            logger.warning(f"Re-ranking with '{self.scorer.name}' failed, using the local order: {e}")
+            return self._finish(pairs, top_k, None, local, "error")
+        return self._finish(pairs, top_k, primary, local if local is not None else np.zeros(len(pairs)), "ok")
+
+    async def arerank(
+        self, query: str, pairs: list, constraints=None, history: str = "", top_k: int | None = None
+    ) -> list:
+        """Async variant of ``rerank``."""
+        top_k = top_k or len(pairs)
+        if len(pairs) <= 1:
+            return pairs[:top_k]
+        local = self._local_scores(query, pairs, constraints)
+        if self.scorer is self.local:
+            return self._finish(pairs, top_k, None, local, "ok")
+        task = asyncio.ensure_future(self.scorer.ascore(query, pairs, constraints, history))
+        try:
+            # Shielded, so a call that misses the budget still completes (and is cached).
+            primary = await asyncio.wait_for(asyncio.shield(task), self.budget)
+        except asyncio.TimeoutError:
+            task.add_done_callback(_discard_result)
+            logger.warning(f"Re-ranking with '{self.scorer.name}' exceeded {self.budget * 1000:.0f} ms; using the local order.")
+            return self._finish(pairs, top_k, None, local, "budget_exceeded")
+        except Exception as e:
+            logger.warning(f"Re-ranking with '{self.scorer.name}' failed, using the local order: {e}")
+            return self._finish(pairs, top_k, None, local, "error")
+        return self._finish(pairs, top_k, primary, local if local is not None else np.zeros(len(pairs)), "ok")
+
+
+def _make_reranker() -> Reranker:
+    scorer = SCORERS.get(settings.RERANK_SCORER)
+    if scorer is None:
+        raise ValueError(f"Unknown RERANK_SCORER '{settings.RERANK_SCORER}' (expected one of {sorted(SCORERS)}).")
+    return Reranker(scorer(), settings.RERANK_BUDGET_MS)
+
+
+try:
+    reranker = _make_reranker()
+except Exception as e:
+    logger.error(f"Failed to initialize the re-ranker: {e}")
+    raise
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from loguru import logger
+from app.config import settings
+
+
+def digest_ids(ids, terms=()) -> str:
+    """
+    Order-sensitive digest of retrieved document IDs, plus the query's profile
+    ``terms`` (see ``intent_router.profile_terms``). Embeddings of queries that differ
+    only in a skin type or concern ("for oily skin" / "for dry skin") can be closer
+    than any usable threshold; keying on the terms keeps their answers apart.
+    """
+    key = "\0".join(map(str, ids)) + "\1" + "\0".join(sorted(terms))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """
+    In-memory cache of LLM responses keyed by query embedding + retrieved-documents digest.
+
+    A lookup hits when an unexpired entry was stored for the same set of retrieved
+    documents and its query embedding has cosine similarity >= ``threshold`` with the
+    new query, so near-duplicate phrasings of a question share one LLM response.
+    Entries expire after ``ttl_seconds``; beyond ``max_entries`` the least recently
+    used are evicted.
+    """
+
+    def __init__(self, name: str, threshold: float, ttl_seconds: float, max_entries: int):
+        self.name = name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        # entry id -> (unit embedding, digest, response, created_at, llm_latency)
+        self._entries = OrderedDict()
+        # digest -> entry ids, so a lookup only compares against candidates for the same documents
+        self._by_digest = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, digest: str):
+        """
+        Returns the cached response for a similar query over the same documents, or None.
+        """
+        query = self._unit(embedding)
+        now = time.time()
+        with self._lock:
+            candidate_ids = [
+                entry_id
+                for entry_id in self._by_digest.get(digest, ())
+                if now - self._entries[entry_id][3] <= self.ttl_seconds
+            ]
+            if candidate_ids:
+                matrix = np.stack([self._entries[entry_id][0] for entry_id in candidate_ids])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = candidate_ids[best]
+                    self._entries.move_to_end(entry_id)
+                    _, _, response, _, llm_latency = self._entries[entry_id]
+                    self.hits += 1
+                    self.latency_saved += llm_latency
+                    logger.info(f"Semantic cache '{self.name}' hit (similarity {scores[best]:.3f}).")
+                    return response
+            self.misses += 1
+            return None
+
+    def store(self, embedding, digest: str, response, llm_latency: float = 0.0):
+        """Caches ``response``; ``llm_latency`` is the time a future hit will save."""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (self._unit(embedding), digest, response, time.time(), llm_latency)
+            self._by_digest.setdefault(digest, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._purge_expired()
+
+    def _remove(self, entry_id: int):
+        _, digest, _, _, _ = self._entries.pop(entry_id)
+        ids = self._by_digest.get(digest, [])
+        ids.remove(entry_id)
+        if not ids:
+            self._by_digest.pop(digest, None)
+
+    def _purge_expired(self):
+        """
+        Drops expired entries from the old end of the LRU order, stopping at the first
+        unexpired one so a store costs O(expired) rather than O(entries).
+
+        An expired entry behind a recently hit one is left for LRU eviction; lookups
+        ignore it meanwhile because they check the TTL themselves.
+        """
+        cutoff = time.time() - self.ttl_seconds
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if entry[3] >= cutoff:
+                break
+            self._remove(entry_id)
+
+    def invalidate(self):
+        """Drops every entry, e.g. after ingestion changed the underlying collections."""
+        with self._lock:
+            self._entries.clear()
+            self._by_digest.clear()
+        logger.info(f"Semantic cache '{self.name}' invalidated.")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 3),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+def _make_cache(name: str) -> SemanticCache | None:
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    return SemanticCache(
+        name,
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    )
+
+
+# One cache per LLM call site; their responses are not interchangeable.
+analyze_query_cache = _make_cache("analyze_query")
+recommendation_cache = _make_cache("recommend_products")
+rerank_cache = _make_cache("rerank_products")
+
+
+def invalidate_semantic_caches():
+    """Invalidates every semantic cache; called when ingestion changes the collections."""
+    for cache in (analyze_query_cache, recommendation_cache, rerank_cache):
+        if cache is not None:
+            cache.invalidate()
+
+
+def semantic_cache_stats() -> dict:
+    return {
+        cache.name: cache.stats()
+        for cache in (analyze_query_cache, recommendation_cache, rerank_cache)
+        if cache is not None
+    }
@@ -1,14 +1,178 @@
 import json
+import time
+from functools import lru_cache
 from uuid import uuid4
 from loguru import logger
-from app.dependencies import redis_client
+from app.config import settings
+from app.services.metrics import record_session
+from app.services.session_store import session_store
 
-SESSION_EXPIRATION_SECONDS = 3600  # 1 hour
+# Turns are stored one per list element as compact JSON: ["u", "text"].
+_ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+_CODE_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+def encode_turn(turn: dict) -> str:
+    """Compact serialized form of one conversation turn."""
+    return json.dumps(
+        [_ROLE_CODES.get(turn["role"], turn["role"]), turn["content"]],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def decode_turn(raw: str) -> dict:
+    code, content = json.loads(raw)
+    return {"role": _CODE_ROLES.get(code, code), "content": content}
+
+
+# ----------- Token counting -----------
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """The gpt-4o tokenizer if tiktoken is installed, else None (counts are then estimated)."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        logger.info("tiktoken unavailable; estimating history token counts.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        # ~4 characters per token for English; round up like the embedding batch estimate.
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages: list) -> int:
+    """Tokens the messages take up in a chat prompt, including ~4 tokens of per-message framing."""
+    return sum(count_tokens(str(message.get("content", ""))) + 4 for message in messages)
+
+
+class HistoryManager:
+    """
+    Keeps the conversation history sent with each prompt within a token budget.
+
+    A session's stored history is a rolling summary of older turns plus the turns
+    since. ``fit`` trims what goes into a prompt: the summary is kept and the
+    oldest verbatim turns are dropped until the budget is met. Once the stored turns
+    themselves exceed the budget, ``turns_to_summarize`` says how many of the oldest
+    should be folded into the summary (all but the ``keep_recent_turns`` latest), which
+    ``asummarize_session`` does off the request path.
+    """
+
+    def __init__(self, token_budget: int, keep_recent_turns: int):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+
+    @staticmethod
+    def summary_message(summary: str) -> dict:
+        return {"role": "system", "content": f"{SUMMARY_PREFIX}{summary}"}
+
+    @staticmethod
+    def split(history: list) -> tuple[str, list]:
+        """Separates a loaded history into (summary text, verbatim turns)."""
+        if history and history[0]["role"] == "system" and history[0]["content"].startswith(SUMMARY_PREFIX):
+            return history[0]["content"][len(SUMMARY_PREFIX):], history[1:]
+        return "", history
+
+    def fit(self, history: list) -> list:
+        """Returns the most recent part of ``history`` (plus its summary) that fits the token budget."""
+        summary, turns = self.split(history)
+        head = [self.summary_message(summary)] if summary else []
+        budget = self.token_budget - count_message_tokens(head)
+        kept, used = [], 0
+        for turn in reversed(turns):
+            tokens = count_message_tokens([turn])
+            if kept and used + tokens > budget:
+                break
+            kept.append(turn)
+            used += tokens
+        dropped = len(turns) - len(kept)
+        if dropped:
+            logger.info(f"History over {self.token_budget} tokens; dropped {dropped} oldest turns from the prompt.")
+        return head + kept[::-1]
+
+    def turns_to_summarize(self, history: list) -> int:
+        """Number of oldest stored turns to fold into the summary (0 while within budget)."""
+        _, turns = self.split(history)
+        if count_message_tokens(history) <= self.token_budget:
+            return 0
+        return max(0, len(turns) - self.keep_recent_turns)
+
+
+history_manager = HistoryManager(settings.HISTORY_TOKEN_BUDGET, settings.HISTORY_KEEP_RECENT_TURNS)
+
+
+# ----------- Session storage -----------
+
+
+def _history_from(raw_turns: list, summary: str | None) -> list:
+    history = [decode_turn(raw) for raw in raw_turns or []]
+    if summary:
+        history.insert(0, HistoryManager.summary_message(summary))
+    return history
 
 
 def get_or_create_session(session_id: str | None) -> tuple[str, list]:
     """
-    Retrieves an existing session history from Redis or creates a new one.
+    Retrieves an existing session history from the session store or creates a new one.
+
+    Args:
+        session_id (str | None): The session ID from the request.
+
+    Returns:
+        tuple[str, list]: A tuple containing the session ID and the conversation history
+        (a summary message of older turns first, if there is one).
+    """
+    if session_id is None:
+        session_id = str(uuid4())
+        logger.info(f"No session ID provided. Created new session: {session_id}")
+        return session_id, []
+
+    try:
+        history = _history_from(*session_store.load(session_id))
+        if history:
+            logger.info(f"Retrieved existing session: {session_id}")
+        else:
+            logger.info(f"No data for session {session_id}. Starting new conversation.")
+        return session_id, history
+    except Exception as e:
+        logger.error(f"Error retrieving session {session_id}: {e}")
+        # Fallback to a new session to avoid crashing
+        return session_id, []
+
+
+def append_turns(session_id: str, turns: list):
+    """
+    Appends this request's new turns to the session.
+
+    Only the new turns are sent; the store caps the list length and refreshes the
+    TTL in the same round-trip, and the stored history is never rewritten.
+
+    Args:
+        session_id (str): The session ID.
+        turns (list): The turns added by this request.
+    """
+    if not turns:
+        return
+    try:
+        session_store.append(session_id, [encode_turn(turn) for turn in turns])
+        logger.info(f"Successfully updated session: {session_id}")
+    except Exception as e:
+        logger.error(f"Error updating session {session_id}: {e}")
+
+
+async def aget_or_create_session(session_id: str | None) -> tuple[str, list]:
+    """
+    Async variant of ``get_or_create_session``.
 
     Args:
         session_id (str | None): The session ID from the request.
@@ -22,32 +186,66 @@ def get_or_create_session(session_id: str | None) -> tuple[str, list]:
         return session_id, []
 
     try:
-        session_data = redis_client.get(session_id)
-        if session_data:
+        started = time.perf_counter()
+        history = _history_from(*await session_store.aload(session_id))
+        record_session("load", time.perf_counter() - started)
+        if history:
             logger.info(f"Retrieved existing session: {session_id}")
-            conversation_history = json.loads(session_data)
-            return session_id, conversation_history
         else:
             logger.info(f"No data for session {session_id}. Starting new conversation.")
-            return session_id, []
+        return session_id, history
     except Exception as e:
-        logger.error(f"Error retrieving session {session_id} from Redis: {e}")
+        logger.error(f"Error retrieving session {session_id}: {e}")
         # Fallback to a new session to avoid crashing
         return session_id, []
 
 
-def update_session(session_id: str, conversation_history: list):
+async def aappend_turns(session_id: str, turns: list):
     """
-    Updates a session in Redis with the latest conversation history.
+    Async variant of ``append_turns``.
 
     Args:
         session_id (str): The session ID.
-        conversation_history (list): The full conversation history to save.
+        turns (list): The turns added by this request.
     """
+    if not turns:
+        return
     try:
-        session_data = json.dumps(conversation_history)
-        redis_client.set(session_id, session_data, ex=SESSION_EXPIRATION_SECONDS)
+        started = time.perf_counter()
+        await session_store.aappend(session_id, [encode_turn(turn) for turn in turns])
+        record_session("save", time.perf_counter() - started)
         logger.info(f"Successfully updated session: {session_id}")
     except Exception as e:
-        logger.error(f"Error updating session {session_id} in Redis: {e}")
+        logger.error(f"Error updating session {session_id}: {e}")
+
+
+# Sessions with a summarization in flight, so one session is never summarized twice at once.
+_summarizing = set()
 
+
+async def asummarize_session(session_id: str, history: list, summarizer):
+    """
+    Folds the oldest turns of an over-budget session into its rolling summary.
+
+    Meant to run in the background after a response has been sent. The new summary
+    is written and the summarized turns are removed from the head of the list in one
+    store operation; turns appended meanwhile go to the tail and are unaffected.
+
+    Args:
+        session_id (str): The session ID.
+        history (list): The session's stored history (summary message first, if any).
+        summarizer: ``async (previous_summary, turns) -> str`` producing the new summary.
+    """
+    count = history_manager.turns_to_summarize(history)
+    if not count or session_id in _summarizing:
+        return
+    _summarizing.add(session_id)
+    try:
+        previous, turns = HistoryManager.split(history)
+        summary = await summarizer(previous, turns[:count])
+        await session_store.acompact(session_id, summary, count)
+        logger.info(f"Summarized {count} older turns of session {session_id}.")
+    except Exception as e:
+        logger.error(f"Failed to summarize session {session_id}: {e}")
+    finally:
+        _summarizing.discard(session_id)
@@ -0,0 +1,423 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from loguru import logger
+from app.config import settings
+from app.services.metrics import SESSION_TURNS_DROPPED
+
+
+def _turns_key(session_id: str) -> str:
+    return f"{session_id}:turns"
+
+
+def _summary_key(session_id: str) -> str:
+    return f"{session_id}:summary"
+
+
+class SessionStore:
+    """
+    Storage for conversation sessions: an append-only list of encoded turns plus a
+    rolling summary per session, both expiring ``ttl_seconds`` after the last write.
+
+    Backends implement the sync methods; the async ones default to running them in
+    a worker thread and are overridden where the backend has a native async client.
+    """
+
+    def __init__(self, ttl_seconds: int, max_turns: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+
+    def load(self, session_id: str) -> tuple[list, str | None]:
+        """Returns the session's encoded turns (oldest first) and its summary."""
+        raise NotImplementedError
+
+    def append(self, session_id: str, turns: list):
+        """Appends encoded turns, caps the list at ``max_turns`` and refreshes the TTL."""
+        self.append_many({session_id: turns})
+
+    def append_many(self, batch: dict):
+        """Appends turns for several sessions ({session_id: turns}); backends batch the round-trips."""
+        for session_id, turns in batch.items():
+            self.append(session_id, turns)
+
+    def compact(self, session_id: str, summary: str, count: int):
+        """Stores a new summary and drops the ``count`` oldest turns it now covers."""
+        raise NotImplementedError
+
+    async def aload(self, session_id: str) -> tuple[list, str | None]:
+        return await asyncio.to_thread(self.load, session_id)
+
+    async def aappend(self, session_id: str, turns: list):
+        await asyncio.to_thread(self.append, session_id, turns)
+
+    async def acompact(self, session_id: str, summary: str, count: int):
+        await asyncio.to_thread(self.compact, session_id, summary, count)
+
+    def ping(self):
+        """Raises if the backend cannot be reached (used by the readiness check)."""
+
+    def close(self):
+        """Releases connections and flushes pending writes."""
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process session store with TTL expiry and LRU eviction beyond ``max_sessions``.
+
+    For single-node deployments and local runs; sessions are lost on restart and not
+    shared between worker processes.
+    """
+
+    def __init__(self, ttl_seconds: int, max_turns: int, max_sessions: int):
+        super().__init__(ttl_seconds, max_turns)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> [turns, summary, expires_at]
+        self._lock = threading.Lock()
+
+    def _live(self, session_id: str):
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry[2] < time.monotonic():
+            del self._sessions[session_id]
+            return None
+        return entry
+
+    def _touch(self, session_id: str):
+        entry = self._live(session_id)
+        if entry is None:
+            entry = [[], None, 0.0]
+            self._sessions[session_id] = entry
+        entry[2] = time.monotonic() + self.ttl_seconds
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return entry
+
+    def load(self, session_id: str) -> tuple[list, str | None]:
+        with self._lock:
+            entry = self._live(session_id)
+            if entry is None:
+                return [], None
+            self._sessions.move_to_end(session_id)
+            return list(entry[0]), entry[1]
+
+    def append(self, session_id: str, turns: list):
+        with self._lock:
+            entry = self._touch(session_id)
+            entry[0].extend(turns)
+            del entry[0][:-self.max_turns]
+
+    def append_many(self, batch: dict):
+        for session_id, turns in batch.items():
+            self.append(session_id, turns)
+
+    def compact(self, session_id: str, summary: str, count: int):
+        with self._lock:
+            entry = self._touch(session_id)
+            entry[1] = summary
+            del entry[0][:count]
+
+    # No I/O, so the async variants run inline instead of in a thread.
+    async def aload(self, session_id: str) -> tuple[list, str | None]:
+        return self.load(session_id)
+
+    async def aappend(self, session_id: str, turns: list):
+        self.append(session_id, turns)
+
+    async def acompact(self, session_id: str, summary: str, count: int):
+        self.compact(session_id, summary, count)
+
+
+class _PipelinedRedisStore(SessionStore):
+    """Command sequences shared by the Redis-protocol backends; subclasses provide pipelines."""
+
+    def _pipeline(self):
+        raise NotImplementedError
+
+    def _apipeline(self):
+        raise NotImplementedError
+
+    async def _aexec(self, pipeline):
+        return await pipeline.execute()
+
+    def _exec(self, pipeline):
+        return pipeline.execute()
+
+    def _queue_load(self, pipeline, session_id: str):
+        pipeline.lrange(_turns_key(session_id), 0, -1)
+        pipeline.get(_summary_key(session_id))
+
+    def _queue_append(self, pipeline, session_id: str, turns: list):
+        key = _turns_key(session_id)
+        pipeline.rpush(key, *turns)
+        pipeline.ltrim(key, -self.max_turns, -1)
+        pipeline.expire(key, self.ttl_seconds)
+        pipeline.expire(_summary_key(session_id), self.ttl_seconds)
+
+    def _queue_compact(self, pipeline, session_id: str, summary: str, count: int):
+        pipeline.set(_summary_key(session_id), summary, ex=self.ttl_seconds)
+        pipeline.ltrim(_turns_key(session_id), count, -1)
+
+    def load(self, session_id: str) -> tuple[list, str | None]:
+        pipeline = self._pipeline()
+        self._queue_load(pipeline, session_id)
+        turns, summary = self._exec(pipeline)
+        return turns or [], summary
+
+    def append(self, session_id: str, turns: list):
+        self.append_many({session_id: turns})
+
+    def append_many(self, batch: dict):
+        pipeline = self._pipeline()
+        for session_id, turns in batch.items():
+            if turns:
+                self._queue_append(pipeline, session_id, turns)
+        self._exec(pipeline)
+
+    def compact(self, session_id: str, summary: str, count: int):
+        pipeline = self._pipeline()
+        self._queue_compact(pipeline, session_id, summary, count)
+        self._exec(pipeline)
+
+    async def aload(self, session_id: str) -> tuple[list, str | None]:
+        pipeline = self._apipeline()
+        self._queue_load(pipeline, session_id)
+        turns, summary = await self._aexec(pipeline)
+        return turns or [], summary
+
+    async def aappend(self, session_id: str, turns: list):
+        pipeline = self._apipeline()
+        self._queue_append(pipeline, session_id, turns)
+        await self._aexec(pipeline)
+
+    async def acompact(self, session_id: str, summary: str, count: int):
+        pipeline = self._apipeline()
+        self._queue_compact(pipeline, session_id, summary, count)
+        await self._aexec(pipeline)
+
+    def ping(self):
+        self._client.ping()
+
+
+class UpstashSessionStore(_PipelinedRedisStore):
+    """Sessions in Upstash Redis over its REST API; each pipeline is one HTTPS request."""
+
+    def __init__(self, client, async_client, ttl_seconds: int, max_turns: int):
+        super().__init__(ttl_seconds, max_turns)
+        self._client = client
+        self._async_client = async_client
+
+    def _pipeline(self):
+        return self._client.pipeline()
+
+    def _apipeline(self):
+        return self._async_client.pipeline()
+
+    def _exec(self, pipeline):
+        return pipeline.exec()
+
+    async def _aexec(self, pipeline):
+        return await pipeline.exec()
+
+
+class RedisSessionStore(_PipelinedRedisStore):
+    """
+    Sessions in a standard Redis server over pooled TCP connections.
+
+    Sync and async clients each draw from a bounded connection pool, so requests
+    reuse warm connections instead of reconnecting, and every operation is a single
+    pipelined round-trip (no MULTI/EXEC, since each pipeline touches one session).
+    """
+
+    def __init__(self, url: str, ttl_seconds: int, max_turns: int, pool_size: int):
+        # Imported here so other session stores don't pay for the import.
+        try:
+            import redis
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise ImportError("SESSION_STORE=redis requires the 'redis' package.") from e
+        super().__init__(ttl_seconds, max_turns)
+        self._client = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(url, max_connections=pool_size, decode_responses=True)
+        )
+        self._async_client = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(url, max_connections=pool_size, decode_responses=True)
+        )
+
+    def _pipeline(self):
+        return self._client.pipeline(transaction=False)
+
+    def _apipeline(self):
+        return self._async_client.pipeline(transaction=False)
+
+    def close(self):
+        self._client.close()
+
+
+class WriteBehindSessionStore(SessionStore):
+    """
+    Buffers appends in memory and flushes them to ``inner`` from a background thread.
+
+    ``aappend`` returns without any I/O, taking the session write off the request
+    path. Pending turns are merged into ``load`` results, so a session reads its own
+    writes before they are flushed. Flushes happen every ``flush_interval`` seconds,
+    or sooner once ``max_pending`` turns are queued, with all pending sessions sent
+    in one batch. Turns still buffered at a crash are lost (at most one interval).
+
+    A failed flush keeps its turns for the next round, but at most ``max_buffered``
+    turns are held: while the inner store stays down, the oldest are dropped (and
+    counted in session_write_behind_dropped_turns_total) so memory stays bounded.
+    """
+
+    def __init__(
+        self, inner: SessionStore, flush_interval: float, max_pending: int = 500, max_buffered: int = 10000
+    ):
+        super().__init__(inner.ttl_seconds, inner.max_turns)
+        self.inner = inner
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffered = max(max_buffered, max_pending)
+        self._pending = {}  # session_id -> encoded turns not yet written
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        # One flush at a time, so a session's turns reach ``inner`` in order and a
+        # failed batch is requeued before the next one is taken.
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="session-write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes every pending append to the inner store."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._pending_count = self._pending, {}, 0
+            if not batch:
+                return
+            try:
+                self.inner.append_many(batch)
+            except Exception as e:
+                logger.error(f"Write-behind flush of {len(batch)} sessions failed: {e}")
+                self._requeue(batch)
+
+    def _requeue(self, batch: dict):
+        """Puts unwritten turns back in front of anything appended meanwhile, to retry next round."""
+        with self._lock:
+            requeued = {session_id: turns + self._pending.pop(session_id, []) for session_id, turns in batch.items()}
+            requeued.update(self._pending)
+            self._pending = requeued
+            self._pending_count += sum(len(turns) for turns in batch.values())
+            dropped = self._drop_oldest()
+        if dropped:
+            SESSION_TURNS_DROPPED.inc(dropped)
+            logger.warning(f"Write-behind buffer full; dropped the {dropped} oldest pending turns.")
+
+    def _drop_oldest(self) -> int:
+        """Trims pending turns to ``max_buffered``, oldest first. Call with the lock held."""
+        excess = self._pending_count - self.max_buffered
+        dropped = 0
+        for session_id in list(self._pending):
+            if excess <= 0:
+                break
+            turns = self._pending[session_id]
+            count = min(len(turns), excess)
+            del turns[:count]
+            if not turns:
+                del self._pending[session_id]
+            excess -= count
+            dropped += count
+        self._pending_count -= dropped
+        return dropped
+
+    def _flush_session(self, session_id: str):
+        with self._flush_lock:
+            with self._lock:
+                turns = self._pending.pop(session_id, None)
+                if turns:
+                    self._pending_count -= len(turns)
+            if turns:
+                try:
+                    self.inner.append(session_id, turns)
+                except Exception:
+                    # Keep the turns for the next flush; the caller's compaction must not go ahead.
+                    self._requeue({session_id: turns})
+                    raise
+
+    def load(self, session_id: str) -> tuple[list, str | None]:
+        turns, summary = self.inner.load(session_id)
+        with self._lock:
+            pending = list(self._pending.get(session_id, ()))
+        return (turns + pending)[-self.max_turns:], summary
+
+    async def aload(self, session_id: str) -> tuple[list, str | None]:
+        turns, summary = await self.inner.aload(session_id)
+        with self._lock:
+            pending = list(self._pending.get(session_id, ()))
+        return (turns + pending)[-self.max_turns:], summary
+
+    def append(self, session_id: str, turns: list):
+        with self._lock:
+            self._pending.setdefault(session_id, []).extend(turns)
+            self._pending_count += len(turns)
+            if self._pending_count >= self.max_pending:
+                self._wake.set()
+
+    async def aappend(self, session_id: str, turns: list):
+        self.append(session_id, turns)
+
+    def compact(self, session_id: str, summary: str, count: int):
+        # Pending turns must land before the head of the list is trimmed.
+        self._flush_session(session_id)
+        self.inner.compact(session_id, summary, count)
+
+    async def acompact(self, session_id: str, summary: str, count: int):
+        await asyncio.to_thread(self._flush_session, session_id)
+        await self.inner.acompact(session_id, summary, count)
+
+    def ping(self):
+        self.inner.ping()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        self.inner.close()
+
+
+def _make_session_store() -> SessionStore:
+    kind = settings.SESSION_STORE
+    ttl, max_turns = settings.SESSION_TTL_SECONDS, settings.HISTORY_MAX_STORED_TURNS
+    if kind == "memory":
+        store = MemorySessionStore(ttl, max_turns, settings.SESSION_MEMORY_MAX_SESSIONS)
+    elif kind == "redis":
+        store = RedisSessionStore(settings.REDIS_URL, ttl, max_turns, settings.REDIS_POOL_SIZE)
+    elif kind == "upstash":
+        from app.dependencies import async_redis_client, redis_client
+
+        store = UpstashSessionStore(redis_client, async_redis_client, ttl, max_turns)
+    else:
+        raise ValueError(f"Unknown SESSION_STORE '{kind}' (expected 'memory', 'redis' or 'upstash').")
+    if settings.SESSION_WRITE_BEHIND and kind != "memory":
+        store = WriteBehindSessionStore(
+            store,
+            settings.SESSION_WRITE_BEHIND_INTERVAL_MS / 1000,
+            max_buffered=settings.SESSION_WRITE_BEHIND_MAX_BUFFERED,
+        )
+    logger.info(f"Session store: {type(store).__name__} ({kind}).")
+    return store
+
+
+try:
+    session_store = _make_session_store()
+except Exception as e:
+    logger.error(f"Failed to initialize session store: {e}")
+    raise
@@ -0,0 +1,375 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+from loguru import logger
+
+
+class VectorStore(Protocol):
+    """
+    The subset of the Chroma collection API the app relies on.
+
+    ``rag`` and the ingestion scripts only talk to collections through these
+    methods, so any engine implementing them can stand in for Chroma.
+    """
+
+    name: str
+
+    def upsert(self, ids: list, embeddings: list, metadatas: list, documents: list) -> None: ...
+
+    def get(self, ids: list | None = None, where: dict | None = None, limit: int | None = None,
+            offset: int | None = None, include: list | None = None) -> dict: ...
+
+    def delete(self, ids: list) -> None: ...
+
+    def query(self, query_embeddings: list, n_results: int = 10, where: dict | None = None,
+              include: list | None = None) -> dict: ...
+
+    def count(self) -> int: ...
+
+
+# ----------- Metadata filters -----------
+
+_COMPARATORS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target,
+}
+
+
+def matches_where(metadata: dict, where: dict | None) -> bool:
+    """
+    Evaluates a Chroma-style ``where`` filter against one metadata dict.
+
+    Supports ``$and`` / ``$or``, plain equality (``{"field": value}``) and the
+    ``$eq $ne $gt $gte $lt $lte $in $nin`` operators.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, target in condition.items():
+                if operator not in _COMPARATORS:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                try:
+                    if not _COMPARATORS[operator](value, target):
+                        return False
+                except TypeError:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+_VECTOR_COMPARATORS = {
+    "$eq": lambda column, target: column == target,
+    "$ne": lambda column, target: column != target,
+    "$gt": lambda column, target: column > target,
+    "$gte": lambda column, target: column >= target,
+    "$lt": lambda column, target: column < target,
+    "$lte": lambda column, target: column <= target,
+    "$in": lambda column, target: np.isin(column, list(target)),
+    "$nin": lambda column, target: ~np.isin(column, list(target)),
+}
+
+
+# ----------- NumPy engine -----------
+
+
+class NumpyVectorStore:
+    """
+    In-process exact vector index for catalogues that fit in RAM.
+
+    Embeddings live in one contiguous float32 matrix (rows grow geometrically, so
+    upserts are amortized O(1)) with precomputed squared norms. A query batch is one
+    matrix product followed by ``argpartition`` for the top k, and returns squared L2
+    distances like Chroma's default space. Metadata filters are applied as a mask
+    before ranking.
+
+    With a ``path`` the index can be saved and reloaded; ``mmap=True`` maps the
+    embedding matrix read-only from disk so several processes share the page cache.
+    The first write after an mmap load copies the matrix into memory.
+    """
+
+    def __init__(self, name: str, path: str | None = None, mmap: bool = False):
+        self.name = name
+        self.path = Path(path) if path else None
+        self.mmap = mmap
+        self._ids = []
+        self._rows = {}
+        self._metadatas = []
+        self._documents = []
+        self._matrix = None
+        self._norms = None
+        self._size = 0
+        # field -> metadata column as an array, built on first filtered query and
+        # dropped on every write so filters are evaluated vectorized.
+        self._columns = {}
+        self._lock = threading.RLock()
+        if self.path is not None and (self.path / "embeddings.npy").exists():
+            self._load()
+
+    # --- persistence ---
+
+    def _load(self):
+        with open(self.path / "records.json", "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self._ids = records["ids"]
+        self._metadatas = records["metadatas"]
+        self._documents = records["documents"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._matrix = np.load(self.path / "embeddings.npy", mmap_mode="r" if self.mmap else None)
+        self._size = len(self._ids)
+        self._norms = np.einsum("ij,ij->i", self._matrix, self._matrix).astype(np.float32)
+        logger.info(f"Loaded {self._size} vectors for '{self.name}' from {self.path}.")
+
+    def persist(self):
+        """Writes the index to ``path`` atomically (temp files, then rename)."""
+        if self.path is None:
+            return
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            matrix = self._matrix[: self._size] if self._matrix is not None else np.zeros((0, 0), np.float32)
+            tmp_embeddings = self.path / "embeddings.tmp.npy"
+            tmp_records = self.path / "records.tmp.json"
+            np.save(tmp_embeddings, np.ascontiguousarray(matrix))
+            with open(tmp_records, "w", encoding="utf-8") as f:
+                json.dump({"ids": self._ids, "metadatas": self._metadatas, "documents": self._documents}, f)
+            os.replace(tmp_embeddings, self.path / "embeddings.npy")
+            os.replace(tmp_records, self.path / "records.json")
+        logger.info(f"Persisted {self._size} vectors for '{self.name}' to {self.path}.")
+
+    # --- writes ---
+
+    def _writable_matrix(self, needed_rows: int, dim: int) -> np.ndarray:
+        """Returns an in-memory matrix with capacity for ``needed_rows`` rows."""
+        matrix = self._matrix
+        if matrix is None or self._size == 0:
+            capacity = max(needed_rows, 1024)
+            self._matrix = np.empty((capacity, dim), dtype=np.float32)
+            self._norms = np.empty(capacity, dtype=np.float32)
+        elif isinstance(matrix, np.memmap) or not matrix.flags.writeable or needed_rows > matrix.shape[0]:
+            capacity = max(needed_rows, int(matrix.shape[0] * 1.5), 1024)
+            grown = np.empty((capacity, matrix.shape[1]), dtype=np.float32)
+            grown[: self._size] = matrix[: self._size]
+            norms = np.empty(capacity, dtype=np.float32)
+            norms[: self._size] = self._norms[: self._size]
+            self._matrix, self._norms = grown, norms
+        return self._matrix
+
+    def upsert(self, ids: list, embeddings: list, metadatas: list | None = None, documents: list | None = None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        metadatas = metadatas or [{} for _ in ids]
+        documents = documents or ["" for _ in ids]
+        with self._lock:
+            self._columns.clear()
+            new_ids = [doc_id for doc_id in dict.fromkeys(ids) if doc_id not in self._rows]
+            matrix = self._writable_matrix(self._size + len(new_ids), vectors.shape[1])
+            for doc_id, vector, metadata, document in zip(ids, vectors, metadatas, documents):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._metadatas.append(metadata)
+                    self._documents.append(document)
+                    self._size += 1
+                else:
+                    self._metadatas[row] = metadata
+                    self._documents[row] = document
+                matrix[row] = vector
+                self._norms[row] = float(vector @ vector)
+
+    add = upsert
+
+    def delete(self, ids: list):
+        with self._lock:
+            rows = sorted({self._rows[doc_id] for doc_id in ids if doc_id in self._rows})
+            if not rows:
+                return
+            self._columns.clear()
+            keep = np.ones(self._size, dtype=bool)
+            keep[rows] = False
+            self._matrix = np.ascontiguousarray(self._matrix[: self._size][keep])
+            self._norms = self._norms[: self._size][keep]
+            removed = set(rows)
+            self._ids = [doc_id for row, doc_id in enumerate(self._ids) if row not in removed]
+            self._metadatas = [m for row, m in enumerate(self._metadatas) if row not in removed]
+            self._documents = [d for row, d in enumerate(self._documents) if row not in removed]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._size = len(self._ids)
+
+    # --- reads ---
+
+    def count(self) -> int:
+        return self._size
+
+    def _column(self, field: str) -> np.ndarray:
+        """Values of one metadata field for every row (numeric fields as float64, NaN if missing)."""
+        column = self._columns.get(field)
+        if column is None:
+            values = [metadata.get(field) for metadata in self._metadatas[: self._size]]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values if v is not None):
+                column = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            self._columns[field] = column
+        return column
+
+    def _where_mask(self, where: dict) -> np.ndarray:
+        mask = np.ones(self._size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                mask &= np.logical_or.reduce([self._where_mask(clause) for clause in condition])
+            else:
+                column = self._column(key)
+                operators = condition if isinstance(condition, dict) else {"$eq": condition}
+                for operator, target in operators.items():
+                    if operator not in _VECTOR_COMPARATORS:
+                        raise ValueError(f"Unsupported where operator: {operator}")
+                    if column.dtype == object and operator in ("$gt", "$gte", "$lt", "$lte"):
+                        # Mixed or non-numeric column: fall back to per-row comparison.
+                        mask &= np.fromiter(
+                            (matches_where({key: value}, {key: {operator: target}}) for value in column),
+                            dtype=bool,
+                            count=self._size,
+                        )
+                    else:
+                        with np.errstate(invalid="ignore"):
+                            mask &= np.asarray(_VECTOR_COMPARATORS[operator](column, target), dtype=bool)
+        return mask
+
+    def _mask(self, where: dict | None) -> np.ndarray | None:
+        if not where:
+            return None
+        return self._where_mask(where)
+
+    def get(self, ids: list | None = None, where: dict | None = None, limit: int | None = None,
+            offset: int | None = None, include: list | None = None) -> dict:
+        include = include if include is not None else ["metadatas", "documents"]
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+                if where:
+                    rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+            else:
+                mask = self._mask(where)
+                rows = range(self._size) if mask is None else np.flatnonzero(mask).tolist()
+            rows = list(rows)[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            result = {"ids": [self._ids[row] for row in rows]}
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+            if "documents" in include:
+                result["documents"] = [self._documents[row] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = self._matrix[rows].tolist() if rows else []
+            return result
+
+    def query(self, query_embeddings: list, n_results: int = 10, where: dict | None = None,
+              include: list | None = None) -> dict:
+        include = include if include is not None else ["metadatas", "documents", "distances"]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        result = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        # Snapshot under the lock and rank outside it, so a long query batch doesn't
+        # block writers. Writes only append past ``size`` or replace the arrays and
+        # lists wholesale; an upsert of an existing id may still be seen by an
+        # in-flight query as either its old or new vector.
+        with self._lock:
+            size = self._size
+            if size == 0:
+                for key in result:
+                    result[key] = [[] for _ in queries]
+                return result
+            matrix, norms = self._matrix[:size], self._norms[:size]
+            ids, metadatas, documents = self._ids[:size], self._metadatas[:size], self._documents[:size]
+            mask = self._mask(where)
+        # Squared L2: |q|^2 + |x|^2 - 2 q.x, computed for the whole batch in one product.
+        distances = np.einsum("ij,ij->i", queries, queries)[:, None] + norms[None, :] - 2.0 * (queries @ matrix.T)
+        if mask is not None:
+            distances[:, ~mask] = np.inf
+        available = size if mask is None else int(mask.sum())
+        k = min(n_results, available)
+        for row_distances in distances:
+            if k == 0:
+                top = np.empty(0, dtype=np.int64)
+            elif k < size:
+                top = np.argpartition(row_distances, k - 1)[:k]
+                top = top[np.argsort(row_distances[top])]
+            else:
+                top = np.argsort(row_distances)[:k]
+            result["ids"].append([ids[row] for row in top])
+            result["metadatas"].append([metadatas[row] for row in top])
+            result["documents"].append([documents[row] for row in top])
+            result["distances"].append([max(float(row_distances[row]), 0.0) for row in top])
+        for key in ("metadatas", "documents", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+
+class NumpyVectorStoreClient:
+    """
+    Collection registry for ``NumpyVectorStore`` mirroring the Chroma client calls
+    the app uses (``get_collection``, ``get_or_create_collection``, ``delete_collection``).
+    """
+
+    def __init__(self, path: str | None = None, mmap: bool = False):
+        self.path = Path(path) if path else None
+        self.mmap = mmap
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, name: str) -> str | None:
+        return str(self.path / name) if self.path else None
+
+    def reopen(self, path: str | None):
+        """Serves collections from another directory; handles already returned keep working."""
+        with self._lock:
+            self.path = Path(path) if path else None
+            self._collections = {}
+
+    def get_collection(self, name: str) -> NumpyVectorStore:
+        with self._lock:
+            if name not in self._collections:
+                path = self._collection_path(name)
+                if path is None or not (Path(path) / "embeddings.npy").exists():
+                    raise ValueError(f"Collection {name} does not exist.")
+                self._collections[name] = NumpyVectorStore(name, path, self.mmap)
+            return self._collections[name]
+
+    def get_or_create_collection(self, name: str) -> NumpyVectorStore:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = NumpyVectorStore(name, self._collection_path(name), self.mmap)
+            return self._collections[name]
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+            path = self._collection_path(name)
+            if path is not None:
+                for filename in ("embeddings.npy", "records.json"):
+                    (Path(path) / filename).unlink(missing_ok=True)
@@ -1,12 +1,30 @@
+import asyncio
+import inspect
 import json
+import threading
+import time
+from functools import partial, wraps
 from pathlib import Path
 from jinja2 import Template
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 from loguru import logger
-
-from app.dependencies import openai_client
-from app.models.schemas import ConversationState
-from app.services.rag import query_collection
+from pydantic import ValidationError
+
+from app.config import settings
+from app.dependencies import async_openai_client, openai_client
+from app.models.schemas import ConversationState, FollowUpDecision
+from app.services.constraints import extract_constraints, facet_indexes
+from app.services.intent_router import FOLLOW_UP, LLM, RECOMMEND, intent_router, profile_terms
+from app.services.metrics import STRUCTURED_OUTPUT_FAILURES, current_stage, record_llm_call, stage
+from app.services.rag import aquery_collection, query_collection, retrieval_service
+from app.services.rerank import reranker
+from app.services.semantic_cache import (
+    analyze_query_cache,
+    digest_ids,
+    invalidate_semantic_caches,
+    recommendation_cache,
+)
 
 # --- Prompt Loading ---
 
@@ -26,70 +44,186 @@ def load_prompt_template(filename: str) -> Template:
         raise
 
 
-ANALYZE_ANSWERS_TEMPLATE = load_prompt_template("analyze_answers.txt")
-ANALYZE_QUERY_TEMPLATE = load_prompt_template("analyze_query.txt")
-FOLLOW_UP_QUESTION_TEMPLATE = load_prompt_template("follow_up_question.txt")
-RECOMMENDATION_TEMPLATE = load_prompt_template("recommendation.txt")
+# Templates are read on first use, so importing this module does no file I/O.
+_templates: dict[str, Template] = {}
+
+
+def prompt_template(filename: str) -> Template:
+    """Returns the template for a prompt file, reading it on first use."""
+    template = _templates.get(filename)
+    if template is None:
+        template = _templates[filename] = load_prompt_template(filename)
+    return template
+
+
+def reload_prompts():
+    """
+    Re-reads the prompt templates loaded so far from disk, so edited prompts take
+    effect without a restart. All files are read before any is replaced, so a
+    broken file leaves the current templates in place.
+    """
+    global _templates
+    _templates = {filename: load_prompt_template(filename) for filename in _templates}
+    logger.info("Prompt templates reloaded from disk.")
 
 
 # ----------- Pipeline Node Functions -----------
+#
+# Each node has a sync and an async variant. The prompt building and state updates
+# are shared helpers; the variants differ only in how they call OpenAI / Chroma.
+# The async nodes also emit progress and token events, which reach the client when
+# the graph is run with ``astream(..., stream_mode="custom")`` and are dropped otherwise.
 
 
-def ask_follow_up_questions(state: ConversationState) -> ConversationState:
-    """Asks a direct follow-up question based on the current conversation state."""
-    system_prompt = FOLLOW_UP_QUESTION_TEMPLATE.render()
-    logger.info(f"Node: ask_follow_up_questions with prompt {system_prompt[:40]}")
-    messages = [{"role": "system", "content": system_prompt}, *state.conversation]
-    follow_up = ask_ai(messages)
-    state.follow_up_question = follow_up
-    return state
+def emit(event: str, **data):
+    """Sends a custom stream event from inside a graph node (no-op when not streaming)."""
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        # Called outside a graph run.
+        return
+    writer({"event": event, **data})
 
 
-def analyze_answers(state: ConversationState) -> ConversationState:
-    """Analyzes user answers to determine if enough information is present for recommendations."""
-    logger.info("Node: analyze_answers")
-    full_conversation = "\n".join(
-        [f"{msg['role']}: {msg['content']}" for msg in state.conversation]
-    )
-    system_prompt = ANALYZE_ANSWERS_TEMPLATE.render()
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"conversation: \n {full_conversation}"},
-    ]
-    response = ask_ai(messages)
+def _parse_json_response(response: str, node: str, default: dict) -> dict:
+    """Parses a (possibly fenced) JSON LLM response, falling back to ``default``."""
+    text = response.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
     try:
-        final_response = json.loads(response.strip("```json").strip())
-        logger.info(f'analyzed ans {final_response}')
+        return json.loads(text)
     except json.JSONDecodeError:
-        logger.warning(f"Failed to parse JSON from analyze_answers: {response}")
-        final_response = {"ready_for_recommendation": False, "optimized_query": ""}
+        logger.warning(f"Failed to parse JSON from {node}: {response}")
+        return default
+
+
+def _user_messages(state: ConversationState) -> list:
+    """The user's messages and the history summary, which carries what older turns said."""
+    messages = [msg["content"] for msg in state.conversation if msg.get("role") in ("user", "system")]
+    if state.query and (not messages or messages[-1] != state.query):
+        messages.append(state.query)
+    return messages
+
+
+def _user_turns(state: ConversationState) -> list:
+    """The user's own messages in the current history window, ending with the query."""
+    messages = [msg["content"] for msg in state.conversation if msg.get("role") == "user"]
+    if state.query and (not messages or messages[-1] != state.query):
+        messages.append(state.query)
+    return messages
+
+
+def _update_constraints(state: ConversationState):
+    """
+    Extracts hard product constraints (price, ingredients, category) from the user's
+    turns in the current window. The history summary is left out: it is model-written
+    and may mention prices or ingredients of products discussed, not asked for.
+    """
+    constraints = extract_constraints(_user_turns(state), facet_indexes.get("skincare"))
+    state.constraints = constraints.model_dump(exclude_defaults=True)
+    if state.constraints:
+        logger.info(f"Product constraints: {state.constraints}")
+
+
+def _apply_route(state: ConversationState, route: str, details: dict) -> ConversationState:
+    logger.info(f"Intent route: {route} ({details})")
+    state.route = route
+    if route == RECOMMEND:
+        # What analyze_query would conclude: ready, with the user's own words as the query.
+        _update_constraints(state)
+        user_turns = [msg["content"] for msg in state.conversation if msg.get("role") == "user"]
+        state.ready_for_recommendation = True
+        state.recommendation_query = ". ".join(user_turns[-3:]) or state.query
+    return state
 
-    state.ready_for_recommendation = final_response.get("ready_for_recommendation", False)
-    state.recommendation_query = final_response.get("optimized_query", state.query) # Use original query as fallback
-    state.is_follow_up = final_response.get("is_follow_up", False)
 
+def route_query(state: ConversationState) -> ConversationState:
+    """
+    Runs the intent router before any LLM call. A confident "recommend" route goes
+    straight to retrieval and a confident "follow_up" route straight to the
+    follow-up question; otherwise analyze_query decides.
+    """
+    logger.info("Node: route_query")
+    embedding = retrieval_service.embed(state.query)
+    return _apply_route(state, *intent_router.route(_user_messages(state), state.query, embedding))
+
+
+async def aroute_query(state: ConversationState) -> ConversationState:
+    """Async variant of ``route_query``."""
+    logger.info("Node: route_query")
+    embedding = await retrieval_service.aembed(state.query)
+    # The first call embeds the intent examples; keep that off the event loop.
+    route, details = await asyncio.to_thread(intent_router.route, _user_messages(state), state.query, embedding)
+    return _apply_route(state, route, details)
+
+
+def _follow_up_messages(state: ConversationState) -> list:
+    logger.info("Node: follow_up")
+    system_prompt = prompt_template("follow_up_turn.txt").render()
+    return [{"role": "system", "content": system_prompt}, *state.conversation]
+
+
+# Used when the follow_up reply still fails validation after the retries.
+FALLBACK_FOLLOW_UP = FollowUpDecision(
+    ready_for_recommendation=False,
+    follow_up_question="Could you tell me a bit more about your skin or hair, and what you'd like to improve?",
+)
+
+
+def _apply_follow_up(state: ConversationState, decision: FollowUpDecision) -> ConversationState:
+    logger.info(f"Follow-up decision: {decision}")
+    state.ready_for_recommendation = decision.ready_for_recommendation
+    state.recommendation_query = decision.optimized_query or state.query  # Use original query as fallback
+    state.follow_up_question = "" if decision.ready_for_recommendation else decision.follow_up_question
+    state.is_follow_up = not decision.ready_for_recommendation
+    _update_constraints(state)
     return state
 
 
-def analyze_query(state: ConversationState) -> ConversationState:
-    """Analyzes the initial user query to decide the next step."""
-    logger.info("Node: analyze_query")
-    results = query_collection("skincare_combined", state.query, n_results=5) 
+def follow_up(state: ConversationState) -> ConversationState:
+    """
+    Decides in one structured completion whether the conversation has enough
+    information for recommendations and, if not, which question to ask next.
+    """
+    try:
+        decision = ask_ai_structured(_follow_up_messages(state), FollowUpDecision)
+    except StructuredOutputError as e:
+        logger.error(f"follow_up: {e}; asking a generic question.")
+        decision = FALLBACK_FOLLOW_UP
+    return _apply_follow_up(state, decision)
+
+
+async def afollow_up(state: ConversationState) -> ConversationState:
+    """
+    Async variant of ``follow_up``. The reply is JSON, so the question is emitted
+    as a single token event once it has been validated.
+    """
+    emit("status", stage="asking")
+    try:
+        decision = await aask_ai_structured(_follow_up_messages(state), FollowUpDecision)
+    except StructuredOutputError as e:
+        logger.error(f"follow_up: {e}; asking a generic question.")
+        decision = FALLBACK_FOLLOW_UP
+    state = _apply_follow_up(state, decision)
+    if state.follow_up_question:
+        emit("follow_up_token", token=state.follow_up_question)
+    return state
+
+
+def _analyze_query_messages(state: ConversationState, results: dict) -> list:
     doc_metadata_pairs = list(zip(results["documents"][0], results["metadatas"][0]))
-    
+
     top_docs = list(zip(*doc_metadata_pairs)) if doc_metadata_pairs else ([], [])
 
-    system_prompt = ANALYZE_QUERY_TEMPLATE.render(retrieved_content=top_docs)
-    messages = [
+    system_prompt = prompt_template("analyze_query.txt").render(retrieved_content=top_docs)
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": state.query},
     ]
-    response = ask_ai(messages)
-    try:
-        final_response = json.loads(response.strip("```json").strip())
-    except json.JSONDecodeError:
-        logger.warning(f"Failed to parse JSON from analyze_query: {response}")
-        final_response = {"is_follow_up": False, "answer": ""}
+
+
+def _apply_analyze_query(state: ConversationState, response: str) -> ConversationState:
+    final_response = _parse_json_response(
+        response, "analyze_query", {"is_follow_up": False, "answer": ""}
+    )
 
     state.is_follow_up = final_response.get("is_follow_up", False)
     state.follow_up_question = final_response.get("answer", "")
@@ -97,74 +231,475 @@ def analyze_query(state: ConversationState) -> ConversationState:
         # If no follow-up is needed, we are ready for recommendation with the original query
         state.ready_for_recommendation = True
         state.recommendation_query = state.query
-        
+
+    return state
+
+
+def _product_candidates() -> int:
+    """Products to retrieve: extra candidates when rerank_products narrows them down."""
+    if settings.RERANK_ENABLED:
+        return max(settings.RERANK_CANDIDATES, settings.PRODUCT_N_RESULTS)
+    return settings.PRODUCT_N_RESULTS
+
+
+def _analyze_query_retrieval(state: ConversationState) -> tuple[dict, dict]:
+    """
+    Collections analyze_query reads with one embedding: the combined knowledge base
+    for its prompt and, with SPECULATIVE_RETRIEVAL, the constrained product candidates.
+    """
+    n_results = {"skincare_combined": 5}
+    if settings.SPECULATIVE_RETRIEVAL:
+        n_results["skincare"] = _product_candidates()
+    return n_results, {"skincare": state.constraints}
+
+
+def _context_results(results: dict) -> dict:
+    """The combined retrieval analyze_query can't do without; re-raises its failure."""
+    combined = results["skincare_combined"]
+    if isinstance(combined, Exception):
+        raise combined
+    return combined
+
+
+def _keep_prefetch(state: ConversationState, results: dict):
+    """Stores speculative product results for retrieve_documents when the graph is heading there."""
+    products = results.get("skincare")
+    if isinstance(products, Exception):
+        # Speculative work must never fail the request; retrieve_documents will fetch again.
+        logger.warning(f"Speculative product retrieval failed: {products}")
+        return
+    if products is not None and state.ready_for_recommendation:
+        state.prefetched_query = state.query
+        state.prefetched_documents = list(zip(products["documents"][0], products["metadatas"][0]))
+
+
+def analyze_query(state: ConversationState) -> ConversationState:
+    """
+    Analyzes the initial user query to decide the next step.
+
+    Product constraints are extracted from the user's messages first, so every
+    product retrieval in this run is filtered by them. With SPECULATIVE_RETRIEVAL,
+    products for the raw query are fetched together with the classification
+    context (one embedding, both collections queried concurrently); they are kept
+    only if the graph routes straight to recommendations.
+    """
+    logger.info("Node: analyze_query")
+    _update_constraints(state)
+    n_results, constraints = _analyze_query_retrieval(state)
+    results = retrieval_service.query_many(state.query, n_results, constraints, return_exceptions=True)
+    context = _context_results(results)
+    response = cached_ask_ai(
+        analyze_query_cache, state.query, context["ids"][0], _analyze_query_messages(state, context)
+    )
+    state = _apply_analyze_query(state, response)
+    _keep_prefetch(state, results)
     return state
 
 
+async def aanalyze_query(state: ConversationState) -> ConversationState:
+    """Async variant of ``analyze_query``."""
+    logger.info("Node: analyze_query")
+    emit("status", stage="analyzing")
+    _update_constraints(state)
+    n_results, constraints = _analyze_query_retrieval(state)
+    results = await retrieval_service.aquery_many(state.query, n_results, constraints, return_exceptions=True)
+    context = _context_results(results)
+    response = await acached_ask_ai(
+        analyze_query_cache, state.query, context["ids"][0], _analyze_query_messages(state, context)
+    )
+    state = _apply_analyze_query(state, response)
+    _keep_prefetch(state, results)
+    return state
+
+
+def _use_prefetch(state: ConversationState) -> bool:
+    """Moves speculative results into retrieved_documents if they match the recommendation query."""
+    documents, query = state.prefetched_documents, state.prefetched_query
+    state.prefetched_documents, state.prefetched_query = [], ""
+    if documents and query == state.recommendation_query:
+        logger.debug("Using speculatively prefetched products.")
+        state.retrieved_documents = documents
+        return True
+    return False
+
+
 def retrieve_documents(state: ConversationState) -> ConversationState:
     """Retrieves documents from the vector store based on the recommendation query."""
     logger.info("Node: retrieve_documents")
+    if _use_prefetch(state):
+        return state
     # Using recommendation_query directly as per todo.txt
-    results = query_collection("skincare", state.recommendation_query, n_results=10)
+    results = query_collection(
+        "skincare", state.recommendation_query, n_results=_product_candidates(), constraints=state.constraints
+    )
     state.retrieved_documents = list(zip(results["documents"][0], results["metadatas"][0]))
     return state
 
 
-def recommend_products(state: ConversationState) -> ConversationState:
-    """Generates recommendations based on retrieved documents."""
+async def aretrieve_documents(state: ConversationState) -> ConversationState:
+    """Async variant of ``retrieve_documents``."""
+    logger.info("Node: retrieve_documents")
+    emit("status", stage="retrieving")
+    if _use_prefetch(state):
+        return state
+    results = await aquery_collection(
+        "skincare", state.recommendation_query, n_results=_product_candidates(), constraints=state.constraints
+    )
+    state.retrieved_documents = list(zip(results["documents"][0], results["metadatas"][0]))
+    return state
+
+
+def _rerank_args(state: ConversationState) -> tuple:
+    history = "\n".join(f"{msg['role']}: {msg['content']}" for msg in state.conversation)
+    return state.recommendation_query, state.retrieved_documents, state.constraints, history, settings.PRODUCT_N_RESULTS
+
+
+def rerank_products(state: ConversationState) -> ConversationState:
+    """Re-orders the retrieved products and keeps the best PRODUCT_N_RESULTS for recommend_products."""
+    logger.info("Node: rerank_products")
+    state.retrieved_documents = reranker.rerank(*_rerank_args(state))
+    return state
+
+
+async def arerank_products(state: ConversationState) -> ConversationState:
+    """Async variant of ``rerank_products``."""
+    logger.info("Node: rerank_products")
+    state.retrieved_documents = await reranker.arerank(*_rerank_args(state))
+    return state
+
+
+# Product metadata the recommendation prompt needs; the rest (reviews, IDs, facets) is left out.
+RECOMMENDATION_FIELDS = ("product_name", "price", "benefits", "top_ingredients", "benefits_of_ingredients")
+
+
+def _recommendation_messages(state: ConversationState) -> list:
     logger.info("Node: recommend_products")
-    
-    top_pairs = state.retrieved_documents[:5]
-    
+
+    top_pairs = state.retrieved_documents[:settings.PRODUCT_N_RESULTS]
+
     top_docs, top_metadata = zip(*top_pairs) if top_pairs else ([], [])
     state.citations = top_docs
 
-    # Clean up metadata for the prompt
-    clean_metadata = []
-    for meta in top_metadata:
-        meta_copy = meta.copy()
-        meta_copy.pop("id", None)
-        meta_copy.pop("margin", None)
-        meta_copy.pop("product_id", None)
-        clean_metadata.append(meta_copy)
-
-    recommendation_prompt = RECOMMENDATION_TEMPLATE.render(product_data=clean_metadata)
-    messages = [
+    # Only the fields the model needs go into the prompt
+    clean_metadata = [
+        {field: meta[field] for field in RECOMMENDATION_FIELDS if meta.get(field) not in (None, "")}
+        for meta in top_metadata
+    ]
+
+    recommendation_prompt = prompt_template("recommendation.txt").render(product_data=clean_metadata)
+    return [
         {"role": "system", "content": recommendation_prompt},
         {"role": "user", "content": state.recommendation_query},
     ]
-    state.recommendation = ask_ai(messages)
+
+
+def _recommended_ids(state: ConversationState) -> list:
+    return [metadata.get("id") for _, metadata in state.retrieved_documents[:settings.PRODUCT_N_RESULTS]]
+
+
+def recommend_products(state: ConversationState) -> ConversationState:
+    """Generates recommendations based on retrieved documents."""
+    state.recommendation = cached_ask_ai(
+        recommendation_cache, state.recommendation_query, _recommended_ids(state), _recommendation_messages(state)
+    )
+    state.is_follow_up = "False"
+    return state
+
+
+async def arecommend_products(state: ConversationState) -> ConversationState:
+    """Async variant of ``recommend_products``; streams the recommendation as it is generated."""
+    emit("status", stage="recommending")
+    state.recommendation = await acached_ask_ai(
+        recommendation_cache,
+        state.recommendation_query,
+        _recommended_ids(state),
+        _recommendation_messages(state),
+        stream_event="recommendation_token",
+    )
     state.is_follow_up = "False"
     return state
 
 
 # ----------- Helper Functions -----------
 
+CHAT_COMPLETION_PARAMS = {"model": "gpt-4o", "max_tokens": 500, "temperature": 0.7}
+
 
-def ask_ai(messages: list) -> str:
-    """Sends messages to the OpenAI client and returns the response."""
+def _completion_params(json_mode: bool) -> dict:
+    if json_mode:
+        return {**CHAT_COMPLETION_PARAMS, "response_format": {"type": "json_object"}}
+    return CHAT_COMPLETION_PARAMS
+
+
+def ask_ai(messages: list, json_mode: bool = False) -> str:
+    """Sends messages to the OpenAI client and returns the response; ``json_mode`` requests a JSON object."""
     logger.debug(f"Sending {len(messages)} messages to OpenAI.")
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        max_tokens=500,
-        temperature=0.7,
+    model, started = CHAT_COMPLETION_PARAMS["model"], time.perf_counter()
+    try:
+        response = openai_client.chat.completions.create(
+            messages=messages, **_completion_params(json_mode)
+        )
+    except Exception:
+        record_llm_call(model, current_stage(), time.perf_counter() - started, status="error")
+        raise
+    record_llm_call(model, current_stage(), time.perf_counter() - started, response.usage)
+    return response.choices[0].message.content.strip()
+
+
+async def aask_ai(messages: list, stream_event: str | None = None, json_mode: bool = False) -> str:
+    """
+    Async variant of ``ask_ai``; awaits the completion without blocking the event loop.
+
+    Args:
+        messages (list): Chat messages to send.
+        stream_event (str | None): If set, the completion is streamed and each token is
+            emitted as a custom stream event with this name as it arrives.
+        json_mode (bool): Request a JSON object (``response_format``).
+
+    Returns:
+        str: The full completion text.
+    """
+    logger.debug(f"Sending {len(messages)} messages to OpenAI (async).")
+    model, started = CHAT_COMPLETION_PARAMS["model"], time.perf_counter()
+    try:
+        if stream_event is None:
+            response = await async_openai_client.chat.completions.create(
+                messages=messages, **_completion_params(json_mode)
+            )
+            record_llm_call(model, current_stage(), time.perf_counter() - started, response.usage)
+            return response.choices[0].message.content.strip()
+
+        # include_usage adds a final chunk (with no choices) carrying the token counts.
+        stream = await async_openai_client.chat.completions.create(
+            messages=messages, stream=True, stream_options={"include_usage": True}, **_completion_params(json_mode)
+        )
+        parts, usage = [], None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                parts.append(token)
+                emit(stream_event, token=token)
+    except Exception:
+        record_llm_call(model, current_stage(), time.perf_counter() - started, status="error")
+        raise
+    record_llm_call(model, current_stage(), time.perf_counter() - started, usage)
+    return "".join(parts).strip()
+
+
+async def asummarize_history(summary: str, turns: list) -> str:
+    """
+    Folds conversation turns into the rolling history summary.
+
+    Args:
+        summary (str): The current summary ('' if none yet).
+        turns (list): The oldest turns not yet covered by the summary.
+
+    Returns:
+        str: The updated summary.
+    """
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    started = time.perf_counter()
+    response = await async_openai_client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": prompt_template("summarize_history.txt").render(summary=summary)},
+            {"role": "user", "content": transcript},
+        ],
+        model=settings.HISTORY_SUMMARY_MODEL,
+        max_tokens=250,
+        temperature=0.2,
+    )
+    record_llm_call(
+        settings.HISTORY_SUMMARY_MODEL, "summarize_history", time.perf_counter() - started, response.usage
     )
     return response.choices[0].message.content.strip()
 
 
-def build_graph():
-    """Builds and compiles the conversation pipeline graph."""
+def cached_ask_ai(cache, key_text: str, doc_ids: list, messages: list) -> str:
+    """
+    ``ask_ai`` behind a semantic cache keyed on ``key_text``'s embedding and ``doc_ids``.
+
+    The embedding comes from the per-request memo, since retrieval has just
+    embedded the same text.
+    """
+    if cache is None:
+        return ask_ai(messages)
+    embedding = retrieval_service.embed(key_text)
+    digest = digest_ids(doc_ids, profile_terms(key_text))
+    cached = cache.lookup(embedding, digest)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
+    response = ask_ai(messages)
+    cache.store(embedding, digest, response, time.perf_counter() - started)
+    return response
+
+
+async def acached_ask_ai(
+    cache, key_text: str, doc_ids: list, messages: list, stream_event: str | None = None
+) -> str:
+    """Async variant of ``cached_ask_ai``; a cache hit is streamed as a single token event."""
+    if cache is None:
+        return await aask_ai(messages, stream_event=stream_event)
+    embedding = await retrieval_service.aembed(key_text)
+    digest = digest_ids(doc_ids, profile_terms(key_text))
+    cached = cache.lookup(embedding, digest)
+    if cached is not None:
+        if stream_event is not None:
+            emit(stream_event, token=cached)
+        return cached
+    started = time.perf_counter()
+    response = await aask_ai(messages, stream_event=stream_event)
+    cache.store(embedding, digest, response, time.perf_counter() - started)
+    return response
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a JSON-mode reply still fails schema validation after the retries."""
+
+
+def _repair_messages(messages: list, response: str, error: ValidationError) -> list:
+    """The conversation plus the invalid reply and a request to correct it."""
+    problems = "; ".join(f"{'.'.join(map(str, e['loc'])) or 'reply'}: {e['msg']}" for e in error.errors())
+    return [
+        *messages,
+        {"role": "assistant", "content": response},
+        {"role": "user", "content": f"That reply was not valid ({problems}). Reply with only the corrected JSON object."},
+    ]
+
+
+def _validate(schema, response: str, attempt: int, retries: int):
+    """Validates a reply; returns (model, None) or (None, error) and counts the failure."""
+    try:
+        return schema.model_validate_json(response), None
+    except ValidationError as e:
+        outcome = "retried" if attempt < retries else "fallback"
+        STRUCTURED_OUTPUT_FAILURES.inc(operation=current_stage() or "other", outcome=outcome)
+        logger.warning(f"Invalid {schema.__name__} reply (attempt {attempt + 1}/{retries + 1}): {response!r}")
+        return None, e
+
+
+def ask_ai_structured(messages: list, schema, retries: int | None = None):
+    """
+    ``ask_ai`` in JSON mode, with the reply validated against a pydantic model.
+
+    An invalid reply is sent back with the validation errors and retried, up to
+    ``retries`` times.
+
+    Args:
+        messages (list): Chat messages to send.
+        schema: The pydantic model the reply must match.
+        retries (int | None): Extra attempts. Defaults to settings.STRUCTURED_OUTPUT_RETRIES.
+
+    Returns:
+        The validated model instance.
+
+    Raises:
+        StructuredOutputError: If no attempt produced a valid reply.
+    """
+    retries = settings.STRUCTURED_OUTPUT_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        response = ask_ai(messages, json_mode=True)
+        result, error = _validate(schema, response, attempt, retries)
+        if result is not None:
+            return result
+        messages = _repair_messages(messages, response, error)
+    raise StructuredOutputError(f"No valid {schema.__name__} reply after {retries + 1} attempts.") from error
+
+
+async def aask_ai_structured(messages: list, schema, retries: int | None = None):
+    """Async variant of ``ask_ai_structured``."""
+    retries = settings.STRUCTURED_OUTPUT_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        response = await aask_ai(messages, json_mode=True)
+        result, error = _validate(schema, response, attempt, retries)
+        if result is not None:
+            return result
+        messages = _repair_messages(messages, response, error)
+    raise StructuredOutputError(f"No valid {schema.__name__} reply after {retries + 1} attempts.") from error
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def timed_node(name: str, node):
+    """
+    Wraps a (sync or async) node so its wall time is recorded in ``state.stage_timings``
+    and the stage metrics, and the LLM calls it makes are labelled with its name.
+    """
+    if inspect.iscoroutinefunction(node):
+        @wraps(node)
+        async def async_wrapper(state: ConversationState) -> ConversationState:
+            started = time.perf_counter()
+            try:
+                with stage(name):
+                    return await node(state)
+            finally:
+                state.stage_timings[name] = _elapsed_ms(started)
+
+        return async_wrapper
+
+    @wraps(node)
+    def wrapper(state: ConversationState) -> ConversationState:
+        started = time.perf_counter()
+        try:
+            with stage(name):
+                return node(state)
+        finally:
+            state.stage_timings[name] = _elapsed_ms(started)
+
+    return wrapper
+
+
+def build_graph(async_nodes: bool = False):
+    """
+    Builds and compiles the conversation pipeline graph.
+
+    Args:
+        async_nodes (bool): Use the async node functions; the compiled graph must then
+            be run with ``ainvoke`` / ``astream``.
+    """
     logger.info("Building the StateGraph pipeline.")
     graph = StateGraph(state_schema=ConversationState)
 
-    graph.add_node("analyze_query", analyze_query)
-    graph.add_node("ask_questions", ask_follow_up_questions)
-    graph.add_node("analyze_answers", analyze_answers)
-    graph.add_node("retrieve_documents", retrieve_documents)
-    graph.add_node("recommend_products", recommend_products)
-
-    graph.set_entry_point("analyze_query")
+    if async_nodes:
+        nodes = {
+            "route_query": aroute_query,
+            "analyze_query": aanalyze_query,
+            "follow_up": afollow_up,
+            "retrieve_documents": aretrieve_documents,
+            "rerank_products": arerank_products,
+            "recommend_products": arecommend_products,
+        }
+    else:
+        nodes = {
+            "route_query": route_query,
+            "analyze_query": analyze_query,
+            "follow_up": follow_up,
+            "retrieve_documents": retrieve_documents,
+            "rerank_products": rerank_products,
+            "recommend_products": recommend_products,
+        }
+    if not settings.ROUTER_ENABLED:
+        del nodes["route_query"]
+    if not settings.RERANK_ENABLED:
+        del nodes["rerank_products"]
+    for name, node in nodes.items():
+        graph.add_node(name, timed_node(name, node))
+
+    if settings.ROUTER_ENABLED:
+        graph.set_entry_point("route_query")
+        graph.add_conditional_edges(
+            "route_query",
+            lambda state: state.route,
+            {LLM: "analyze_query", RECOMMEND: "retrieve_documents", FOLLOW_UP: "follow_up"},
+        )
+    else:
+        graph.set_entry_point("analyze_query")
 
     # def should_ask_questions(state: ConversationState):
     #     if state.is_follow_up:
@@ -176,17 +711,15 @@ def build_graph():
             return "retrieve_documents"
         if state.is_follow_up:
             state.follow_up_count += 1  # Increment follow-up count
-            return "ask_questions"
+            return "follow_up"
         return "retrieve_documents"
 
 
     graph.add_conditional_edges(
         "analyze_query",
         should_ask_questions,
-        {"ask_questions": "ask_questions", "retrieve_documents": "retrieve_documents"}
+        {"follow_up": "follow_up", "retrieve_documents": "retrieve_documents"}
     )
-    
-    graph.add_edge("ask_questions", "analyze_answers")
 
     def decide_after_answers(state: ConversationState):
         if state.ready_for_recommendation or state.follow_up_count >= 2:
@@ -196,13 +729,88 @@ def build_graph():
         return END
         
     graph.add_conditional_edges(
-        "analyze_answers",
+        "follow_up",
         decide_after_answers,
         {"retrieve_documents": "retrieve_documents", END: END}
     )
     
-    graph.add_edge("retrieve_documents", "recommend_products")
+    if settings.RERANK_ENABLED:
+        graph.add_edge("retrieve_documents", "rerank_products")
+        graph.add_edge("rerank_products", "recommend_products")
+    else:
+        graph.add_edge("retrieve_documents", "recommend_products")
     graph.add_edge("recommend_products", END)
 
     logger.info("StateGraph pipeline compiled successfully.")
     return graph.compile()
+
+
+# ----------- Compiled Pipeline Registry -----------
+
+
+class PipelineRegistry:
+    """
+    Holds the compiled conversation pipeline so it is built once per process.
+
+    A compiled LangGraph graph keeps no per-run state, so a single instance can be
+    invoked concurrently by every request. Swapping it (e.g. after prompts change)
+    builds the replacement first and then replaces the reference under a lock, so
+    in-flight requests finish on the graph they started with.
+    """
+
+    def __init__(self, builder=build_graph):
+        self._builder = builder
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_built(self) -> bool:
+        return self._pipeline is not None
+
+    def build(self):
+        """Compiles the pipeline if it has not been compiled yet and returns it."""
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = self._builder()
+        return self._pipeline
+
+    def get(self):
+        """Returns the shared compiled pipeline, compiling it on first use."""
+        pipeline = self._pipeline
+        if pipeline is None:
+            pipeline = self.build()
+        return pipeline
+
+    def reload(self, reload_prompt_files: bool = True):
+        """
+        Rebuilds the pipeline and atomically swaps it in.
+
+        Args:
+            reload_prompt_files (bool): Re-read the prompt templates from disk before rebuilding.
+
+        Returns:
+            The newly compiled pipeline.
+        """
+        if reload_prompt_files:
+            reload_prompts()
+        pipeline = self._builder()
+        with self._lock:
+            self._pipeline = pipeline
+        logger.info("Pipeline registry swapped in a freshly compiled pipeline.")
+        return pipeline
+
+
+pipeline_registry = PipelineRegistry()
+async_pipeline_registry = PipelineRegistry(partial(build_graph, async_nodes=True))
+
+
+def reload_pipelines():
+    """
+    Re-reads the prompts once and swaps fresh sync and async pipelines in. Cached
+    responses were produced by the old prompts, so the semantic caches are cleared.
+    """
+    reload_prompts()
+    pipeline_registry.reload(reload_prompt_files=False)
+    async_pipeline_registry.reload(reload_prompt_files=False)
+    invalidate_semantic_caches()
@@ -0,0 +1,263 @@
+"""
+End-to-end benchmark of /api/search with no external services.
+
+Starts the fake OpenAI server and the fake Redis server as subprocesses, ingests
+the bundled catalogue into a throwaway NumPy vector store, and runs the FastAPI app
+in-process (ASGI transport). Scripted multi-turn conversations are then replayed
+at each concurrency level; every turn carries its session ID, so sessions grow,
+are reloaded and saved as in production. Responses are requested with
+``include_timings``, so besides client-side latency the report breaks each turn
+down into pipeline stages, LLM / embedding / retrieval time and session I/O, with
+p50/p95/p99 for each.
+
+Results can be saved as JSON and compared with a previous run; the script exits
+with status 1 when the end-to-end p95 or p99 regresses by more than
+``--max-regression``, so it can gate a deploy.
+
+Usage:
+    python scripts/bench_e2e.py --concurrency 1 8 32 --conversations 64
+    python scripts/bench_e2e.py --openai-latency-ms 300 --redis-latency-ms 2 --output baseline.json
+    python scripts/bench_e2e.py --baseline baseline.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+SCRIPTS_DIR = Path(__file__).parent
+
+# Each conversation is replayed turn by turn in one session. Short openers make the
+# fake LLM ask a follow-up question; longer turns go straight to recommendations.
+CONVERSATIONS = [
+    ["Hi there", "I have oily skin with breakouts, what serum should I use?", "Anything under $40?"],
+    ["Need help", "Looking for a gentle moisturizer for dry sensitive skin", "Without fragrance please"],
+    ["What helps with dark spots and dull skin?", "Is it safe to use with retinol at night?"],
+    ["Recommend a shampoo for frizzy and dry hair", "Something cheaper than $30", "Does it contain sulfates?"],
+    ["Hello", "My skin is combination and gets red easily", "I want a cleanser and a sunscreen"],
+]
+
+
+def _percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..100)."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s.")
+
+
+def _start(script: str, port: int, *args) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, str(SCRIPTS_DIR / script), "--port", str(port), *map(str, args)],
+        stdout=subprocess.DEVNULL,
+    )
+    _wait_for_port(port)
+    return process
+
+
+def _samples(breakdown: dict) -> dict:
+    """Flattens one response's timing breakdown into named series (ms)."""
+    samples = {f"stage.{name}": ms for name, ms in breakdown["stages"].items()}
+    samples["llm"] = breakdown["llm"]["ms"]
+    samples["embedding"] = breakdown["embedding"]["ms"]
+    samples["retrieval"] = breakdown["retrieval"]["ms"]
+    for name, ms in breakdown["session"].items():
+        samples[f"session.{name.removesuffix('_ms')}"] = ms
+    samples["server_total"] = breakdown["total_ms"]
+    return samples
+
+
+async def _run_level(client, concurrency: int, conversations: int) -> dict:
+    queue = asyncio.Queue()
+    for i in range(conversations):
+        queue.put_nowait(CONVERSATIONS[i % len(CONVERSATIONS)])
+    series, errors, turns = {"request": []}, 0, 0
+
+    async def worker():
+        nonlocal errors, turns
+        while not queue.empty():
+            script = queue.get_nowait()
+            session_id = None
+            for query in script:
+                started = time.perf_counter()
+                payload = {"query": query, "include_timings": True}
+                if session_id:
+                    payload["session_id"] = session_id
+                response = await client.post("/api/search", json=payload)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                turns += 1
+                if response.status_code != 200:
+                    errors += 1
+                    break
+                body = response.json()
+                session_id = body["session_id"]
+                series["request"].append(elapsed_ms)
+                for name, ms in _samples(body["metrics"]).items():
+                    series.setdefault(name, []).append(ms)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "conversations": conversations,
+        "turns": turns,
+        "errors": errors,
+        "turns_per_s": turns / elapsed,
+        "series": {
+            name: {
+                "n": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+            }
+            for name, values in series.items()
+            if values
+        },
+    }
+
+
+def _print_level(result: dict):
+    print(
+        f"\nconcurrency {result['concurrency']}: {result['turns']} turns in {result['conversations']} "
+        f"conversations, {result['errors']} errors, {result['turns_per_s']:.2f} turns/s"
+    )
+    print(f"    {'series':<30} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in result["series"].items():
+        print(f"    {name:<30} {stats['n']:>6} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}")
+
+
+def _regressions(results: list, baseline: dict, max_regression: float, min_delta_ms: float) -> list:
+    """End-to-end p95/p99 slowdowns beyond the allowed ratio (and absolute noise floor)."""
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    found = []
+    for result in results:
+        before = previous.get(result["concurrency"])
+        if before is None or "request" not in before["series"]:
+            continue
+        for pct in ("p95", "p99"):
+            old, new = before["series"]["request"][pct], result["series"]["request"][pct]
+            if new > old * (1 + max_regression) and new - old > min_delta_ms:
+                found.append(f"concurrency {result['concurrency']} {pct}: {old:.1f} -> {new:.1f} ms")
+    return found
+
+
+async def _bench(args) -> list:
+    # The app reads its settings at import time, so it is imported only now.
+    import httpx
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from app.main import app
+    from app.services.jobs import ingestion_jobs
+    from scripts.ingest_data import main as ingest_main
+
+    ingest_main(force=True)
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with app.router.lifespan_context(app):
+        while ingestion_jobs.active():
+            # Let the startup (incremental, no-op) ingestion finish before measuring.
+            await asyncio.sleep(0.05)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            await _run_level(client, 1, 1)  # warm-up: connections, collection handles, indexes
+            for level in args.concurrency:
+                result = await _run_level(client, level, max(args.conversations, level))
+                _print_level(result)
+                results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /api/search benchmark with fake OpenAI and Redis.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrent conversations.")
+    parser.add_argument("--conversations", type=int, default=20, help="Conversations replayed per level.")
+    parser.add_argument("--openai-latency-ms", type=float, default=100.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--redis-latency-ms", type=float, default=1.0, help="Per round-trip delay of the fake Redis.")
+    parser.add_argument("--session-store", default="redis", choices=["redis", "memory"])
+    parser.add_argument("--no-write-behind", action="store_true", help="Write sessions on the request path.")
+    parser.add_argument("--semantic-cache", action="store_true", help="Keep the semantic response cache on.")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95/p99 slowdown (0.2 = 20%%).")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore slowdowns smaller than this.")
+    args = parser.parse_args()
+
+    openai_port, redis_port = _free_port(), _free_port()
+    processes = [
+        _start(
+            "fake_openai_server.py", openai_port,
+            "--latency-ms", args.openai_latency_ms, "--token-latency-ms", args.token_latency_ms,
+        ),
+    ]
+    if args.session_store == "redis":
+        processes.append(_start("fake_redis_server.py", redis_port, "--latency-ms", args.redis_latency_ms))
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.environ.update(
+                {
+                    "OPENAI_API_KEY": "bench",
+                    "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                    "REDIS_URL": f"redis://127.0.0.1:{redis_port}/0",
+                    "SESSION_STORE": args.session_store,
+                    "SESSION_WRITE_BEHIND": str(not args.no_write_behind).lower(),
+                    "SEMANTIC_CACHE_ENABLED": str(args.semantic_cache).lower(),
+                    "EMBEDDING_CACHE_ENABLED": "false",
+                    "VECTOR_STORE": "numpy",
+                    "VECTOR_STORE_PATH": str(Path(workdir) / "vector_store"),
+                    "LEXICAL_INDEX_PATH": str(Path(workdir) / "lexical_index"),
+                }
+            )
+            results = asyncio.run(_bench(args))
+    finally:
+        for process in processes:
+            process.terminate()
+
+    report = {"config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}, "levels": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+    if args.baseline:
+        regressions = _regressions(
+            results, json.loads(Path(args.baseline).read_text()), args.max_regression, args.min_delta_ms
+        )
+        if regressions:
+            print("\nLatency regressions against baseline:")
+            for line in regressions:
+                print(f"    {line}")
+            sys.exit(1)
+        print("\nNo latency regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
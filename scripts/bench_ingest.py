@@ -0,0 +1,149 @@
+"""
+Ingestion throughput benchmark on synthetic product catalogues.
+
+Generates catalogues in the bundled CSV format (1k rows up to 1M) and ingests
+each with ``ingest_product_catalogue`` against the fake OpenAI server, reporting
+rows/s, embedding requests and peak memory. Every size runs in a fresh process
+with its own working directory, so vector store files, indexes and peak RSS do
+not carry over between runs. The embedding cache is disabled, so every row is
+embedded.
+
+Full-size vectors for 1M rows need ~6 GB; pass ``--dimensions 256`` to benchmark
+the largest catalogues with smaller fake embeddings.
+
+Usage:
+    python scripts/bench_ingest.py --sizes 1000 10000 100000
+    python scripts/bench_ingest.py --sizes 1000000 --dimensions 256 --openai-latency-ms 20
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.bench_e2e import _free_port, _start
+
+PRODUCT_TYPES = ["Serum", "Moisturizer", "Cleanser", "Sunscreen", "Toner", "Face Mask", "Shampoo", "Conditioner"]
+ADJECTIVES = ["Hydrating", "Brightening", "Calming", "Clarifying", "Firming", "Gentle", "Daily", "Overnight"]
+INGREDIENTS = [
+    "Hyaluronic Acid", "Niacinamide", "Vitamin C", "Retinol", "Salicylic Acid", "Ceramides",
+    "Aloe Vera", "Green Tea Extract", "Zinc Oxide", "Peptides", "Squalane", "Argan Oil",
+]
+BENEFITS = [
+    "Boosts hydration", "Reduces dark spots", "Controls excess oil", "Soothes redness",
+    "Strengthens the skin barrier", "Smooths fine lines", "Protects against UV damage", "Tames frizz",
+]
+
+
+def write_catalogue(path: Path, rows: int, seed: int = 0):
+    """Writes a synthetic catalogue with ``rows`` uniquely named products."""
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(["name", "benefits", "ingredients", "benefits_of_ingredients", "description", "price", "reviews"])
+        for i in range(rows):
+            product_type = rng.choice(PRODUCT_TYPES)
+            name = f"{rng.choice(ADJECTIVES)} {product_type} {i}"
+            ingredients = rng.sample(INGREDIENTS, 3)
+            benefits = rng.sample(BENEFITS, 2)
+            writer.writerow(
+                [
+                    name,
+                    ", ".join(benefits),
+                    ", ".join(ingredients),
+                    ", ".join(f"{ingredient}: {rng.choice(BENEFITS)}." for ingredient in ingredients),
+                    f"A {name.lower()} with {ingredients[0].lower()} that {benefits[0].lower()} "
+                    f"and {benefits[1].lower()} for everyday use.",
+                    f"${rng.randint(8, 90)}.00",
+                    f"Customer {i}: Works well for my skin. (Rating: {rng.randint(3, 5)})",
+                ]
+            )
+
+
+def _fake_server_requests(port: int) -> int:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+        return json.loads(response.read())["requests"]
+
+
+def run_case(rows: int, openai_port: int, batch_size: int | None, vector_store: str) -> dict:
+    """Generates and ingests one catalogue; runs in its own process."""
+    with tempfile.TemporaryDirectory() as workdir:
+        # Relative paths (e.g. Chroma's ./chroma_db) land in the throwaway directory.
+        os.chdir(workdir)
+        os.environ.update(
+            {
+                "OPENAI_API_KEY": "bench",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "REDIS_URL": "redis://127.0.0.1:6379/0",
+                "SESSION_STORE": "memory",
+                "EMBEDDING_CACHE_ENABLED": "false",
+                "VECTOR_STORE": vector_store,
+                "VECTOR_STORE_PATH": str(Path(workdir) / "vector_store"),
+                "LEXICAL_INDEX_PATH": str(Path(workdir) / "lexical_index"),
+            }
+        )
+        from loguru import logger
+
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+        from scripts.ingest_data import _peak_memory_mb, ingest_product_catalogue
+
+        path = Path(workdir) / "catalogue.csv"
+        started = time.perf_counter()
+        write_catalogue(path, rows)
+        generate_seconds = time.perf_counter() - started
+
+        requests_before = _fake_server_requests(openai_port)
+        started = time.perf_counter()
+        ingest_product_catalogue("bench", str(path), batch_size)
+        seconds = time.perf_counter() - started
+        return {
+            "rows": rows,
+            "generate_s": generate_seconds,
+            "ingest_s": seconds,
+            "rows_per_s": rows / seconds,
+            "embedding_requests": _fake_server_requests(openai_port) - requests_before,
+            "peak_rss_mb": _peak_memory_mb(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark catalogue ingestion throughput.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000], help="Catalogue rows.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Documents per upsert (defaults to INGEST_BATCH_SIZE).")
+    parser.add_argument("--vector-store", default="numpy", choices=["numpy", "chroma"])
+    parser.add_argument("--openai-latency-ms", type=float, default=0.0)
+    parser.add_argument("--dimensions", type=int, default=1536, help="Fake embedding length.")
+    args = parser.parse_args()
+
+    openai_port = _free_port()
+    server = _start(
+        "fake_openai_server.py", openai_port, "--latency-ms", args.openai_latency_ms, "--dimensions", args.dimensions
+    )
+    try:
+        print(f"{'rows':>9} {'gen s':>7} {'ingest s':>9} {'rows/s':>9} {'embed reqs':>10} {'peak MB':>9}")
+        for rows in args.sizes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                r = pool.submit(run_case, rows, openai_port, args.batch_size, args.vector_store).result()
+            print(
+                f"{r['rows']:>9} {r['generate_s']:>7.2f} {r['ingest_s']:>9.2f} {r['rows_per_s']:>9.1f} "
+                f"{r['embedding_requests']:>10} {r['peak_rss_mb']:>9.1f}"
+            )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Microbenchmark for the per-request pipeline overhead of /api/search.
+
+Compares compiling the LangGraph pipeline on every request (the old behaviour of
+calling ``build_graph()`` inside the handler) against fetching the shared,
+pre-compiled pipeline from ``pipeline_registry``. No OpenAI or Chroma calls are
+made: only the graph construction / lookup cost is measured.
+
+Usage:
+    python scripts/bench_pipeline.py --iterations 200
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+from loguru import logger
+
+from app.utils.pipeline import PipelineRegistry, build_graph
+
+
+def _time_calls(fn, iterations: int) -> list:
+    """Returns per-call wall times in milliseconds."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _summary(label: str, timings: list) -> str:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    return (
+        f"{label:<24} mean={statistics.mean(timings):8.3f} ms  "
+        f"p50={statistics.median(timings):8.3f} ms  p95={p95:8.3f} ms"
+    )
+
+
+def main(iterations: int):
+    # Graph building logs at INFO level on every call; keep the output readable.
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    per_request = _time_calls(build_graph, iterations)
+
+    registry = PipelineRegistry()
+    registry.build()
+    shared = _time_calls(registry.get, iterations)
+
+    print(f"Per-request pipeline overhead over {iterations} iterations:")
+    print(_summary("build_graph() per call", per_request))
+    print(_summary("pipeline_registry.get()", shared))
+    speedup = statistics.mean(per_request) / max(statistics.mean(shared), 1e-9)
+    print(f"Speedup: {speedup:,.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pipeline compilation overhead.")
+    parser.add_argument("--iterations", type=int, default=200, help="Number of timed calls per variant.")
+    args = parser.parse_args()
+    main(args.iterations)
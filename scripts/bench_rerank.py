@@ -0,0 +1,126 @@
+"""
+Benchmark for the product re-ranking stage.
+
+Builds known-item queries from the bundled catalogue: each query is a product's
+first benefit phrase plus one of its ingredients, and that product is the one
+relevant answer. The product is hidden at a random position in a pool of
+``--candidates`` random catalogue products (standing in for a noisy retrieval
+order), and the pool is re-ranked. The report compares hit@k (k =
+PRODUCT_N_RESULTS) and MRR of the retrieval order with the re-ranked order, and
+the scorer latency.
+
+``--scorer llm`` re-ranks with the batched LLM scorer against the configured
+OpenAI endpoint, within RERANK_BUDGET_MS (``--budget-ms``), and also reports how
+often the budget forced the local fallback. The semantic cache is disabled so
+every query makes its call.
+
+Usage:
+    python scripts/bench_rerank.py --queries 500 --candidates 12
+    python scripts/fake_openai_server.py --latency-ms 150 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python scripts/bench_rerank.py --scorer llm --budget-ms 100
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+
+import pandas as pd
+from loguru import logger
+
+CATALOGUE = Path(__file__).parent.parent / "data" / "products.csv"
+
+
+def _catalogue() -> list:
+    """(document, metadata) pairs for the bundled catalogue, as ingestion builds them."""
+    from scripts.ingest_data import _product_document
+
+    pairs = []
+    for row in pd.read_csv(CATALOGUE).fillna("").to_dict("records"):
+        document, key, metadata = _product_document(row)
+        metadata["id"] = key
+        pairs.append((document, metadata))
+    return pairs
+
+
+def _queries(pairs: list, count: int, candidates: int, rng: random.Random) -> list:
+    """(query, pool, target id) triples; the target sits at a random position of the pool."""
+    queries = []
+    for _ in range(count):
+        target = rng.choice(pairs)
+        metadata = target[1]
+        benefit = str(metadata["benefits"]).split(",")[0].strip()
+        ingredients = [name.strip() for name in str(metadata["top_ingredients"]).split(",") if name.strip()]
+        query = f"something that {benefit.lower()}"
+        if ingredients:
+            query += f" with {rng.choice(ingredients).lower()}"
+        others = rng.sample([pair for pair in pairs if pair is not target], min(candidates - 1, len(pairs) - 1))
+        others.insert(rng.randrange(len(others) + 1), target)
+        queries.append((query, others, metadata["id"]))
+    return queries
+
+
+def _rank(pairs: list, target: str) -> int | None:
+    ids = [metadata["id"] for _, metadata in pairs]
+    return ids.index(target) + 1 if target in ids else None
+
+
+def _quality(ranks: list, k: int) -> str:
+    hits = sum(1 for rank in ranks if rank is not None and rank <= k)
+    mrr = statistics.mean(1 / rank if rank else 0.0 for rank in ranks)
+    return f"hit@{k} {hits / len(ranks):6.1%}   MRR {mrr:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure re-ranking quality and latency.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--candidates", type=int, default=None, help="Pool size. Defaults to RERANK_CANDIDATES.")
+    parser.add_argument("--scorer", default="local", choices=["local", "llm"])
+    parser.add_argument("--budget-ms", type=float, default=None, help="Defaults to RERANK_BUDGET_MS.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    from app.config import settings
+    from app.services.metrics import RERANK_RUNS
+    from app.services.rerank import SCORERS, Reranker
+
+    candidates = args.candidates or settings.RERANK_CANDIDATES
+    k = settings.PRODUCT_N_RESULTS
+    reranker = Reranker(SCORERS[args.scorer](), args.budget_ms or settings.RERANK_BUDGET_MS)
+    queries = _queries(_catalogue(), args.queries, candidates, random.Random(args.seed))
+
+    before, after, latencies = [], [], []
+    for query, pool, target in queries:
+        before.append(_rank(pool, target))
+        started = time.perf_counter()
+        ranked = reranker.rerank(query, pool, top_k=len(pool))
+        latencies.append((time.perf_counter() - started) * 1000)
+        after.append(_rank(ranked, target))
+
+    print(f"{len(queries)} queries, {candidates} candidates each, scorer '{args.scorer}'\n")
+    print(f"retrieval order   {_quality(before, k)}")
+    print(f"re-ranked         {_quality(after, k)}")
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"\nlatency  p50 {statistics.median(latencies):.3f} ms   p95 {p95:.3f} ms")
+    if args.scorer != "local":
+        outcomes = {
+            outcome: RERANK_RUNS.value(scorer=args.scorer, outcome=outcome)
+            for outcome in ("ok", "budget_exceeded", "error")
+        }
+        print("outcomes " + "   ".join(f"{outcome} {int(count)}" for outcome, count in outcomes.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark for speculative product retrieval on the recommendation path.
+
+Runs the async pipeline directly (no HTTP or session I/O) with
+SPECULATIVE_RETRIEVAL off and on, and reports p50 end-to-end latency plus the
+median time of each recorded stage. Queries are long enough that the fake
+OpenAI server routes them straight to recommendations. The semantic cache is
+disabled so every run makes its LLM calls.
+
+Usage:
+    python scripts/fake_openai_server.py --latency-ms 150 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python scripts/bench_speculative.py --runs 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "false")
+
+from loguru import logger
+
+QUERIES = [
+    "I have oily skin with breakouts, what serum should I use?",
+    "Looking for a gentle moisturizer for dry sensitive skin",
+    "What helps with dark spots and dull skin?",
+    "Need a shampoo for frizzy and dry hair",
+]
+
+
+async def _run(runs: int) -> tuple[list, dict]:
+    from app.models.schemas import ConversationState
+    from app.services.rag import request_scope
+    from app.utils.pipeline import build_graph
+
+    pipeline = build_graph(async_nodes=True)
+    totals, stages = [], {}
+    for i in range(runs):
+        query = QUERIES[i % len(QUERIES)]
+        with request_scope():
+            started = time.perf_counter()
+            result = await pipeline.ainvoke(
+                ConversationState(conversation=[{"role": "user", "content": query}], query=query)
+            )
+            totals.append((time.perf_counter() - started) * 1000)
+        for stage, ms in result["stage_timings"].items():
+            stages.setdefault(stage, []).append(ms)
+    return totals, stages
+
+
+async def main(runs: int):
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from app.config import settings
+
+    report = {}
+    for speculative in (False, True):
+        settings.SPECULATIVE_RETRIEVAL = speculative
+        await _run(2)  # warm-up: embedding cache, collection handles, connections
+        report[speculative] = await _run(runs)
+
+    for speculative, (totals, stages) in report.items():
+        print(f"SPECULATIVE_RETRIEVAL={speculative}: p50 {statistics.median(totals):.1f} ms over {runs} runs")
+        for stage, values in stages.items():
+            print(f"    {stage:<20} p50 {statistics.median(values):8.1f} ms")
+    saved = statistics.median(report[False][0]) - statistics.median(report[True][0])
+    print(f"p50 saved by speculation: {saved:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark speculative product retrieval.")
+    parser.add_argument("--runs", type=int, default=20, help="Timed pipeline runs per mode.")
+    args = parser.parse_args()
+    asyncio.run(main(args.runs))
@@ -0,0 +1,152 @@
+"""
+Startup-time benchmark for the API server.
+
+Measures, over several cold starts, how long ``import app.main`` takes and how
+long a fresh uvicorn worker needs until ``/healthz`` (live) and ``/readyz`` (ready)
+answer 200. OpenAI is served by the fake server; the vector index is built once
+in a throwaway directory beforehand, so readiness measures client warm-up rather
+than ingestion (pass ``--startup-ingestion`` to include the background refresh).
+
+``--unreachable-redis`` points the Redis session store at a closed port: the worker
+must still come up live, with ``/readyz`` reporting the session store as failing.
+
+Usage:
+    python scripts/bench_startup.py --runs 5
+    python scripts/bench_startup.py --session-store redis --unreachable-redis
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.bench_e2e import _free_port, _start
+
+ROOT = Path(__file__).parent.parent
+
+
+def _status(url: str) -> tuple[int | None, dict | None]:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None, None
+
+
+def _import_seconds(env: dict, workdir: str) -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, cwd=workdir, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _boot(env: dict, workdir: str, timeout: float) -> dict:
+    """Starts one uvicorn worker and times it until live and ready."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", str(ROOT), "--port", str(port), "--log-level", "warning"],
+        env=env,
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    result = {"live_s": None, "ready_s": None, "checks": None}
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and process.poll() is None:
+            if result["live_s"] is None and _status(f"{base}/healthz")[0] == 200:
+                result["live_s"] = time.perf_counter() - started
+            if result["live_s"] is not None:
+                status, body = _status(f"{base}/readyz")
+                result["checks"] = body and body["checks"]
+                if status == 200:
+                    result["ready_s"] = time.perf_counter() - started
+                    break
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+
+def _summary(values: list) -> str:
+    values = [value for value in values if value is not None]
+    if not values:
+        return "never"
+    return f"median {statistics.median(values):.2f}s  min {min(values):.2f}s  max {max(values):.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import, liveness and readiness times.")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure.")
+    parser.add_argument("--session-store", default="memory", choices=["memory", "redis"])
+    parser.add_argument("--unreachable-redis", action="store_true", help="Point REDIS_URL at a closed port.")
+    parser.add_argument("--redis-latency-ms", type=float, default=1.0)
+    parser.add_argument("--startup-ingestion", action="store_true", help="Keep the background ingestion on boot.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for readiness per run.")
+    args = parser.parse_args()
+
+    openai_port, redis_port = _free_port(), _free_port()
+    processes = [_start("fake_openai_server.py", openai_port)]
+    if args.session_store == "redis" and not args.unreachable_redis:
+        processes.append(_start("fake_redis_server.py", redis_port, "--latency-ms", args.redis_latency_ms))
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = {
+                **os.environ,
+                "PYTHONPATH": str(ROOT),
+                "OPENAI_API_KEY": "bench",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+                "REDIS_URL": f"redis://127.0.0.1:{redis_port}/0",
+                "SESSION_STORE": args.session_store,
+                "STARTUP_INGESTION": str(args.startup_ingestion).lower(),
+                "EMBEDDING_CACHE_ENABLED": "false",
+                "VECTOR_STORE": "numpy",
+                "VECTOR_STORE_PATH": str(Path(workdir) / "vector_store"),
+                "LEXICAL_INDEX_PATH": str(Path(workdir) / "lexical_index"),
+            }
+            subprocess.run(
+                [sys.executable, str(ROOT / "scripts" / "ingest_data.py")],
+                env=env, cwd=workdir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+
+            imports, lives, readies, last = [], [], [], None
+            for run in range(args.runs):
+                imports.append(_import_seconds(env, workdir))
+                last = _boot(env, workdir, args.timeout)
+                lives.append(last["live_s"])
+                readies.append(last["ready_s"])
+                live = f"{last['live_s']:.2f}s" if last["live_s"] is not None else "never"
+                ready = f"{last['ready_s']:.2f}s" if last["ready_s"] is not None else "never"
+                print(f"run {run + 1}: import {imports[-1]:.2f}s, live {live}, ready {ready}")
+    finally:
+        for process in processes:
+            process.terminate()
+
+    print(f"\nimport app.main   {_summary(imports)}")
+    print(f"/healthz 200      {_summary(lives)}")
+    print(f"/readyz 200       {_summary(readies)}")
+    if last and last["ready_s"] is None and last["checks"]:
+        print("\nLast readiness checks:")
+        for name, check in last["checks"].items():
+            print(f"    {name:<15} {check['status']:<6} {check.get('error', '')}")
+
+
+if __name__ == "__main__":
+    main()
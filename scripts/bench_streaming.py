@@ -0,0 +1,92 @@
+"""
+Time-to-first-token benchmark: /api/search versus /api/search/stream.
+
+For the blocking endpoint the user sees nothing until the whole response is ready;
+for the SSE endpoint we record when the first status event and the first token
+event arrive. The app is served by an in-process uvicorn server on a real socket
+(an ASGI test transport would buffer the whole stream), against the fake OpenAI server.
+
+Usage:
+    python scripts/fake_openai_server.py --latency-ms 300 --token-latency-ms 30 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python scripts/bench_streaming.py --runs 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+import uvicorn
+from loguru import logger
+
+QUERY = "I have oily skin with breakouts, what serum should I use?"
+
+
+async def _time_blocking(client: httpx.AsyncClient) -> float:
+    start = time.perf_counter()
+    response = await client.post("/api/search", json={"query": QUERY})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def _time_streaming(client: httpx.AsyncClient) -> tuple[float, float, float]:
+    """Returns (first status event, first token event, done event) offsets in seconds."""
+    first_status = first_token = done = None
+    start = time.perf_counter()
+    async with client.stream("POST", "/api/search/stream", json={"query": QUERY}) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("event: "):
+                continue
+            event = line[len("event: "):]
+            now = time.perf_counter() - start
+            if event == "status" and first_status is None:
+                first_status = now
+            elif event.endswith("_token") and first_token is None:
+                first_token = now
+            elif event == "done":
+                done = now
+    return first_status, first_token, done
+
+
+async def main(runs: int, port: int):
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            await _time_blocking(client)  # warm-up
+            blocking = [await _time_blocking(client) for _ in range(runs)]
+            streaming = [await _time_streaming(client) for _ in range(runs)]
+    finally:
+        server.should_exit = True
+        await serving
+
+    def ms(values):
+        values = [v for v in values if v is not None]
+        return f"{statistics.median(values) * 1000:8.1f} ms" if values else "     n/a"
+
+    print(f"Median over {runs} runs:")
+    print(f"  /api/search          full response  {ms(blocking)}")
+    print(f"  /api/search/stream   first status   {ms([s[0] for s in streaming])}")
+    print(f"  /api/search/stream   first token    {ms([s[1] for s in streaming])}")
+    print(f"  /api/search/stream   done           {ms([s[2] for s in streaming])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-token benchmark for the search endpoints.")
+    parser.add_argument("--runs", type=int, default=5, help="Timed requests per endpoint.")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the in-process API server.")
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.port))
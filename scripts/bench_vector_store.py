@@ -0,0 +1,138 @@
+"""
+Benchmark of the NumPy vector store engine against Chroma.
+
+For each collection size, both engines are loaded with the same random unit
+vectors (ada-002 dimensionality) and metadata, then timed on single top-10
+queries with and without a metadata filter. Each engine/size pair runs in a fresh
+process so the reported memory (RSS growth while loading) is not polluted by the
+previous run. No OpenAI access is needed.
+
+Usage:
+    python scripts/bench_vector_store.py --sizes 1000 10000 100000 --queries 200
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+
+DIMENSIONS = 1536
+WRITE_BATCH = 5000  # Below Chroma's max batch size
+CATEGORIES = ["serum", "moisturizer", "cleanser", "sunscreen", "shampoo"]
+
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc; falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _dataset(size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((size, DIMENSIONS), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"prod_{i}" for i in range(size)]
+    metadatas = [
+        {"price": float(rng.integers(5, 100)), "category": CATEGORIES[i % len(CATEGORIES)]}
+        for i in range(size)
+    ]
+    documents = [f"Product {i}" for i in range(size)]
+    return vectors, ids, metadatas, documents
+
+
+def _open_collection(engine: str, directory: str):
+    if engine == "chroma":
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+
+        client = chromadb.PersistentClient(path=directory, settings=ChromaSettings(anonymized_telemetry=False))
+        return client.get_or_create_collection("bench")
+    from app.services.vector_store import NumpyVectorStore
+
+    return NumpyVectorStore("bench", directory)
+
+
+def _time_queries(collection, queries: np.ndarray, where: dict | None) -> list:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=10, where=where)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run_case(engine: str, size: int, queries: int) -> dict:
+    """Loads ``size`` vectors into ``engine`` and times queries against it."""
+    vectors, ids, metadatas, documents = _dataset(size)
+    query_vectors = _dataset(queries, seed=1)[0]
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = _rss_mb()
+        collection = _open_collection(engine, directory)
+        started = time.perf_counter()
+        for start in range(0, size, WRITE_BATCH):
+            end = start + WRITE_BATCH
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=vectors[start:end].tolist(),
+                metadatas=metadatas[start:end],
+                documents=documents[start:end],
+            )
+        if hasattr(collection, "persist"):
+            collection.persist()
+        load_seconds = time.perf_counter() - started
+        memory = _rss_mb() - baseline
+
+        _time_queries(collection, query_vectors[:5], None)  # warm up
+        plain = _time_queries(collection, query_vectors, None)
+        filtered = _time_queries(
+            collection, query_vectors, {"$and": [{"category": "serum"}, {"price": {"$lt": 50}}]}
+        )
+    return {
+        "engine": engine,
+        "size": size,
+        "load_s": load_seconds,
+        "rss_mb": memory,
+        "p50_ms": statistics.median(plain),
+        "p95_ms": float(np.percentile(plain, 95)),
+        "filtered_p50_ms": statistics.median(filtered),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy vector store with Chroma.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per case.")
+    parser.add_argument("--engines", nargs="+", default=["chroma", "numpy"], choices=["chroma", "numpy"])
+    args = parser.parse_args()
+
+    print(f"{'engine':<8} {'vectors':>8} {'load s':>8} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'filt p50':>9}")
+    for size in args.sizes:
+        for engine in args.engines:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                row = pool.submit(run_case, engine, size, args.queries).result()
+            print(
+                f"{row['engine']:<8} {row['size']:>8} {row['load_s']:>8.2f} {row['rss_mb']:>8.1f} "
+                f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['filtered_p50_ms']:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
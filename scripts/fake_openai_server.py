@@ -0,0 +1,275 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions APIs.
+
+Embeddings are deterministic vectors derived from a hash of each input, so repeated
+runs produce identical embeddings. Chat completions return canned replies shaped
+like the pipeline's prompts expect (JSON for the analysis prompts, prose otherwise).
+Latency and transient failures can be injected to exercise batching, concurrency
+and retries without touching the real API.
+
+Usage:
+    python scripts/fake_openai_server.py --port 8001 --latency-ms 50 --failure-rate 0.1
+    python scripts/fake_openai_server.py --dimensions 256   # smaller vectors for large catalogues
+    python scripts/fake_openai_server.py --malformed-rate 0.3   # exercise structured-output retries
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python scripts/ingest_data.py
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> list:
+    """Deterministic unit-length pseudo-embedding for ``text``."""
+    values = []
+    counter = 0
+    while len(values) < dimensions:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        # 8 signed 32-bit ints per digest, scaled to [-1, 1].
+        values.extend(v / 2**31 for v in struct.unpack("<8i", digest))
+        counter += 1
+    values = values[:dimensions]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+def fake_chat_reply(messages: list) -> str:
+    """Canned assistant reply matching the format the pipeline prompt asks for."""
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    last_user = next(
+        (m["content"] for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    if '"follow_up_question"' in system:
+        # Ready once the user has answered at least one question.
+        ready = sum(1 for m in messages if m.get("role") == "user") > 1 or len(last_user.split()) >= 3
+        question = "" if ready else "Could you tell me a bit about your skin type?"
+        return json.dumps(
+            {"ready_for_recommendation": ready, "optimized_query": last_user[-200:], "follow_up_question": question}
+        )
+    if "optimized_query" in system or "optimized_query" in last_user:
+        return json.dumps(
+            {"ready_for_recommendation": True, "optimized_query": last_user[-200:], "is_follow_up": False}
+        )
+    if '"is_follow_up"' in system and '"answer"' in system:
+        # Ask a follow-up for very short openers, otherwise move on to recommendations.
+        is_follow_up = len(last_user.split()) < 3
+        answer = "Could you tell me a bit about your skin type?" if is_follow_up else "Thanks, that helps!"
+        return json.dumps({"is_follow_up": is_follow_up, "answer": answer})
+    if "re-ranking assistant" in last_user:
+        # Scores the products in reverse order, so a re-ranking is visible.
+        names = re.findall(r'"product_name": "([^"]*)"', last_user)
+        scores = [{"product_name": name, "relevance_score": 1 + i % 10} for i, name in enumerate(names)]
+        return json.dumps({"products": scores})
+    if "Recommend suitable products" in system:
+        return json.dumps(
+            {
+                "products": "Hydration Serum, Daily Moisturizer",
+                "text": "These two are gentle and suit most skin types. Want a night routine too?",
+            }
+        )
+    return "Got it! What's your skin like on a typical day: oily, dry, or combination?"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    token_latency_ms = 0.0
+    dimensions = EMBEDDING_DIMENSIONS
+    failure_rate = 0.0
+    malformed_rate = 0.0
+    stats = {"requests": 0, "inputs": 0, "failures": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.stats_lock:
+                self._send_json(200, dict(self.stats))
+            return
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        if self.path.rstrip("/").endswith("/embeddings"):
+            self._handle_embeddings(payload)
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            self._handle_chat(payload)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _record_request(self, inputs: int) -> bool:
+        """Updates counters; returns True if this request should fail."""
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            if random.random() < self.failure_rate:
+                self.stats["failures"] += 1
+                return True
+            self.stats["inputs"] += inputs
+            return False
+
+    def _send_failure(self):
+        self._send_json(503, {"error": {"message": "Injected failure", "type": "server_error"}})
+
+    def _handle_chat(self, payload: dict):
+        if self._record_request(1):
+            self._send_failure()
+            return
+        messages = payload.get("messages", [])
+        content = fake_chat_reply(messages)
+        if payload.get("response_format", {}).get("type") == "json_object" and random.random() < self.malformed_rate:
+            # A truncated reply, as when a JSON-mode completion hits max_tokens.
+            content = content[: len(content) // 2]
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        completion_tokens = len(content.split())
+        if payload.get("stream"):
+            self._stream_chat(payload, content, prompt_tokens, completion_tokens)
+            return
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "gpt-4o"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    def _stream_chat(self, payload: dict, content: str, prompt_tokens: int, completion_tokens: int):
+        """Sends the reply as SSE chunks, one word per chunk, like the streaming API."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def send(choices: list, usage: dict | None = None):
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "gpt-4o"),
+                "choices": choices,
+            }
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            token = word if i == 0 else f" {word}"
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            send([{"index": 0, "delta": delta, "finish_reason": None}])
+            if self.token_latency_ms:
+                time.sleep(self.token_latency_ms / 1000)
+        send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            send([], {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            })
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _handle_embeddings(self, payload: dict):
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if self._record_request(len(inputs)):
+            self._send_failure()
+            return
+
+        # Like the text-embedding-3 models, honour a requested "dimensions".
+        dimensions = payload.get("dimensions") or self.dimensions
+        data = [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions)}
+            for i, text in enumerate(inputs)
+        ]
+        tokens = sum(len(text.split()) for text in inputs)
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": payload.get("model", "text-embedding-ada-002"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+
+def serve(
+    host: str,
+    port: int,
+    latency_ms: float,
+    failure_rate: float,
+    token_latency_ms: float = 0.0,
+    dimensions: int = EMBEDDING_DIMENSIONS,
+    malformed_rate: float = 0.0,
+) -> ThreadingHTTPServer:
+    """Starts the fake server on a background thread and returns it."""
+    FakeOpenAIHandler.latency_ms = latency_ms
+    FakeOpenAIHandler.dimensions = dimensions
+    FakeOpenAIHandler.token_latency_ms = token_latency_ms
+    FakeOpenAIHandler.failure_rate = failure_rate
+    FakeOpenAIHandler.malformed_rate = malformed_rate
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI API server for local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with a 503.")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Delay between streamed tokens.")
+    parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS, help="Embedding vector length.")
+    parser.add_argument(
+        "--malformed-rate", type=float, default=0.0, help="Fraction of JSON-mode replies truncated to invalid JSON."
+    )
+    args = parser.parse_args()
+
+    server = serve(
+        args.host, args.port, args.latency_ms, args.failure_rate, args.token_latency_ms, args.dimensions,
+        args.malformed_rate,
+    )
+    print(f"Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
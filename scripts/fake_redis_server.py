@@ -0,0 +1,301 @@
+"""
+Local stand-in for a Redis server, speaking enough of the RESP2/RESP3 protocol for
+the session store (strings, lists, key expiry, pipelines).
+
+Data lives in memory and expires lazily on access. A fixed delay can be injected
+per batch of commands read from a connection, which models one network round-trip
+per pipeline, so the effect of pipelining and write-behind shows up in benchmarks.
+
+Usage:
+    python scripts/fake_redis_server.py --port 6390 --latency-ms 2
+    SESSION_STORE=redis REDIS_URL=redis://127.0.0.1:6390/0 uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+
+class RespError(Exception):
+    pass
+
+
+def _encode(value, resp3: bool = False) -> bytes:
+    """Encodes a reply; str is a bulk string, use ``Simple`` for status replies."""
+    if isinstance(value, Simple):
+        return b"+" + value.encode("utf-8") + b"\r\n"
+    if isinstance(value, RespError):
+        return b"-" + str(value).encode("utf-8") + b"\r\n"
+    if value is None:
+        return b"_\r\n" if resp3 else b"$-1\r\n"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b":" + str(value).encode() + b"\r\n"
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+    if isinstance(value, list):
+        return b"*" + str(len(value)).encode() + b"\r\n" + b"".join(_encode(item, resp3) for item in value)
+    if isinstance(value, dict):
+        # RESP3 map (only sent after HELLO 3).
+        return b"%" + str(len(value)).encode() + b"\r\n" + b"".join(
+            _encode(k, resp3) + _encode(v, resp3) for k, v in value.items()
+        )
+    raise TypeError(f"Cannot encode {type(value)}")
+
+
+class Simple(str):
+    """A RESP simple string reply, e.g. OK / PONG."""
+
+
+OK = Simple("OK")
+
+
+class FakeRedis:
+    """In-memory keyspace with the subset of Redis commands the app uses."""
+
+    def __init__(self):
+        self.data = {}  # key -> bytes (string) or list of bytes
+        self.expires = {}  # key -> monotonic deadline
+        self.commands = 0
+
+    def _alive(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _list(self, key: bytes, create: bool = False):
+        if not self._alive(key):
+            if not create:
+                return None
+            self.data[key] = []
+        value = self.data[key]
+        if not isinstance(value, list):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def execute(self, args: list):
+        self.commands += 1
+        name = args[0].decode().upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*args[1:])
+        except RespError as e:
+            return e
+        except (TypeError, ValueError, IndexError):
+            return RespError(f"ERR wrong number or type of arguments for '{name}' command")
+
+    # --- Connection ---
+
+    def cmd_ping(self, message=None):
+        return message if message is not None else Simple("PONG")
+
+    def cmd_echo(self, message):
+        return message
+
+    def cmd_hello(self, protover=b"2", *args):
+        if protover not in (b"2", b"3"):
+            raise RespError("NOPROTO unsupported protocol version")
+        info = {"server": "redis", "version": "7.2.0", "proto": int(protover), "id": 1, "mode": "standalone", "role": "master", "modules": []}
+        if protover == b"3":
+            return info
+        return [item for pair in info.items() for item in pair]
+
+    def cmd_select(self, db):
+        return OK
+
+    def cmd_client(self, *args):
+        return OK
+
+    def cmd_command(self, *args):
+        return []
+
+    # --- Keys ---
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                removed += 1
+            self.expires.pop(key, None)
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    def cmd_expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def cmd_ttl(self, key):
+        if not self._alive(key):
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else max(0, round(deadline - time.monotonic()))
+
+    def cmd_flushall(self, *args):
+        self.data.clear()
+        self.expires.clear()
+        return OK
+
+    cmd_flushdb = cmd_flushall
+
+    def cmd_dbsize(self):
+        return sum(1 for key in list(self.data) if self._alive(key))
+
+    # --- Strings ---
+
+    def cmd_get(self, key):
+        if not self._alive(key):
+            return None
+        value = self.data[key]
+        if isinstance(value, list):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_set(self, key, value, *options):
+        options = [option.decode().upper() for option in options]
+        ttl = None
+        for option, argument in zip(options, options[1:] + [""]):
+            if option == "EX":
+                ttl = int(argument)
+            elif option == "PX":
+                ttl = int(argument) / 1000
+            elif option == "NX" and self._alive(key):
+                return None
+            elif option == "XX" and not self._alive(key):
+                return None
+        self.data[key] = value
+        if ttl is None:
+            self.expires.pop(key, None)
+        else:
+            self.expires[key] = time.monotonic() + ttl
+        return OK
+
+    # --- Lists ---
+
+    def cmd_rpush(self, key, *values):
+        items = self._list(key, create=True)
+        items.extend(values)
+        return len(items)
+
+    def cmd_lpush(self, key, *values):
+        items = self._list(key, create=True)
+        items[:0] = reversed(values)
+        return len(items)
+
+    def cmd_llen(self, key):
+        items = self._list(key)
+        return len(items) if items is not None else 0
+
+    @staticmethod
+    def _range(length: int, start: int, stop: int) -> tuple[int, int]:
+        start = max(length + start, 0) if start < 0 else start
+        stop = length + stop if stop < 0 else min(stop, length - 1)
+        return start, stop
+
+    def cmd_lrange(self, key, start, stop):
+        items = self._list(key)
+        if not items:
+            return []
+        start, stop = self._range(len(items), int(start), int(stop))
+        return items[start:stop + 1]
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self._list(key)
+        if items is None:
+            return OK
+        start, stop = self._range(len(items), int(start), int(stop))
+        items[:] = items[start:stop + 1]
+        if not items:
+            del self.data[key]
+            self.expires.pop(key, None)
+        return OK
+
+
+async def _read_command(reader: asyncio.StreamReader) -> list | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet / redis-cli without RESP).
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:].strip())):
+        header = await reader.readline()
+        length = int(header[1:].strip())
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def serve(host: str, port: int, latency_ms: float = 0.0) -> FakeRedis:
+    """Starts the fake server on a background thread and returns its keyspace."""
+    store = FakeRedis()
+    started = threading.Event()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        resp3 = False  # Switched by HELLO 3
+
+        def execute(args: list) -> bytes:
+            nonlocal resp3
+            reply = store.execute(args)
+            if args[0].upper() == b"HELLO" and not isinstance(reply, RespError):
+                resp3 = isinstance(reply, dict)
+            return _encode(reply, resp3)
+
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                replies = [execute(args)] if args else []
+                # Everything already buffered is part of the same pipeline / round-trip.
+                while reader._buffer:  # noqa: SLF001 - asyncio exposes no public "bytes buffered"
+                    more = await _read_command(reader)
+                    if more is None:
+                        break
+                    if more:
+                        replies.append(execute(more))
+                if latency_ms:
+                    await asyncio.sleep(latency_ms / 1000)
+                writer.write(b"".join(replies))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(asyncio.start_server(handle, host, port))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Redis server for local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every round-trip.")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.latency_ms)
+    print(f"Fake Redis server listening on redis://{args.host}:{args.port}/0")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
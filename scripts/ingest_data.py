@@ -1,99 +1,312 @@
 import argparse
-import pandas as pd
-from docx import Document
+import hashlib
+import json
+import resource
+import time
 from loguru import logger
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import sys
 from pathlib import Path
 
 # Add the project root to the Python path to allow importing from 'app'
 sys.path.append(str(Path(__file__).parent.parent))
 
-from app.dependencies import chroma_client
-from app.services.rag import add_document
+from app.config import settings
+from app.dependencies import vector_store_client
+from app.services.catalogue import iter_catalogue_rows
+from app.services.constraints import facet_indexes, infer_category, price_bucket
+from app.services.documents import iter_chunked_documents
+from app.services.index_generations import IndexSet, generations
+from app.services.jobs import JobCancelled
+from app.services.lexical_index import lexical_indexes
+from app.services.semantic_cache import invalidate_semantic_caches
+from app.services.rag import PipelinedWriter, index_watcher, persist_collection, retrieval_service
 
 
-def extract_doc_content(doc_path: str) -> str:
-    """Extracts all text content from a .docx file."""
+# Product metadata fields searched by the BM25 side of hybrid retrieval, with their weights.
+PRODUCT_LEXICAL_FIELDS = {"product_name": 3.0, "top_ingredients": 1.5, "benefits": 1.0}
+
+
+def _peak_memory_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _log_throughput(label: str, count: int, started: float):
+    """Logs rows per second and peak memory for an ingestion run."""
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    logger.info(
+        f"{label}: {count} rows in {elapsed:.2f}s "
+        f"({count / elapsed:,.1f} rows/s), peak memory {_peak_memory_mb():,.1f} MB"
+    )
+
+
+def _stable_id(prefix: str, key: str) -> str:
+    """Position-independent document ID derived from a key (e.g. product name)."""
+    return f"{prefix}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _content_hash(text: str, metadata: dict) -> str:
+    """Hash of everything that ends up in the store for a document, excluding its ID."""
+    payload = {k: v for k, v in metadata.items() if k not in ("id", "content_hash")}
+    blob = json.dumps({"text": text, "metadata": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _assign_ids(prefix: str, keys: list, texts: list, metadatas: list, seen_keys: dict):
+    """
+    Sets a stable 'id' and a 'content_hash' on each metadata dict in place.
+
+    Repeated keys get an occurrence suffix so duplicates still map to distinct IDs.
+    """
+    for key, text, metadata in zip(keys, texts, metadatas):
+        occurrence = seen_keys.get(key, 0)
+        seen_keys[key] = occurrence + 1
+        metadata["id"] = _stable_id(prefix, key if occurrence == 0 else f"{key}#{occurrence}")
+        metadata["content_hash"] = _content_hash(text, metadata)
+
+
+def _serving_indexes() -> IndexSet:
+    """The indexes the API serves from (outside shared index mode)."""
+    return IndexSet(vector_store_client, lexical_indexes, facet_indexes)
+
+
+def load_manifest(collection, page_size: int = 10_000) -> dict:
+    """
+    Reads the per-document content hashes currently stored in a collection.
+
+    The content hash lives in each document's metadata, so the manifest can never
+    drift from what is actually indexed. Documents written before hashes existed
+    map to None and are treated as changed.
+
+    Returns:
+        dict: Mapping of document ID to content hash (or None).
+    """
+    manifest = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+            manifest[doc_id] = (metadata or {}).get("content_hash")
+        if len(page["ids"]) < page_size:
+            return manifest
+        offset += page_size
+
+
+def _submit_changed(writer, texts: list, metadatas: list, manifest: dict | None):
+    """Hands the documents whose content hash differs from the manifest (all of them if no manifest) to the writer."""
+    if manifest is not None:
+        changed = [
+            (text, metadata)
+            for text, metadata in zip(texts, metadatas)
+            if manifest.get(metadata["id"]) != metadata["content_hash"]
+        ]
+        texts = [text for text, _ in changed]
+        metadatas = [metadata for _, metadata in changed]
+    writer.submit(texts, metadatas)
+
+
+def _delete_removed(collection, manifest: dict | None, current_ids: set, batch_size: int) -> int:
+    """Deletes documents that are in the manifest but no longer in the source."""
+    if manifest is None:
+        return 0
+    removed = [doc_id for doc_id in manifest if doc_id not in current_ids]
+    for start in range(0, len(removed), batch_size):
+        collection.delete(ids=removed[start:start + batch_size])
+    if removed:
+        logger.info(f"Deleted {len(removed)} documents no longer present in the source.")
+    return len(removed)
+
+
+def _product_document(row: dict) -> tuple[str, str, dict]:
+    """
+    Builds (text, key, metadata) for one catalogue row. The key is the product name,
+    or a hash of the row's content for unnamed products, never the row position.
+    """
+    # Clean and convert price
+    price_str = str(row.get("price", "0")).replace("$", "").strip()
     try:
-        doc = Document(doc_path)
-        full_text = []
-        for para in doc.paragraphs:
-            if text := para.text.strip():
-                full_text.append(text)
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell_text := cell.text.strip():
-                        full_text.append(cell_text)
-        logger.info(f"Successfully extracted text from {doc_path}")
-        return "\n".join(full_text)
-    except Exception as e:
-        logger.error(f"Failed to extract content from {doc_path}: {e}")
-        raise
+        price_float = float(price_str)
+    except (ValueError, TypeError):
+        price_float = 0.0
+
+    metadata = {
+        "product_name": row.get("name"),
+        "price": price_float,
+        "price_bucket": price_bucket(price_float),
+        "category": infer_category(row.get("name")),
+        "benefits": row.get("benefits", ""),
+        "top_ingredients": row.get("ingredients", ""),
+        "benefits_of_ingredients": row.get("benefits_of_ingredients", ""),
+        "reviews": row.get("reviews", ""),
+    }
+    text = row.get("description", "")
+    key = str(row.get("name") or f"unnamed_{_content_hash(text, metadata)}")
+    return text, key, metadata
 
 
-def ingest_product_catalogue(collection_name: str, file_path: str):
-    """Ingests product data from a CSV or Excel file into a ChromaDB collection."""
+def ingest_product_catalogue(
+    collection_name: str,
+    file_path: str,
+    batch_size: int | None = None,
+    incremental: bool = False,
+    job=None,
+    indexes: IndexSet | None = None,
+):
+    """
+    Ingests product data from a CSV, Excel or Parquet file into a vector store collection.
+
+    The file is streamed (see ``iter_catalogue_rows``) and each batch of rows is
+    handed to a ``PipelinedWriter``, so the next batch is parsed while earlier ones
+    are embedded and written, and memory stays flat regardless of the file size.
+    Product IDs are derived from the product name (or, for unnamed products, the
+    row content), so inserting or reordering rows does not shift other products' IDs. With ``incremental`` only new or changed
+    rows are embedded and upserted, and products removed from the file are deleted.
+    The BM25 index over name, ingredients and benefits and the ingredient / price
+    bucket / category facet index are then rebuilt from the collection. When run as
+    a background ``job``, progress is reported and cancellation is honoured between
+    batches. ``indexes`` selects where to write (defaults to the serving indexes).
+    Returns the number of documents written or deleted.
+    """
     logger.info(f"Starting ingestion for product catalogue: {file_path}")
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    indexes = indexes or _serving_indexes()
+    started = time.perf_counter()
     try:
-        file_extension = Path(file_path).suffix.lower()
-        if file_extension == '.csv':
-            df = pd.read_csv(file_path)
-        elif file_extension in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path)
-        else:
-            raise ValueError(f"Unsupported file format for product catalogue: {file_extension}")
-        
-        logger.info(f"Loaded {len(df)} records from {file_path}")
+        rows = iter_catalogue_rows(file_path)
 
-        collection = chroma_client.get_or_create_collection(collection_name)
+        collection = indexes.vectors.get_or_create_collection(collection_name)
         logger.info(f"Using collection '{collection_name}'.")
+        manifest = load_manifest(collection) if incremental else None
+
+        texts, keys, metadatas = [], [], []
+        # IDs are only kept when removed products have to be found afterwards.
+        seen_keys, current_ids, total = {}, set(), 0
 
-        for index, row in df.iterrows():
-            text = row.get("description", "")
-            
-            # Clean and convert price
-            price_str = str(row.get("price", "0")).replace("$", "").strip()
-            try:
-                price_float = float(price_str)
-            except (ValueError, TypeError):
-                price_float = 0.0
-
-            metadata = {
-                "id": f"prod_{index}",
-                "product_name": row.get("name"),
-                "price": price_float,
-                "benefits": row.get("benefits", ""),
-                "top_ingredients": row.get("ingredients", ""),
-                "benefits_of_ingredients": row.get("benefits_of_ingredients", ""),
-                "reviews": row.get("reviews", ""),
-            }
-            add_document(collection, text, metadata)
-        logger.success(f"Successfully ingested {len(df)} products into '{collection_name}'.")
+        with PipelinedWriter(collection) as writer:
+
+            def flush():
+                nonlocal total
+                if job is not None:
+                    job.check_cancelled()
+                _assign_ids("prod", keys, texts, metadatas, seen_keys)
+                total += len(metadatas)
+                if manifest is not None:
+                    current_ids.update(metadata["id"] for metadata in metadatas)
+                _submit_changed(writer, texts, metadatas, manifest)
+                if job is not None:
+                    job.report(f"products:{collection_name}", total)
+
+            for row in rows:
+                text, key, metadata = _product_document(row)
+                texts.append(text)
+                keys.append(key)
+                metadatas.append(metadata)
+                if len(texts) >= batch_size:
+                    flush()
+                    texts, keys, metadatas = [], [], []
+            if texts:
+                flush()
+        written = writer.written
+        logger.info(f"Loaded {total} records from {file_path}")
+        if job is not None:
+            job.check_cancelled()
+        deleted = _delete_removed(collection, manifest, current_ids, batch_size)
+        persist_collection(collection)
+        indexes.lexical.build(collection_name, collection, fields=PRODUCT_LEXICAL_FIELDS)
+        indexes.facets.build(collection_name, collection)
+        _log_throughput(f"Product catalogue '{collection_name}'", total, started)
+        logger.success(
+            f"Successfully ingested {total} products into '{collection_name}' "
+            f"({written} written, {total - written} unchanged, {deleted} deleted)."
+        )
+        return written + deleted
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.error(f"Product catalogue ingestion failed: {e}", exc_info=True)
         raise
 
 
-def ingest_additional_info(collection_name: str, file_path: str):
-    """Ingests and chunks additional information from a DOCX file."""
-    logger.info(f"Starting ingestion for additional info: {file_path}")
-    try:
-        full_text = extract_doc_content(file_path)
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=80)
-        chunks = splitter.split_text(full_text)
-        logger.info(f"Split document into {len(chunks)} chunks.")
+def ingest_knowledge_base(
+    collection_name: str,
+    path: str,
+    batch_size: int | None = None,
+    incremental: bool = False,
+    job=None,
+    chunker: str | None = None,
+    indexes: IndexSet | None = None,
+):
+    """
+    Ingests every .docx, .md and .txt document under a directory (or a single file).
 
-        collection = chroma_client.get_or_create_collection(collection_name)
+    Documents are parsed and chunked in a process pool (see ``iter_chunked_documents``)
+    while earlier files' chunks are embedded and written by a ``PipelinedWriter``.
+    Chunks follow the document structure: they never cross a heading, carry their
+    heading path, and tables are kept apart from prose. A chunk whose text already
+    appeared earlier (in sorted path order) is ingested once, from its first source.
+    Each chunk records its source path, section, position within the file and kind
+    (text / table); its ID is derived from the chunk text. With ``incremental`` only
+    new or changed chunks are embedded and chunks that no longer appear anywhere are
+    deleted. ``indexes`` selects where to write (defaults to the serving indexes).
+    Returns the number of documents written or deleted.
+    """
+    logger.info(f"Starting knowledge base ingestion: {path}")
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    indexes = indexes or _serving_indexes()
+    started = time.perf_counter()
+    try:
+        collection = indexes.vectors.get_or_create_collection(collection_name)
         logger.info(f"Using collection '{collection_name}'.")
+        manifest = load_manifest(collection) if incremental else None
 
-        for idx, chunk in enumerate(chunks):
-            metadata = {"id": f"info_{idx}", "source": "pure.docx"}
-            add_document(collection, chunk, metadata)
-        logger.success(f"Successfully ingested {len(chunks)} chunks into '{collection_name}'.")
+        texts, keys, metadatas = [], [], []
+        # `seen` holds the normalised text of every chunk taken so far, for cross-file dedupe.
+        seen, seen_keys, current_ids, files, total, duplicates = set(), {}, set(), 0, 0, 0
+
+        with PipelinedWriter(collection) as writer:
+
+            def flush():
+                nonlocal total
+                _assign_ids("kb", keys, texts, metadatas, seen_keys)
+                current_ids.update(metadata["id"] for metadata in metadatas)
+                total += len(metadatas)
+                _submit_changed(writer, texts, metadatas, manifest)
+
+            for source, chunks in iter_chunked_documents(path, chunker):
+                if job is not None:
+                    job.check_cancelled()
+                files += 1
+                for key, text, metadata in chunks:
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                    texts.append(text)
+                    keys.append(key)
+                    metadatas.append(metadata)
+                    if len(texts) >= batch_size:
+                        flush()
+                        texts, keys, metadatas = [], [], []
+                if job is not None:
+                    job.report(f"knowledge_base:{collection_name}", files)
+            if texts:
+                flush()
+        written = writer.written
+        if job is not None:
+            job.check_cancelled()
+        deleted = _delete_removed(collection, manifest, current_ids, batch_size)
+        persist_collection(collection)
+        _log_throughput(f"Knowledge base '{collection_name}'", total, started)
+        logger.success(
+            f"Successfully ingested {total} chunks from {files} documents into '{collection_name}' "
+            f"({written} written, {total - written} unchanged, {deleted} deleted, {duplicates} duplicates skipped)."
+        )
+        return written + deleted
+    except JobCancelled:
+        raise
     except Exception as e:
-        logger.error(f"Additional info ingestion failed: {e}", exc_info=True)
+        logger.error(f"Knowledge base ingestion failed: {e}", exc_info=True)
         raise
 
 
@@ -139,33 +352,81 @@ def ingest_additional_info(collection_name: str, file_path: str):
 #     main()
 
 
-def main(force=False):
+def _publish_generation(product_path: str, kb_path: str, force, batch_size, incremental, job):
+    """
+    Shared index mode: builds a new index generation under the cross-process
+    ingestion lock and publishes it. With ``force`` the generation starts empty,
+    otherwise from the current one; nothing is published if nothing changed.
+
+    Raises:
+        IndexLocked: If another process is already ingesting.
+    """
+    with generations.lock():
+        generation, directory = generations.stage(seed=not force)
+        indexes = IndexSet.at(directory)
+        try:
+            changed = ingest_product_catalogue("skincare", product_path, batch_size, incremental, job, indexes)
+            changed += ingest_knowledge_base(
+                "skincare_combined", kb_path, batch_size, incremental, job, indexes=indexes
+            )
+        except BaseException:
+            generations.discard(generation)
+            raise
+        if changed or force or generations.current() is None:
+            generations.publish(generation)
+            generations.prune()
+        else:
+            generations.discard(generation)
+            logger.info("Nothing changed; keeping the current index generation.")
+    # Switch this process now; other workers follow within SHARED_INDEX_POLL_SECONDS.
+    index_watcher.check()
+
+
+def main(force=False, batch_size=None, incremental=False, job=None, kb_dir=None):
     DATA_DIR = Path(__file__).parent.parent / "data"
     PRODUCT_CATALOGUE_PATH = DATA_DIR / "products2.csv"
-    ADDITIONAL_INFO_PATH = DATA_DIR / "pure.docx"
+    KNOWLEDGE_BASE_DIR = kb_dir or settings.KNOWLEDGE_BASE_DIR or DATA_DIR
 
-    if force:
+    # In shared index mode a forced run builds an empty generation instead.
+    if force and generations is None:
         try:
-            chroma_client.delete_collection("skincare")
+            vector_store_client.delete_collection("skincare")
+            lexical_indexes.delete("skincare")
+            facet_indexes.delete("skincare")
             logger.info("Deleted 'skincare' collection.")
         except Exception:
             logger.warning("Could not delete 'skincare' collection.")
         try:
-            chroma_client.delete_collection("skincare_combined")
+            vector_store_client.delete_collection("skincare_combined")
             logger.info("Deleted 'skincare_combined' collection.")
         except Exception:
             logger.warning("Could not delete 'skincare_combined' collection.")
+        # Cached collection handles point at the deleted collections.
+        retrieval_service.invalidate()
 
     try:
-        ingest_product_catalogue("skincare", str(PRODUCT_CATALOGUE_PATH))
-        ingest_additional_info("skincare_combined", str(ADDITIONAL_INFO_PATH))
+        if generations is not None:
+            _publish_generation(
+                str(PRODUCT_CATALOGUE_PATH), str(KNOWLEDGE_BASE_DIR), force, batch_size, incremental, job
+            )
+        else:
+            changed = ingest_product_catalogue("skincare", str(PRODUCT_CATALOGUE_PATH), batch_size, incremental, job)
+            changed += ingest_knowledge_base("skincare_combined", str(KNOWLEDGE_BASE_DIR), batch_size, incremental, job)
+            if changed or force:
+                # Cached LLM responses may describe documents that changed or no longer exist.
+                invalidate_semantic_caches()
         logger.success("Data ingestion completed successfully.")
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.error(f"A critical error occurred during data ingestion: {e}")
         raise
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Data ingestion script for Pure minimalist.")
-    parser.add_argument("--force", action="store_true", help="Force re-ingestion by deleting existing ChromaDB collections.")
+    parser.add_argument("--force", action="store_true", help="Force re-ingestion by deleting existing collections.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Documents per upsert (defaults to INGEST_BATCH_SIZE).")
+    parser.add_argument("--incremental", action="store_true", help="Only embed new or changed documents and delete removed ones.")
+    parser.add_argument("--kb-dir", default=None, help="Directory of .docx/.md/.txt documents (defaults to KNOWLEDGE_BASE_DIR, then data/).")
     args = parser.parse_args()
-    main(args.force)
\ No newline at end of file
+    main(args.force, args.batch_size, args.incremental, kb_dir=args.kb_dir)
\ No newline at end of file
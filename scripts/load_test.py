@@ -0,0 +1,92 @@
+"""
+Load test for /api/search showing how throughput scales with concurrency.
+
+Runs the FastAPI app in-process (ASGI transport, no network hop to the app) with
+OpenAI pointed at the local fake server, then fires batches of concurrent search
+requests at increasing concurrency levels and reports throughput and latency.
+With a blocking request path throughput stays flat as concurrency rises; with the
+async path it should grow roughly linearly until the fake server saturates.
+
+Usage:
+    python scripts/fake_openai_server.py --latency-ms 200 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python scripts/load_test.py --levels 1 4 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+from loguru import logger
+
+QUERIES = [
+    "I have oily skin with breakouts, what serum should I use?",
+    "Looking for a gentle moisturizer for dry sensitive skin",
+    "What helps with dark spots and dull skin?",
+    "Need a shampoo for frizzy hair",
+]
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _run_level(client: httpx.AsyncClient, concurrency: int, requests_per_worker: int) -> dict:
+    latencies, errors = [], 0
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        for i in range(requests_per_worker):
+            query = QUERIES[(worker_id + i) % len(QUERIES)]
+            start = time.perf_counter()
+            response = await client.post("/api/search", json={"query": query})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+    }
+
+
+async def main(levels: list, requests_per_worker: int):
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+            # Warm up embedding cache / Chroma / connection pools.
+            await client.post("/api/search", json={"query": QUERIES[0]})
+            print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9}")
+            for level in levels:
+                r = await _run_level(client, level, requests_per_worker)
+                print(
+                    f"{r['concurrency']:>11} {r['requests']:>8} {r['errors']:>6} "
+                    f"{r['throughput']:>8.2f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency load test for /api/search.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrency levels to test.")
+    parser.add_argument("--requests-per-worker", type=int, default=5, help="Sequential requests per concurrent worker.")
+    args = parser.parse_args()
+    asyncio.run(main(args.levels, args.requests_per_worker))
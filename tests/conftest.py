@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the project root to the Python path to allow importing from 'app'
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Settings are read when app.config is imported: run every test offline, with
+# in-process stores under a throwaway directory.
+_data_dir = tempfile.mkdtemp(prefix="pure-rag-tests-")
+for name, value in {
+    "OPENAI_API_KEY": "test",
+    "REDIS_URL": "redis://127.0.0.1:6379/0",
+    "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+    "SESSION_STORE": "memory",
+    "VECTOR_STORE": "numpy",
+    "VECTOR_STORE_PATH": os.path.join(_data_dir, "vector_store"),
+    "LEXICAL_INDEX_PATH": os.path.join(_data_dir, "lexical_index"),
+    "EMBEDDING_CACHE_ENABLED": "false",
+    "EMBEDDING_CACHE_PATH": os.path.join(_data_dir, "embedding_cache", "embeddings.sqlite3"),
+    "STARTUP_INGESTION": "false",
+}.items():
+    os.environ.setdefault(name, value)
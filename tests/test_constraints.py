@@ -0,0 +1,164 @@
+import pytest
+
+import app.services.constraints as constraints_module
+from app.services.constraints import FacetIndex, constraint_filter, extract_constraints, infer_category
+from app.services.lexical_index import IndexRegistry
+from app.services.vector_store import NumpyVectorStore
+
+PRODUCTS = [
+    ("p1", "Niacinamide Serum", 18.0, "Niacinamide, Zinc"),
+    ("p2", "Vitamin C Serum", 42.0, "Vitamin C, Essential Oils"),
+    ("p3", "Hydrating Night Cream", 30.0, "Hyaluronic Acid, Shea Butter"),
+    ("p4", "Under Eye Cream", 25.0, "Caffeine, Niacinamide"),
+    ("p5", "Rose Toner", 12.0, "Rose Water, Fragrance"),
+    ("p6", "Onion Hair Mask", 55.0, "Onion Extract, Coconut Oil"),
+]
+
+
+def _metadata(doc_id, name, price, ingredients):
+    return {
+        "id": doc_id,
+        "product_name": name,
+        "price": price,
+        "top_ingredients": ingredients,
+        "category": infer_category(name),
+    }
+
+
+@pytest.fixture(scope="module")
+def collection():
+    store = NumpyVectorStore("skincare")
+    store.upsert(
+        [product[0] for product in PRODUCTS],
+        [[float(i), 1.0] for i in range(len(PRODUCTS))],
+        [_metadata(*product) for product in PRODUCTS],
+        [product[1] for product in PRODUCTS],
+    )
+    return store
+
+
+@pytest.fixture(scope="module")
+def facets(collection):
+    return FacetIndex().build(*[collection.get(include=["metadatas"])[key] for key in ("ids", "metadatas")])
+
+
+@pytest.fixture
+def registry(collection, tmp_path, monkeypatch):
+    registry = IndexRegistry(str(tmp_path), FacetIndex, suffix=".facets")
+    registry.build("skincare", collection)
+    monkeypatch.setattr(constraints_module, "facet_indexes", registry)
+    return registry
+
+
+@pytest.mark.parametrize(
+    "message, min_price, max_price",
+    [
+        ("something under $20", None, 20.0),
+        ("less than 30 dollars please", None, 30.0),
+        ("my budget is around 40", None, 40.0),
+        ("at least $15", 15.0, None),
+        ("over 25 usd but no more than $60", 25.0, 60.0),
+        ("between 10 and 30 dollars", 10.0, 30.0),
+        ("$20-$45", 20.0, 45.0),
+        ("I use 2 serums a day", None, None),
+    ],
+)
+def test_price_bounds(message, min_price, max_price):
+    constraints = extract_constraints([message])
+    assert (constraints.min_price, constraints.max_price) == (min_price, max_price)
+
+
+def test_later_messages_override_price_bounds():
+    constraints = extract_constraints(["under $20", "actually anything under $50 works"])
+    assert constraints.max_price == 50.0
+
+
+@pytest.mark.parametrize(
+    "message, excluded",
+    [
+        ("a fragrance-free toner", ["fragrance"]),
+        ("it has to be fragrance free", ["fragrance"]),
+        ("something without fragrance", ["fragrance"]),
+        ("no essential oils please", ["essential oils"]),
+        ("I'm allergic to caffeine", ["caffeine"]),
+    ],
+)
+def test_ingredient_exclusions(facets, message, excluded):
+    constraints = extract_constraints([message], facets)
+    assert constraints.exclude_ingredients == excluded
+    assert constraints.include_ingredients == []
+
+
+def test_ingredient_inclusions_and_unknown_ingredients(facets):
+    constraints = extract_constraints(["a serum with niacinamide", "containing retinol"], facets)
+    # Retinol is not in the catalogue, so it could never be enforced.
+    assert constraints.include_ingredients == ["niacinamide"]
+
+
+def test_exclusion_wins_over_an_earlier_inclusion(facets):
+    constraints = extract_constraints(["with caffeine", "actually without caffeine"], facets)
+    assert constraints.include_ingredients == []
+    assert constraints.exclude_ingredients == ["caffeine"]
+
+
+@pytest.mark.parametrize(
+    "message, categories",
+    [
+        ("an eye cream for puffiness", ["eye cream"]),
+        ("a good night cream", ["moisturizer"]),
+        ("a hair mask for frizz", ["hair mask"]),
+        ("a serum and a toner", ["serum", "toner"]),
+        ("something for my skin", []),
+    ],
+)
+def test_categories_prefer_the_most_specific_term(facets, message, categories):
+    assert extract_constraints([message], facets).categories == categories
+
+
+def test_categories_unknown_to_the_catalogue_are_dropped(facets):
+    assert extract_constraints(["a shampoo"], facets).categories == []
+    assert extract_constraints(["a shampoo"]).categories == ["shampoo"]
+
+
+def test_constraint_filter_without_constraints_or_facets(registry):
+    assert constraint_filter("skincare", None) == (None, None)
+    assert constraint_filter("skincare", {}) == (None, None)
+    assert constraint_filter("makeup", {"max_price": 20}) == (None, None)
+
+
+@pytest.mark.parametrize(
+    "constraints, expected",
+    [
+        ({"max_price": 30}, {"p1", "p3", "p4", "p5"}),
+        ({"min_price": 20, "max_price": 45}, {"p2", "p3", "p4"}),
+        ({"categories": ["serum", "toner"]}, {"p1", "p2", "p5"}),
+        ({"include_ingredients": ["niacinamide"]}, {"p1", "p4"}),
+        ({"exclude_ingredients": ["niacinamide", "oil"]}, {"p3", "p5"}),
+        ({"categories": ["serum"], "max_price": 20, "exclude_ingredients": ["zinc"]}, set()),
+        ({"include_ingredients": ["niacinamide"], "categories": ["eye cream"]}, {"p4"}),
+    ],
+)
+def test_constraint_filter_candidates_match_the_where_filter(registry, collection, constraints, expected):
+    where, candidates = constraint_filter("skincare", constraints)
+    assert candidates == expected
+    assert set(collection.get(where=where, include=[])["ids"]) == expected
+
+
+def test_pipeline_constraints_come_from_user_turns_not_the_summary(monkeypatch):
+    from app.models.schemas import ConversationState
+    from app.services.session import HistoryManager
+    from app.utils import pipeline
+
+    monkeypatch.setattr(pipeline.facet_indexes, "get", lambda name: None)
+    state = ConversationState(
+        conversation=[
+            HistoryManager.summary_message("We looked at a $80 cream priced over $60 and a serum under $15."),
+            {"role": "user", "content": "I need a serum"},
+            {"role": "assistant", "content": "Anything under $10 is hard to find."},
+        ],
+        query="something under $30",
+    )
+
+    pipeline._update_constraints(state)
+
+    assert state.constraints == {"max_price": 30.0, "categories": ["serum"]}
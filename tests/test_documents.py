@@ -0,0 +1,101 @@
+from app.services.documents import _markdown_blocks, chunk_by_structure, chunk_file
+
+MARKDOWN = """# Guide
+Intro paragraph.
+
+## Routine
+Cleanse first.
+
+### Evening
+Apply retinol.
+
+## Ingredients
+| Name | Use |
+|------|-----|
+| Niacinamide | Pores |
+| Retinol | Ageing |
+After the table.
+
+```python
+# not a heading
+
+| not | a table |
+```
+"""
+
+
+def test_markdown_blocks_recognise_headings_tables_and_fences():
+    blocks = _markdown_blocks(MARKDOWN.splitlines())
+
+    assert blocks[:6] == [
+        ("heading", "Guide", 1),
+        ("text", "Intro paragraph.", 0),
+        ("heading", "Routine", 2),
+        ("text", "Cleanse first.", 0),
+        ("heading", "Evening", 3),
+        ("text", "Apply retinol.", 0),
+    ]
+    assert blocks[6:9] == [
+        ("heading", "Ingredients", 2),
+        ("table", "Name: Niacinamide; Use: Pores\nName: Retinol; Use: Ageing", 0),
+        ("text", "After the table.", 0),
+    ]
+    assert blocks[9] == ("text", "```python\n# not a heading\n\n| not | a table |\n```", 0)
+    assert len(blocks) == 10
+
+
+def test_chunks_carry_the_heading_path():
+    chunks = chunk_by_structure(_markdown_blocks(MARKDOWN.splitlines()), chunk_size=500, chunk_overlap=0)
+    sections = [section for section, _, _ in chunks]
+
+    assert sections[:3] == ["Guide", "Guide > Routine", "Guide > Routine > Evening"]
+    assert set(sections[3:]) == {"Guide > Ingredients"}  # a level-2 heading closes "Routine > Evening"
+
+
+def test_fenced_code_stays_in_one_chunk():
+    chunks = chunk_by_structure(_markdown_blocks(MARKDOWN.splitlines()), chunk_size=500, chunk_overlap=0)
+    code = [text for _, text, _ in chunks if "```" in text]
+
+    assert code == ["After the table.\n```python\n# not a heading\n\n| not | a table |\n```"]
+
+
+def test_tables_are_split_only_between_rows():
+    rows = [f"Name: Product {i}; Use: Something useful" for i in range(10)]
+    blocks = [("text", "Before.", 0), ("table", "\n".join(rows), 0)]
+    chunks = chunk_by_structure(blocks, chunk_size=100, chunk_overlap=0)
+
+    assert chunks[0] == ("", "Before.", "text")  # prose is never mixed with a table
+    parts = [text for _, text, kind in chunks if kind == "table"]
+    assert len(parts) > 1
+    assert all(len(part) <= 100 for part in parts)
+    assert [row for part in parts for row in part.split("\n")] == rows
+
+
+def test_oversized_paragraph_falls_back_to_the_recursive_splitter():
+    sentence = "Hyaluronic acid draws water into the skin. "
+    long_paragraph = (sentence * 10).strip()
+    blocks = [
+        ("heading", "Hydration", 1),
+        ("text", "Short.", 0),
+        ("text", long_paragraph, 0),
+        ("text", "Tail.", 0),
+    ]
+
+    chunks = chunk_by_structure(blocks, chunk_size=100, chunk_overlap=0)
+
+    assert chunks[0] == ("Hydration", "Short.", "text")
+    assert chunks[-1] == ("Hydration", "Tail.", "text")
+    middle = [text for _, text, _ in chunks[1:-1]]
+    assert len(middle) > 1 and all(len(text) <= 100 for text in middle)
+    assert " ".join(middle).split() == long_paragraph.split()
+
+
+def test_chunk_file_prefixes_the_section_but_dedupes_on_the_body(tmp_path):
+    path = tmp_path / "guide.md"
+    path.write_text("# Guide\n\nUse   sunscreen\ndaily.\n", encoding="utf-8")
+
+    [(key, text, metadata)] = chunk_file(str(path), "guide.md", "structure", 500, 0)
+
+    assert text == "Guide\nUse   sunscreen\ndaily."
+    assert key == "Use sunscreen daily."
+    assert metadata == {"source": "guide.md", "section": "Guide", "position": 0, "kind": "text"}
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import app.services.embedding as embedding
+from app.services.embedding import (
+    MAX_TOKENS_PER_INPUT,
+    _pack_batches,
+    estimate_tokens,
+    generate_embeddings,
+    truncate_input,
+)
+
+
+class StubEmbeddings:
+    """Embeds each text as [len(text)], answering in reverse index order; ``fail`` errors are raised first."""
+
+    def __init__(self, fail=()):
+        self.fail = list(fail)
+        self.calls = []
+
+    def create(self, input, model):
+        self.calls.append(list(input))
+        if self.fail:
+            raise self.fail.pop(0)
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data[::-1], usage=None)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    def install(fail=()):
+        embeddings = StubEmbeddings(fail)
+        monkeypatch.setattr(embedding, "openai_client", SimpleNamespace(embeddings=embeddings))
+        monkeypatch.setattr(embedding, "embedding_cache", None)
+        monkeypatch.setattr(embedding.time, "sleep", lambda seconds: None)
+        return embeddings
+
+    return install
+
+
+def _connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://test/embeddings"))
+
+
+def test_pack_batches_respects_input_count_and_token_budget():
+    texts = ["a" * 30] * 5  # 11 estimated tokens each
+    assert estimate_tokens(texts[0]) == 11
+    assert _pack_batches(texts, batch_size=2, max_tokens=1000) == [[0, 1], [2, 3], [4]]
+    assert _pack_batches(texts, batch_size=10, max_tokens=25) == [[0, 1], [2, 3], [4]]
+    assert _pack_batches(texts, batch_size=10, max_tokens=5) == [[0], [1], [2], [3], [4]]
+
+
+def test_oversized_input_is_truncated_to_the_token_limit(stub):
+    embeddings = stub()
+    oversized = "x" * (MAX_TOKENS_PER_INPUT * 4)
+    assert estimate_tokens(truncate_input(oversized)) <= MAX_TOKENS_PER_INPUT
+    assert truncate_input("short") == "short"
+
+    vectors = generate_embeddings(["a", oversized, "bb"], batch_size=10, max_concurrency=1)
+
+    assert embeddings.calls == [["a", truncate_input(oversized), "bb"]]
+    assert vectors == [[1.0], [float(len(truncate_input(oversized)))], [2.0]]
+
+
+def test_output_order_matches_input_across_sub_batches(stub):
+    embeddings = stub()
+    texts = ["x" * n for n in range(1, 8)]
+    vectors = generate_embeddings(texts, batch_size=3, max_concurrency=2, max_batch_tokens=1000)
+    assert vectors == [[float(n)] for n in range(1, 8)]
+    assert len(embeddings.calls) == 3
+
+
+def test_retryable_error_retries_only_the_failed_sub_batch(stub):
+    embeddings = stub(fail=[_connection_error()])
+    vectors = generate_embeddings(["a", "bb"], batch_size=1, max_concurrency=1, max_retries=2)
+    assert vectors == [[1.0], [2.0]]
+    assert embeddings.calls == [["a"], ["a"], ["bb"]]
+
+
+def test_retryable_error_is_raised_once_retries_are_exhausted(stub):
+    embeddings = stub(fail=[_connection_error()] * 3)
+    with pytest.raises(openai.APIConnectionError):
+        generate_embeddings(["a"], max_retries=2)
+    assert len(embeddings.calls) == 3
+
+
+def test_non_retryable_error_is_raised_immediately(stub):
+    embeddings = stub(fail=[ValueError("bad input")])
+    with pytest.raises(ValueError):
+        generate_embeddings(["a"], max_retries=3)
+    assert len(embeddings.calls) == 1
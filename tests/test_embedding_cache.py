@@ -0,0 +1,36 @@
+import itertools
+
+import app.services.embedding_cache as embedding_cache_module
+from app.services.embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+def test_vectors_survive_reopening_the_cache(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, max_entries=100)
+    cache.put(MODEL, "oily skin  serum", [0.5, -1.25])
+
+    reopened = EmbeddingCache(path, max_entries=100)
+    assert reopened.stats()["entries"] == 1
+    # Keys are whitespace-normalized, and vectors round-trip through float32 blobs.
+    assert reopened.get(MODEL, "oily skin serum") == [0.5, -1.25]
+    assert reopened.get("another-model", "oily skin serum") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(embedding_cache_module.time, "time", lambda: float(next(clock)))
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    texts = [f"text {i}" for i in range(10)]
+    for i, text in enumerate(texts):
+        cache.put(MODEL, text, [float(i)])
+    assert cache.get(MODEL, "text 0") == [0.0]  # touched, so no longer the oldest
+
+    cache.put(MODEL, "text 10", [10.0])
+
+    # Eleven entries against a limit of ten: evicted down to 90% of capacity, oldest first.
+    assert cache.stats()["entries"] == 9
+    assert cache.get(MODEL, "text 0") == [0.0]
+    assert cache.get_many(MODEL, texts[1:3]) == [None, None]
+    assert cache.get(MODEL, "text 10") == [10.0]
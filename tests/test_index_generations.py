@@ -0,0 +1,136 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.services.index_generations import GenerationWatcher, IndexGenerations, IndexLocked
+
+
+def _write(directory, name, text):
+    path = directory / "vector_store" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def _publish(generations, text="v", seed=True):
+    with generations.lock():
+        generation, directory = generations.stage(seed=seed)
+        _write(directory, "data", text)
+        generations.publish(generation)
+    return generation
+
+
+def test_staged_generation_is_invisible_until_published(tmp_path):
+    generations = IndexGenerations(str(tmp_path))
+    generation, directory = generations.stage()
+    _write(directory, "data", "v1")
+
+    assert generations.current() is None
+    generations.publish(generation)
+    assert generations.current() == generation
+
+
+def test_seeded_generation_leaves_the_published_files_untouched(tmp_path):
+    generations = IndexGenerations(str(tmp_path))
+    first = _publish(generations, "v1")
+
+    generation, directory = generations.stage(seed=True)
+    assert (directory / "vector_store" / "data").read_text() == "v1"
+    tmp = directory / "vector_store" / "data.tmp"
+    tmp.write_text("v2")
+    os.replace(tmp, directory / "vector_store" / "data")  # how the index files are rewritten
+
+    assert (generations.directory(first) / "vector_store" / "data").read_text() == "v1"
+
+
+def test_lock_is_exclusive(tmp_path):
+    generations = IndexGenerations(str(tmp_path))
+    with generations.lock():
+        with pytest.raises(IndexLocked):
+            with IndexGenerations(str(tmp_path)).lock():
+                pass
+    with generations.lock():
+        pass
+
+
+def test_prune_keeps_recent_generations_and_drops_abandoned_ones(tmp_path):
+    generations = IndexGenerations(str(tmp_path), keep=2)
+    published = [_publish(generations) for _ in range(3)]
+    abandoned, _ = generations.stage()
+
+    generations.prune()
+
+    remaining = sorted(path.name for path in (tmp_path / "generations").iterdir())
+    assert remaining == published[1:]
+    assert abandoned not in remaining
+
+
+def test_prune_keeps_a_generation_a_live_worker_still_serves(tmp_path):
+    generations = IndexGenerations(str(tmp_path), keep=1)
+    old = _publish(generations)
+    generations.register_reader(old)  # this (live) process has not switched yet
+    stale = _publish(generations)
+    generations.register_reader(stale, pid=_dead_pid())
+    _publish(generations)
+
+    generations.prune()
+
+    assert generations.directory(old).exists()
+    assert not generations.directory(stale).exists()
+    assert generations.in_use() == {old}
+
+
+def test_watcher_switches_once_per_published_generation(tmp_path):
+    generations = IndexGenerations(str(tmp_path))
+    switched = []
+    watcher = GenerationWatcher(generations, switched.append, interval=60)
+
+    assert watcher.check() is False  # nothing published yet
+    first = _publish(generations)
+    assert watcher.check() is True
+    assert watcher.check() is False
+    second = _publish(generations)
+    assert watcher.check() is True
+
+    assert switched == [generations.directory(first), generations.directory(second)]
+    assert watcher.generation == second
+    assert generations.in_use() == {second}
+
+
+def test_watcher_skips_a_generation_pruned_before_it_could_switch(tmp_path):
+    generations = IndexGenerations(str(tmp_path))
+    switched = []
+    watcher = GenerationWatcher(generations, switched.append, interval=60)
+    first = _publish(generations)
+    watcher.check()
+    second = _publish(generations)
+    generations.discard(second)
+
+    assert watcher.check() is False
+    assert switched == [generations.directory(first)]
+    assert generations.in_use() == {first}
+
+
+def test_watcher_keeps_the_old_generation_when_switching_fails(tmp_path):
+    generations = IndexGenerations(str(tmp_path))
+
+    def broken(directory):
+        raise OSError("disk error")
+
+    first = _publish(generations)
+    watcher = GenerationWatcher(generations, lambda directory: None, interval=60)
+    watcher.check()
+    watcher._on_change = broken
+    _publish(generations)
+
+    with pytest.raises(OSError):
+        watcher.check()
+    assert watcher.generation == first
+    assert generations.in_use() == {first}
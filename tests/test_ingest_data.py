@@ -0,0 +1,83 @@
+from scripts.ingest_data import (
+    _assign_ids,
+    _delete_removed,
+    _product_document,
+    _submit_changed,
+    load_manifest,
+)
+from app.services.vector_store import NumpyVectorStore
+
+
+class Writer:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, texts, metadatas):
+        self.submitted.append((list(texts), [metadata["id"] for metadata in metadatas]))
+
+
+def _collection(ids, hashes):
+    collection = NumpyVectorStore("products")
+    metadatas = [{"content_hash": h} if h is not None else {} for h in hashes]
+    collection.upsert(ids, [[float(i), 1.0] for i in range(len(ids))], metadatas, [""] * len(ids))
+    return collection
+
+
+def _documents(rows):
+    texts, keys, metadatas = [], [], []
+    for row in rows:
+        text, key, metadata = _product_document(row)
+        texts.append(text)
+        keys.append(key)
+        metadatas.append(metadata)
+    _assign_ids("prod", keys, texts, metadatas, {})
+    return texts, metadatas
+
+
+def test_load_manifest_pages_through_the_collection():
+    collection = _collection([f"doc-{i}" for i in range(5)], ["h0", "h1", None, "h3", "h4"])
+
+    manifest = load_manifest(collection, page_size=2)
+
+    assert manifest == {"doc-0": "h0", "doc-1": "h1", "doc-2": None, "doc-3": "h3", "doc-4": "h4"}
+
+
+def test_unnamed_product_ids_do_not_depend_on_row_position():
+    unnamed = {"name": "", "description": "A plain balm", "price": "$5"}
+    named = {"name": "Rose Toner", "description": "Toner", "price": "$9"}
+
+    _, before = _documents([unnamed, named])
+    _, after = _documents([named, {"name": "New Serum", "description": "Serum"}, unnamed])
+
+    assert {m["id"] for m in before} <= {m["id"] for m in after}
+    assert _documents([dict(unnamed, description="Another balm")])[1][0]["id"] != before[0]["id"]
+
+
+def test_submit_changed_skips_documents_whose_hash_is_unchanged():
+    texts, metadatas = _documents([
+        {"name": "Rose Toner", "description": "Toner"},
+        {"name": "Clay Mask", "description": "Mask"},
+        {"name": "New Serum", "description": "Serum"},
+    ])
+    manifest = {
+        metadatas[0]["id"]: metadatas[0]["content_hash"],
+        metadatas[1]["id"]: "stale hash",
+    }
+
+    writer = Writer()
+    _submit_changed(writer, texts, metadatas, manifest)
+    assert writer.submitted == [(["Mask", "Serum"], [metadatas[1]["id"], metadatas[2]["id"]])]
+
+    writer = Writer()
+    _submit_changed(writer, texts, metadatas, None)
+    assert writer.submitted[0][0] == texts
+
+
+def test_delete_removed_deletes_only_documents_missing_from_the_source():
+    collection = _collection([f"doc-{i}" for i in range(5)], ["h"] * 5)
+    manifest = load_manifest(collection)
+
+    assert _delete_removed(collection, manifest, {"doc-0", "doc-3"}, batch_size=2) == 3
+    assert sorted(collection.get()["ids"]) == ["doc-0", "doc-3"]
+    assert _delete_removed(collection, None, set(), batch_size=2) == 0
+    assert collection.count() == 2
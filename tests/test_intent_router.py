@@ -0,0 +1,95 @@
+import pytest
+
+import app.services.intent_router as intent_router_module
+from app.services.intent_router import FOLLOW_UP, LLM, RECOMMEND, IntentRouter, rule_route
+
+EXAMPLES = {
+    RECOMMEND: ["recommend one", "recommend two"],
+    FOLLOW_UP: ["greeting"],
+    LLM: ["question"],
+}
+# Example embeddings: one axis per route.
+VECTORS = {
+    "recommend one": [1.0, 0.1, 0.0],
+    "recommend two": [1.0, -0.1, 0.0],
+    "greeting": [0.0, 1.0, 0.0],
+    "question": [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(
+        intent_router_module, "generate_embeddings", lambda texts: [VECTORS[text] for text in texts]
+    )
+    return IntentRouter(EXAMPLES, min_margin=0.2)
+
+
+@pytest.mark.parametrize(
+    "messages, query, route",
+    [
+        (["I have oily skin with breakouts"], "I have oily skin with breakouts", RECOMMEND),
+        (["dry hair", "need a shampoo"], "need a shampoo", RECOMMEND),
+        (["hi"], "hi", FOLLOW_UP),
+        (["I want to buy something"], "I want to buy something", FOLLOW_UP),
+        # Only one of type and need: analyze_query decides.
+        (["I have sensitive skin"], "I have sensitive skin", LLM),
+        (["something for acne"], "something for acne", LLM),
+        # General and order questions always take the full graph.
+        (["oily skin, acne"], "What does retinol do for oily skin with acne?", LLM),
+        (["dry skin"], "where is my order", LLM),
+        (["oily skin"], "is niacinamide safe with vitamin c", LLM),
+    ],
+)
+def test_rule_route(messages, query, route):
+    assert rule_route(messages, query) == route
+
+
+def test_classify_picks_the_nearest_centroid(router):
+    assert router.classify([0.9, 0.05, 0.1])[0] == RECOMMEND
+    label, margin = router.classify([0.0, 0.0, 2.0])
+    assert label == LLM and margin == pytest.approx(1.0, abs=1e-3)
+
+
+def test_fast_path_when_rules_and_classifier_agree(router):
+    route, reason = router.route(["oily skin and acne"], "oily skin and acne", [1.0, 0.0, 0.0])
+    assert route == RECOMMEND
+    assert reason["rules"] == reason["classifier"] == RECOMMEND
+    assert router.route(["hello"], "hello", [0.0, 1.0, 0.0])[0] == FOLLOW_UP
+
+
+def test_disagreement_runs_the_full_graph(router):
+    route, reason = router.route(["oily skin and acne"], "oily skin and acne", [0.0, 1.0, 0.0])
+    assert (route, reason["rules"], reason["classifier"]) == (LLM, RECOMMEND, FOLLOW_UP)
+
+
+def test_margin_below_threshold_runs_the_full_graph(router):
+    # Halfway between the recommend and follow-up centroids: agreement, but no confidence.
+    route, reason = router.route(["oily skin and acne"], "oily skin and acne", [1.0, 0.9, 0.0])
+    assert reason["classifier"] == RECOMMEND and reason["margin"] < router.min_margin
+    assert route == LLM
+
+
+def test_classifier_failure_falls_back_to_the_llm_route(monkeypatch):
+    def unavailable(texts):
+        raise ConnectionError("embeddings endpoint down")
+
+    monkeypatch.setattr(intent_router_module, "generate_embeddings", unavailable)
+    router = IntentRouter(EXAMPLES, min_margin=0.2)
+    router.warm_up()  # logs, doesn't raise
+    route, reason = router.route(["hi"], "hi", [0.0, 1.0, 0.0])
+    assert (route, reason["rules"], reason["classifier"], reason["margin"]) == (LLM, FOLLOW_UP, LLM, 0.0)
+
+
+def test_stats_count_routes_and_saved_calls(router):
+    router.route(["oily skin and acne"], "oily skin and acne", [1.0, 0.0, 0.0])
+    router.route(["hello"], "hello", [0.0, 1.0, 0.0])
+    router.route(["hello"], "what does retinol do", [0.0, 0.0, 1.0])
+    router.route(["hello"], "hello", [0.0, 0.0, 1.0])
+    stats = router.stats()
+    assert stats["turns"] == 4
+    assert {route: counts["turns"] for route, counts in stats["routes"].items()} == {
+        RECOMMEND: 1, FOLLOW_UP: 1, LLM: 2
+    }
+    assert stats["llm_calls_saved"] == 2
+    assert stats["llm_calls_saved_per_turn"] == 0.5
@@ -0,0 +1,34 @@
+import time
+
+import scripts.ingest_data
+from app.main import ingest_main
+from app.services.index_generations import IndexLocked
+from app.services.jobs import JobManager
+
+
+def _wait(job, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while job.is_active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_ingestion_locked_by_another_worker_is_skipped(monkeypatch):
+    def locked(**kwargs):
+        raise IndexLocked("Another process is building an index generation.")
+
+    monkeypatch.setattr(scripts.ingest_data, "main", locked)
+    job, created = JobManager("ingestion").submit(ingest_main, incremental=True)
+    assert created
+    assert _wait(job).status == "skipped"
+    assert job.error is None
+
+
+def test_other_errors_still_fail_the_job(monkeypatch):
+    def broken(**kwargs):
+        raise RuntimeError("catalogue missing")
+
+    monkeypatch.setattr(scripts.ingest_data, "main", broken)
+    job, _ = JobManager("ingestion").submit(ingest_main)
+    assert _wait(job).status == "failed"
+    assert job.error == "catalogue missing"
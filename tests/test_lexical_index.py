@@ -0,0 +1,90 @@
+import math
+
+import pytest
+
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+FIELDS = {"product_name": 3.0, "top_ingredients": 1.0}
+
+METADATAS = {
+    "serum": {"product_name": "Niacinamide Serum", "top_ingredients": "Niacinamide, Zinc"},
+    "cream": {"product_name": "Night Cream", "top_ingredients": "Niacinamide, Shea Butter, Ceramides"},
+    "toner": {"product_name": "Rose Toner", "top_ingredients": "Rose Water"},
+    "wash": {"product_name": "Face Wash", "top_ingredients": "Salicylic Acid, Tea Tree, Aloe Vera, Glycerin"},
+    "gel": {"product_name": "Aloe Gel", "top_ingredients": "Aloe Vera"},
+}
+
+
+@pytest.fixture(scope="module")
+def index():
+    return BM25Index(FIELDS).build(list(METADATAS), list(METADATAS.values()))
+
+
+def _ids(results):
+    return [doc_id for doc_id, _ in results]
+
+
+def test_tokenize_drops_stopwords_and_plural_s():
+    assert tokenize("What serums should I use for my pores?") == ["serum", "pore"]
+    assert tokenize("glass skin, ceramides and AHAs") == ["glass", "skin", "ceramide", "aha"]
+    assert tokenize(None) == []
+
+
+def test_name_matches_outrank_ingredient_matches(index):
+    assert _ids(index.search("niacinamide")) == ["serum", "cream"]
+
+
+def test_shorter_documents_rank_higher_for_the_same_match(index):
+    # "vera" appears once in each ingredient list; the gel's document is shorter.
+    assert _ids(index.search("vera")) == ["gel", "wash"]
+
+
+def test_rarer_terms_weigh_more(index):
+    # Niacinamide weighs more in the serum's name, but only the cream has shea.
+    assert _ids(index.search("shea niacinamide")) == ["cream", "serum"]
+
+
+def test_score_matches_the_okapi_formula(index):
+    (doc_id, score), = index.search("rose water")
+    assert doc_id == "toner"
+    count, k1, b = 5, 1.5, 0.75
+    lengths = {"serum": 8, "cream": 10, "toner": 8, "wash": 13, "gel": 8}
+    average = sum(lengths.values()) / count
+    idf = math.log(1 + (count - 1 + 0.5) / (1 + 0.5))
+
+    def term(frequency):
+        return idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * lengths["toner"] / average))
+
+    # "rose" appears in the name (weight 3) and the ingredients (weight 1); "water" only in the ingredients.
+    assert score == pytest.approx(term(4.0) + term(1.0), rel=1e-5)
+
+
+def test_no_match_filters_and_limits(index):
+    assert index.search("retinol") == []
+    assert index.search("") == []
+    assert _ids(index.search("niacinamide", allowed_ids={"cream", "toner"})) == ["cream"]
+    assert _ids(index.search("niacinamide aloe", n_results=1)) == ["serum"]
+
+
+def test_round_trip_keeps_results(index):
+    restored = BM25Index.from_dict(index.to_dict())
+    for query in ("niacinamide", "aloe vera", "rose water zinc"):
+        assert restored.search(query) == index.search(query)
+
+
+def test_reciprocal_rank_fusion_order():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert _ids(fused) == ["a", "c", "b"]
+    assert dict(fused)["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert dict(fused)["b"] == pytest.approx(1 / 62)
+
+
+def test_agreement_beats_a_single_first_place():
+    fused = reciprocal_rank_fusion([["x", "shared"], ["y", "shared"]], k=60)
+    assert _ids(fused) == ["shared", "x", "y"]
+
+
+def test_small_k_favours_top_ranks():
+    rankings = [["a", "b", "c", "d"], ["d", "c", "b", "a"], ["a"]]
+    assert _ids(reciprocal_rank_fusion(rankings, k=1))[0] == "a"
+    assert reciprocal_rank_fusion([]) == []
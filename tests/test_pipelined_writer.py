@@ -0,0 +1,72 @@
+import pytest
+
+import app.services.rag as rag
+from app.services.rag import PipelinedWriter
+
+
+class RecordingCollection:
+    def __init__(self, fail_on: str | None = None):
+        self.fail_on = fail_on
+        self.ids = []
+
+    def upsert(self, embeddings, metadatas, documents, ids):
+        if self.fail_on in ids:
+            raise RuntimeError("disk full")
+        self.ids.extend(ids)
+
+
+def _embed(texts):
+    if "poison" in texts:
+        raise RuntimeError("embedding failed")
+    return [[float(len(text))] for text in texts]
+
+
+def _batch(*names):
+    return list(names), [{"id": name} for name in names]
+
+
+@pytest.fixture(autouse=True)
+def stub_embeddings(monkeypatch):
+    monkeypatch.setattr(rag, "generate_embeddings", _embed)
+
+
+def _assert_stopped(writer):
+    for thread in writer._threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+
+def test_every_batch_is_written():
+    collection = RecordingCollection()
+    with PipelinedWriter(collection, depth=2) as writer:
+        for start in range(0, 10, 2):
+            writer.submit(*_batch(f"doc-{start}", f"doc-{start + 1}"))
+    assert writer.written == 10
+    assert collection.ids == [f"doc-{i}" for i in range(10)]
+    _assert_stopped(writer)
+
+
+def test_embedding_error_surfaces_and_stops_both_stages():
+    collection = RecordingCollection()
+    writer = PipelinedWriter(collection, depth=1)
+    with pytest.raises(RuntimeError, match="embedding failed"):
+        writer.submit(*_batch("a", "b"))
+        writer.submit(*_batch("poison"))
+        for _ in range(100):
+            writer.submit(*_batch("c"))
+        writer.close()
+    _assert_stopped(writer)
+    assert "poison" not in collection.ids and "c" not in collection.ids
+
+
+def test_write_error_surfaces_and_stops_both_stages():
+    collection = RecordingCollection(fail_on="b")
+    writer = PipelinedWriter(collection, depth=1)
+    with pytest.raises(RuntimeError, match="disk full"):
+        with writer:
+            writer.submit(*_batch("a"))
+            writer.submit(*_batch("b"))
+            for _ in range(100):
+                writer.submit(*_batch("c"))
+    _assert_stopped(writer)
+    assert collection.ids == ["a"]
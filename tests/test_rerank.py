@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.metrics import RERANK_RUNS
+from app.services.rerank import LLMScorer, LocalScorer, Reranker
+
+
+def _pair(name, benefits="", ingredients="", price=20.0, description=""):
+    return description or name, {
+        "id": name.lower().replace(" ", "-"),
+        "product_name": name,
+        "benefits": benefits,
+        "top_ingredients": ingredients,
+        "price": price,
+    }
+
+
+PAIRS = [
+    _pair("Rose Toner", "refreshes skin", "Rose Water"),
+    _pair("Hydrating Night Cream", "deep hydration for dry skin", "Hyaluronic Acid, Shea Butter", price=45.0),
+    _pair("Clarifying Serum", "controls oil and acne", "Niacinamide, Zinc"),
+    _pair("Gentle Cleanser", "cleans without stripping", "Glycerin"),
+]
+
+
+def _names(pairs):
+    return [metadata["product_name"] for _, metadata in pairs]
+
+
+class StubScorer:
+    """A non-local scorer returning fixed scores, optionally after ``delay`` seconds or failing."""
+
+    name = "stub"
+
+    def __init__(self, scores, delay=0.0, error=None):
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.delay = delay
+        self.error = error
+        self.finished = threading.Event()
+
+    def score(self, query, pairs, constraints, history=""):
+        if self.delay:
+            self.finished.wait(self.delay)
+        if self.error:
+            raise self.error
+        return self.scores
+
+    async def ascore(self, query, pairs, constraints, history=""):
+        await asyncio.sleep(self.delay)
+        return self.score(query, pairs, constraints, history)
+
+
+def test_local_scorer_prefers_lexical_matches():
+    ranked = Reranker(LocalScorer(), budget_ms=100).rerank("serum for acne with niacinamide", PAIRS)
+    assert _names(ranked)[0] == "Clarifying Serum"
+
+
+def test_local_scorer_applies_constraints():
+    constraints = {"max_price": 30, "include_ingredients": ["glycerin"]}
+    scores = LocalScorer().score("something gentle", PAIRS, constraints)
+    assert int(np.argmax(scores)) == 3
+    # Over budget and without the ingredient: the night cream scores lowest.
+    assert int(np.argmin(scores)) == 1
+
+
+def test_local_scorer_keeps_retrieval_order_without_signal():
+    ranked = Reranker(LocalScorer(), budget_ms=100).rerank("xyz", PAIRS, top_k=3)
+    assert _names(ranked) == _names(PAIRS[:3])
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        '[{"product_name": "Rose Toner", "relevance_score": 2}, {"product_name": "clarifying serum", "relevance_score": 9}]',
+        '```json\n{"scores": [{"product_name": "Rose Toner", "relevance_score": 2},'
+        ' {"product_name": "Clarifying Serum ", "relevance_score": "9"}]}\n```',
+    ],
+)
+def test_llm_scores_are_mapped_back_to_candidates(response):
+    scores = LLMScorer._parse(response, PAIRS)
+    assert scores.tolist() == [2.0, 0.0, 9.0, 0.0]
+
+
+def test_llm_scores_accept_a_fence_surrounded_by_whitespace():
+    response = '\n```json\n[{"product_name": "Gentle Cleanser", "relevance_score": 7}]\n```\n'
+    assert LLMScorer._parse(response, PAIRS).tolist() == [0.0, 0.0, 0.0, 7.0]
+
+
+@pytest.mark.parametrize("response", ["not json", "null", '{"scores": []}', '[{"product_name": "Unknown", "relevance_score": 5}]'])
+def test_llm_response_without_usable_scores_raises(response):
+    with pytest.raises(ValueError):
+        LLMScorer._parse(response, PAIRS)
+
+
+def test_scorer_result_orders_and_local_breaks_ties():
+    reranker = Reranker(StubScorer([5, 9, 5, 1]), budget_ms=1000)
+    ranked = reranker.rerank("serum for acne", PAIRS, top_k=3)
+    assert _names(ranked) == ["Hydrating Night Cream", "Clarifying Serum", "Rose Toner"]
+
+
+def test_budget_exceeded_falls_back_to_the_local_order():
+    scorer = StubScorer([9, 8, 7, 6], delay=2.0)
+    before = RERANK_RUNS.value(scorer="stub", outcome="budget_exceeded")
+    ranked = Reranker(scorer, budget_ms=20).rerank("serum for acne with niacinamide", PAIRS)
+    scorer.finished.set()
+    assert _names(ranked)[0] == "Clarifying Serum"
+    assert RERANK_RUNS.value(scorer="stub", outcome="budget_exceeded") == before + 1
+
+
+def test_async_budget_exceeded_falls_back_to_the_local_order():
+    scorer = StubScorer([9, 8, 7, 6], delay=0.5)
+    ranked = asyncio.run(Reranker(scorer, budget_ms=20).arerank("serum for acne with niacinamide", PAIRS))
+    assert _names(ranked)[0] == "Clarifying Serum"
+
+
+def test_scorer_error_falls_back_to_the_local_order():
+    before = RERANK_RUNS.value(scorer="stub", outcome="error")
+    reranker = Reranker(StubScorer([9, 8, 7, 6], error=ValueError("bad reply")), budget_ms=1000)
+    ranked = reranker.rerank("serum for acne with niacinamide", PAIRS)
+    assert _names(ranked)[0] == "Clarifying Serum"
+    assert RERANK_RUNS.value(scorer="stub", outcome="error") == before + 1
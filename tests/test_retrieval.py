@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+import app.services.constraints as constraints_module
+import app.services.rag as rag
+import app.utils.pipeline as pipeline
+from app.models.schemas import ConversationState
+from app.services.constraints import FacetIndex
+from app.services.lexical_index import IndexRegistry
+from app.services.rag import RetrievalService
+from app.services.vector_store import NumpyVectorStoreClient
+
+PRODUCTS = {
+    "cheap-serum": ("Niacinamide Serum", 15.0, [1.0, 0.0]),
+    "pricey-serum": ("Vitamin C Serum", 60.0, [0.9, 0.1]),
+    "toner": ("Rose Toner", 12.0, [0.0, 1.0]),
+}
+ARTICLES = {"oily-skin-guide": [1.0, 0.05], "dry-skin-guide": [0.0, 1.0]}
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return [1.0, 0.0]
+
+    async def acall(self, text):
+        return self(text)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    client = NumpyVectorStoreClient()
+    products = client.get_or_create_collection("skincare")
+    products.upsert(
+        list(PRODUCTS),
+        [vector for _, _, vector in PRODUCTS.values()],
+        [{"id": key, "product_name": name, "price": price, "category": "serum"}
+         for key, (name, price, _) in PRODUCTS.items()],
+        [name for name, _, _ in PRODUCTS.values()],
+    )
+    articles = client.get_or_create_collection("skincare_combined")
+    articles.upsert(list(ARTICLES), list(ARTICLES.values()), [{"id": key} for key in ARTICLES], list(ARTICLES))
+    facets = IndexRegistry(str(tmp_path), FacetIndex, suffix=".facets")
+    facets.build("skincare", products)
+    monkeypatch.setattr(constraints_module, "facet_indexes", facets)
+    monkeypatch.setattr(rag.lexical_indexes, "get", lambda name: None)
+    return RetrievalService(client)
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    embedder = CountingEmbedder()
+    monkeypatch.setattr(rag, "generate_embedding", embedder)
+    monkeypatch.setattr(rag, "agenerate_embedding", embedder.acall)
+    return embedder
+
+
+def test_query_many_embeds_once_and_filters_per_collection(service, embedder):
+    results = service.query_many(
+        "serum for oily skin",
+        {"skincare_combined": 1, "skincare": 3},
+        constraints={"skincare": {"max_price": 20}},
+    )
+    assert embedder.calls == ["serum for oily skin"]
+    assert results["skincare_combined"]["ids"] == [["oily-skin-guide"]]
+    assert results["skincare"]["ids"] == [["cheap-serum", "toner"]]
+
+
+def test_aquery_many_matches_query_many(service, embedder):
+    n_results = {"skincare_combined": 2, "skincare": 2}
+    expected = service.query_many("serum", n_results)
+    results = asyncio.run(service.aquery_many("serum", n_results))
+    assert {name: result["ids"] for name, result in results.items()} == {
+        name: result["ids"] for name, result in expected.items()
+    }
+    assert len(embedder.calls) == 2
+
+
+def test_query_many_failures(service, embedder):
+    n_results = {"skincare_combined": 1, "missing": 1}
+    with pytest.raises(ValueError):
+        service.query_many("serum", n_results)
+    results = service.query_many("serum", n_results, return_exceptions=True)
+    assert isinstance(results["missing"], ValueError)
+    assert results["skincare_combined"]["ids"] == [["oily-skin-guide"]]
+    results = asyncio.run(service.aquery_many("serum", n_results, return_exceptions=True))
+    assert isinstance(results["missing"], ValueError)
+
+
+@pytest.fixture
+def analyze(service, embedder, monkeypatch):
+    monkeypatch.setattr(pipeline, "retrieval_service", service)
+    monkeypatch.setattr(pipeline.settings, "SPECULATIVE_RETRIEVAL", True)
+    monkeypatch.setattr(pipeline.settings, "RERANK_ENABLED", False)
+    monkeypatch.setattr(pipeline.settings, "PRODUCT_N_RESULTS", 2)
+    reply = {"text": '{"is_follow_up": false, "answer": ""}'}
+
+    def cached_ask_ai(cache, key_text, doc_ids, messages):
+        assert doc_ids == ["oily-skin-guide", "dry-skin-guide"]
+        return reply["text"]
+
+    async def acached_ask_ai(cache, key_text, doc_ids, messages, stream_event=None):
+        return cached_ask_ai(cache, key_text, doc_ids, messages)
+
+    monkeypatch.setattr(pipeline, "cached_ask_ai", cached_ask_ai)
+    monkeypatch.setattr(pipeline, "acached_ask_ai", acached_ask_ai)
+    return reply
+
+
+def _state(query="serum under $20"):
+    return ConversationState(conversation=[{"role": "user", "content": query}], query=query)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_analyze_query_prefetches_products_with_the_same_embedding(analyze, embedder, use_async):
+    if use_async:
+        state = asyncio.run(pipeline.aanalyze_query(_state()))
+    else:
+        state = pipeline.analyze_query(_state())
+    assert embedder.calls == ["serum under $20"]
+    assert state.ready_for_recommendation
+    assert [metadata["id"] for _, metadata in state.prefetched_documents] == ["cheap-serum", "toner"]
+
+
+def test_prefetch_is_dropped_when_a_follow_up_is_needed(analyze):
+    analyze["text"] = '{"is_follow_up": true, "answer": "What is your skin type?"}'
+    state = pipeline.analyze_query(_state())
+    assert state.prefetched_documents == []
+
+
+def test_failed_prefetch_does_not_fail_the_turn(analyze, service, monkeypatch):
+    query = service.query
+
+    def query_without_products(name, *args, **kwargs):
+        if name == "skincare":
+            raise ConnectionError("vector store unavailable")
+        return query(name, *args, **kwargs)
+
+    monkeypatch.setattr(service, "query", query_without_products)
+    state = pipeline.analyze_query(_state())
+    assert state.ready_for_recommendation and state.prefetched_documents == []
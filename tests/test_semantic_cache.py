@@ -0,0 +1,105 @@
+import app.services.semantic_cache as semantic_cache_module
+from app.services.semantic_cache import SemanticCache, digest_ids
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, **kwargs) -> tuple[SemanticCache, Clock]:
+    clock = Clock()
+    monkeypatch.setattr(semantic_cache_module.time, "time", clock)
+    options = {"threshold": 0.95, "ttl_seconds": 60, "max_entries": 10} | kwargs
+    return SemanticCache("test", **options), clock
+
+
+def test_similar_query_hits_and_dissimilar_query_misses(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    digest = digest_ids(["a", "b"])
+    cache.store([1.0, 0.0], digest, "cached answer", llm_latency=0.5)
+
+    assert cache.lookup([0.99, 0.05], digest) == "cached answer"  # cosine ~0.999
+    assert cache.lookup([0.6, 0.8], digest) is None  # cosine 0.6
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["latency_saved_seconds"]) == (1, 1, 0.5)
+
+
+def test_different_retrieved_documents_miss():
+    cache = SemanticCache("test", threshold=0.95, ttl_seconds=60, max_entries=10)
+    cache.store([1.0, 0.0], digest_ids(["a", "b"]), "cached answer")
+
+    assert digest_ids(["a", "b"]) != digest_ids(["b", "a"])
+    assert cache.lookup([1.0, 0.0], digest_ids(["b", "a"])) is None
+    assert cache.lookup([1.0, 0.0], digest_ids(["a", "c"])) is None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    cache, clock = _cache(monkeypatch)
+    digest = digest_ids(["a"])
+    cache.store([1.0, 0.0], digest, "old")
+    clock.now += 30
+    cache.store([0.0, 1.0], digest, "newer")
+
+    clock.now += 31
+    assert cache.lookup([1.0, 0.0], digest) is None
+    assert cache.lookup([0.0, 1.0], digest) == "newer"
+
+    cache.store([1.0, 1.0], digest, "newest")
+    assert cache.stats()["entries"] == 2  # the expired entry was purged on store
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entries=2)
+    digest = digest_ids(["a"])
+    cache.store([1.0, 0.0, 0.0], digest, "first")
+    cache.store([0.0, 1.0, 0.0], digest, "second")
+    assert cache.lookup([1.0, 0.0, 0.0], digest) == "first"
+
+    cache.store([0.0, 0.0, 1.0], digest, "third")
+
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup([0.0, 1.0, 0.0], digest) is None
+    assert cache.lookup([1.0, 0.0, 0.0], digest) == "first"
+    assert cache.lookup([0.0, 0.0, 1.0], digest) == "third"
+
+
+def test_near_miss_queries_get_different_digests():
+    from app.services.intent_router import profile_terms
+
+    def digest(query):
+        return digest_ids(["a", "b"], profile_terms(query))
+
+    assert digest("serum for oily skin") != digest("serum for dry skin")
+    assert digest("shampoo for dandruff") != digest("shampoo for hair loss")
+    assert digest("serum for oily skin") == digest("Any good serums for Oily skin?")
+    assert digest("a gentle serum") == digest_ids(["a", "b"])
+
+
+def test_near_miss_query_misses_even_with_an_identical_embedding():
+    from app.services.intent_router import profile_terms
+
+    cache = SemanticCache("test", threshold=0.95, ttl_seconds=60, max_entries=10)
+    cache.store([1.0, 0.0], digest_ids(["a"], profile_terms("serum for oily skin")), "oily")
+
+    assert cache.lookup([1.0, 0.0], digest_ids(["a"], profile_terms("serum for dry skin"))) is None
+    assert cache.lookup([1.0, 0.0], digest_ids(["a"], profile_terms("oily skin serum"))) == "oily"
+
+
+def test_reloading_the_pipelines_clears_the_semantic_caches():
+    from app.utils.pipeline import reload_pipelines
+
+    caches = (
+        semantic_cache_module.analyze_query_cache,
+        semantic_cache_module.recommendation_cache,
+        semantic_cache_module.rerank_cache,
+    )
+    for cache in caches:
+        cache.store([1.0, 0.0], digest_ids(["a"]), "stale")
+
+    reload_pipelines()
+
+    assert all(cache.lookup([1.0, 0.0], digest_ids(["a"])) is None for cache in caches)
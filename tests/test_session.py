@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import app.services.session as session_module
+from app.services.session import HistoryManager, asummarize_session, encode_turn
+from app.services.session_store import MemorySessionStore
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word; each message adds 4 tokens of framing on top.
+    monkeypatch.setattr(session_module, "count_tokens", lambda text: len(text.split()))
+
+
+def _turn(role, words):
+    return {"role": role, "content": " ".join(["w"] * words)}
+
+
+def _turns(count, words=6):
+    return [_turn("user" if i % 2 == 0 else "assistant", words) for i in range(count)]  # 10 tokens each
+
+
+def test_fit_keeps_turns_up_to_the_budget_boundary():
+    history = _turns(5)
+    assert HistoryManager(30, 2).fit(history) == history[-3:]  # exactly 30 tokens
+    assert HistoryManager(29, 2).fit(history) == history[-2:]
+    assert HistoryManager(50, 2).fit(history) == history
+
+
+def test_fit_keeps_the_summary_and_charges_it_to_the_budget():
+    summary = HistoryManager.summary_message("s")  # 6 + 4 tokens
+    history = [summary, *_turns(4)]
+    assert HistoryManager(40, 2).fit(history) == [summary, *history[-3:]]
+    assert HistoryManager(39, 2).fit(history) == [summary, *history[-2:]]
+
+
+def test_fit_keeps_the_latest_turn_even_when_it_alone_exceeds_the_budget():
+    oversized = _turn("user", 100)
+    assert HistoryManager(30, 2).fit([*_turns(2), oversized]) == [oversized]
+
+
+def test_fit_stops_at_an_oversized_older_turn():
+    history = [_turn("user", 2), _turn("assistant", 100), *_turns(2)]
+    assert HistoryManager(40, 2).fit(history) == history[-2:]
+
+
+def test_turns_to_summarize_keeps_the_recent_turns():
+    history = _turns(8)
+    assert HistoryManager(80, 3).turns_to_summarize(history) == 0  # exactly at budget
+    assert HistoryManager(79, 3).turns_to_summarize(history) == 5
+    assert HistoryManager(10, 10).turns_to_summarize(history) == 0  # nothing older than the kept turns
+
+
+def test_turns_to_summarize_counts_the_summary_against_the_budget():
+    history = [HistoryManager.summary_message("s"), *_turns(3)]
+    assert HistoryManager(40, 1).turns_to_summarize(history) == 0
+    assert HistoryManager(39, 1).turns_to_summarize(history) == 2
+
+
+def test_summary_rolls_over_into_the_next_summary(monkeypatch):
+    store = MemorySessionStore(ttl_seconds=60, max_turns=100, max_sessions=10)
+    monkeypatch.setattr(session_module, "session_store", store)
+    monkeypatch.setattr(session_module, "history_manager", HistoryManager(30, 2))
+    calls = []
+
+    async def summarizer(previous, turns):
+        calls.append((previous, [turn["content"] for turn in turns]))
+        return f"{previous}+{len(turns)}"
+
+    def history():
+        return session_module._history_from(*store.load("s1"))
+
+    turns = [{"role": "user", "content": f"turn {i} w w w"} for i in range(8)]
+    store.append("s1", [encode_turn(turn) for turn in turns[:5]])
+    asyncio.run(asummarize_session("s1", history(), summarizer))
+    assert history() == [HistoryManager.summary_message("+3"), *turns[3:5]]
+
+    store.append("s1", [encode_turn(turn) for turn in turns[5:]])
+    asyncio.run(asummarize_session("s1", history(), summarizer))
+
+    assert calls == [
+        ("", ["turn 0 w w w", "turn 1 w w w", "turn 2 w w w"]),
+        ("+3", ["turn 3 w w w", "turn 4 w w w", "turn 5 w w w"]),
+    ]
+    assert history() == [HistoryManager.summary_message("+3+3"), *turns[6:]]
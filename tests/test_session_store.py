@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.metrics import SESSION_TURNS_DROPPED
+from app.services.session_store import MemorySessionStore, WriteBehindSessionStore
+
+
+class FailingStore(MemorySessionStore):
+    """Memory store whose writes fail until ``down`` is cleared."""
+
+    def __init__(self):
+        super().__init__(ttl_seconds=60, max_turns=1000, max_sessions=100)
+        self.down = True
+
+    def append_many(self, batch: dict):
+        if self.down:
+            raise ConnectionError("store unavailable")
+        super().append_many(batch)
+
+    def append(self, session_id: str, turns: list):
+        if self.down:
+            raise ConnectionError("store unavailable")
+        super().append(session_id, turns)
+
+
+def _write_behind(inner, **options):
+    # A long interval: the tests flush explicitly.
+    return WriteBehindSessionStore(inner, flush_interval=3600, **options)
+
+
+def test_failed_flush_keeps_turns_for_the_next_round():
+    inner = FailingStore()
+    store = _write_behind(inner)
+    store.append("s1", ["a", "b"])
+    store.flush()
+    store.append("s1", ["c"])
+    assert store.load("s1")[0] == ["a", "b", "c"]
+
+    inner.down = False
+    store.flush()
+    assert inner.load("s1")[0] == ["a", "b", "c"]
+    store.close()
+
+
+def test_failed_compaction_keeps_pending_turns():
+    inner = FailingStore()
+    store = _write_behind(inner)
+    store.append("s1", ["a", "b", "c"])
+    with pytest.raises(ConnectionError):
+        store.compact("s1", "summary of a", 1)
+    assert store.load("s1") == (["a", "b", "c"], None)
+
+    inner.down = False
+    store.compact("s1", "summary of a", 1)
+    assert inner.load("s1") == (["b", "c"], "summary of a")
+    store.close()
+
+
+async def _acompact(store, *args):
+    await store.acompact(*args)
+
+
+def test_failed_async_compaction_keeps_pending_turns():
+    inner = FailingStore()
+    store = _write_behind(inner)
+    store.append("s1", ["a", "b"])
+    with pytest.raises(ConnectionError):
+        asyncio.run(_acompact(store, "s1", "summary", 1))
+    inner.down = False
+    store.flush()
+    assert inner.load("s1")[0] == ["a", "b"]
+    store.close()
+
+
+def test_buffer_is_capped_while_the_store_is_down():
+    inner = FailingStore()
+    store = _write_behind(inner, max_pending=2, max_buffered=4)
+    dropped_before = SESSION_TURNS_DROPPED.value()
+    for i in range(5):
+        store.append(f"s{i}", [f"turn-{i}-a", f"turn-{i}-b"])
+        store.flush()
+
+    pending = [turn for i in range(5) for turn in store.load(f"s{i}")[0]]
+    assert pending == ["turn-3-a", "turn-3-b", "turn-4-a", "turn-4-b"]
+    assert SESSION_TURNS_DROPPED.value() - dropped_before == 6
+
+    inner.down = False
+    store.close()
+    assert inner.load("s4")[0] == ["turn-4-a", "turn-4-b"]
+    assert inner.load("s0")[0] == []
+
+
+class SlowStore(MemorySessionStore):
+    """Memory store whose first batch write stalls, so a second flush can overtake it."""
+
+    def __init__(self):
+        super().__init__(ttl_seconds=60, max_turns=1000, max_sessions=100)
+        self.stalled = threading.Event()
+
+    def append_many(self, batch: dict):
+        if not self.stalled.is_set():
+            self.stalled.set()
+            time.sleep(0.2)
+        super().append_many(batch)
+
+
+def test_concurrent_flushes_keep_a_sessions_turns_in_order():
+    inner = SlowStore()
+    store = _write_behind(inner)
+    store.append("s1", ["a"])
+    first = threading.Thread(target=store.flush)
+    first.start()
+    inner.stalled.wait(timeout=5)
+    store.append("s1", ["b"])
+    store.flush()
+    first.join()
+
+    assert inner.load("s1")[0] == ["a", "b"]
+    store.close()
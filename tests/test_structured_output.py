@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+import app.utils.pipeline as pipeline
+from app.models.schemas import ConversationState, FollowUpDecision
+from app.services.metrics import STRUCTURED_OUTPUT_FAILURES
+from app.utils.pipeline import (
+    FALLBACK_FOLLOW_UP,
+    StructuredOutputError,
+    _parse_json_response,
+    ask_ai_structured,
+    follow_up,
+)
+
+VALID = json.dumps(
+    {"ready_for_recommendation": True, "optimized_query": "serum for oily skin", "follow_up_question": ""}
+)
+INVALID = '{"optimized_query": "serum"}'  # ready_for_recommendation is required
+
+
+class ScriptedLLM:
+    """Replies from a fixed script and records the messages of every call."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def __call__(self, messages, json_mode=False):
+        assert json_mode
+        self.calls.append(messages)
+        return self.replies.pop(0)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    def install(*replies, retries=1):
+        scripted = ScriptedLLM(*replies)
+        monkeypatch.setattr(pipeline, "ask_ai", scripted)
+
+        async def aask_ai(messages, json_mode=False):
+            return scripted(messages, json_mode=json_mode)
+
+        monkeypatch.setattr(pipeline, "aask_ai", aask_ai)
+        monkeypatch.setattr(pipeline.settings, "STRUCTURED_OUTPUT_RETRIES", retries)
+        return scripted
+
+    return install
+
+
+def _failures(outcome: str) -> float:
+    return STRUCTURED_OUTPUT_FAILURES.value(operation="other", outcome=outcome)
+
+
+def _state() -> ConversationState:
+    return ConversationState(conversation=[{"role": "user", "content": "skin"}], query="skin")
+
+
+def test_invalid_reply_is_repaired_on_retry(llm):
+    scripted = llm(INVALID, VALID)
+    retried = _failures("retried")
+    decision = ask_ai_structured([{"role": "user", "content": "hi"}], FollowUpDecision)
+    assert decision.optimized_query == "serum for oily skin"
+    assert _failures("retried") == retried + 1
+    # The retry carries the invalid reply and the validation error back to the model.
+    repair = scripted.calls[1]
+    assert repair[-2] == {"role": "assistant", "content": INVALID}
+    assert "ready_for_recommendation" in repair[-1]["content"]
+
+
+def test_exhausted_retries_raise(llm):
+    scripted = llm("not json", INVALID, INVALID, retries=2)
+    with pytest.raises(StructuredOutputError):
+        ask_ai_structured([{"role": "user", "content": "hi"}], FollowUpDecision)
+    assert len(scripted.calls) == 3
+
+
+def test_follow_up_falls_back_to_a_generic_question(llm):
+    llm(INVALID, "```json\nnot json\n```")
+    fallback = _failures("fallback")
+    state = follow_up(_state())
+    assert _failures("fallback") == fallback + 1
+    assert state.follow_up_question == FALLBACK_FOLLOW_UP.follow_up_question
+    assert state.is_follow_up and not state.ready_for_recommendation
+    assert state.recommendation_query == "skin"
+
+
+def test_async_follow_up_retries_then_falls_back(llm):
+    scripted = llm(INVALID, INVALID)
+    state = asyncio.run(pipeline.afollow_up(_state()))
+    assert len(scripted.calls) == 2
+    assert state.follow_up_question == FALLBACK_FOLLOW_UP.follow_up_question
+
+
+def test_follow_up_applies_a_valid_decision(llm):
+    llm(VALID)
+    state = follow_up(_state())
+    assert state.ready_for_recommendation and state.follow_up_question == ""
+    assert state.recommendation_query == "serum for oily skin"
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        '{"is_follow_up": true, "answer": "Which skin type?"}',
+        '```json\n{"is_follow_up": true, "answer": "Which skin type?"}\n```',
+        '\n```json\n{"is_follow_up": true, "answer": "Which skin type?"}\n```\n',
+        '```\n{"is_follow_up": true, "answer": "Which skin type?"}\n```',
+    ],
+)
+def test_parse_json_response_accepts_fenced_replies(response):
+    parsed = _parse_json_response(response, "analyze_query", {})
+    assert parsed == {"is_follow_up": True, "answer": "Which skin type?"}
+
+
+def test_parse_json_response_only_removes_the_fence():
+    # strip("```json") treated the fence as a character set and ate the "n" of a bare null.
+    assert _parse_json_response("null", "node", {"default": 1}) is None
+    assert _parse_json_response('```json\n["json", "no"]\n```', "node", {}) == ["json", "no"]
+
+
+def test_parse_json_response_falls_back_on_garbage():
+    assert _parse_json_response("Sure! Here you go.", "analyze_query", {"answer": ""}) == {"answer": ""}
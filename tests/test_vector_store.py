@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from app.services.vector_store import NumpyVectorStore, matches_where
+
+CATEGORIES = ["serum", "toner", "cleanser", "moisturizer"]
+
+WHERE_CLAUSES = [
+    None,
+    {"category": "serum"},
+    {"category": {"$in": ["serum", "toner"]}},
+    {"category": {"$nin": ["serum", "toner"]}},
+    {"price": {"$gte": 500}},
+    {"$and": [{"category": {"$in": ["serum", "cleanser"]}}, {"price": {"$lt": 700}}]},
+    {"$or": [{"category": "toner"}, {"price": {"$gte": 900}}]},
+    {"price": {"$gt": 10_000}},
+]
+
+
+@pytest.fixture(scope="module")
+def records():
+    rng = np.random.default_rng(7)
+    count = 60
+    return {
+        "ids": [f"doc-{i}" for i in range(count)],
+        "embeddings": rng.normal(size=(count, 8)).astype(np.float32).tolist(),
+        "metadatas": [
+            {"category": CATEGORIES[i % len(CATEGORIES)], "price": int(rng.integers(100, 1000))}
+            for i in range(count)
+        ],
+        "documents": [f"document {i}" for i in range(count)],
+    }
+
+
+@pytest.fixture(scope="module")
+def store(records):
+    store = NumpyVectorStore("products")
+    store.upsert(records["ids"], records["embeddings"], records["metadatas"], records["documents"])
+    return store
+
+
+@pytest.fixture(scope="module")
+def queries():
+    return np.random.default_rng(11).normal(size=(4, 8)).astype(np.float32).tolist()
+
+
+def _brute_force(records, query, where, k):
+    """Exact squared-L2 top k over the rows that pass ``where``."""
+    vectors = np.asarray(records["embeddings"], dtype=np.float64)
+    distances = ((vectors - np.asarray(query, dtype=np.float64)) ** 2).sum(axis=1)
+    rows = [row for row, metadata in enumerate(records["metadatas"]) if matches_where(metadata, where)]
+    rows.sort(key=lambda row: distances[row])
+    return [records["ids"][row] for row in rows[:k]], [distances[row] for row in rows[:k]]
+
+
+@pytest.mark.parametrize("where", WHERE_CLAUSES)
+def test_query_returns_the_exact_top_k(store, records, queries, where):
+    result = store.query(queries, n_results=5, where=where)
+    for query, ids, distances in zip(queries, result["ids"], result["distances"]):
+        expected_ids, expected_distances = _brute_force(records, query, where, 5)
+        assert ids == expected_ids
+        assert distances == pytest.approx(expected_distances, rel=1e-4, abs=1e-4)
+
+
+@pytest.mark.parametrize("where", WHERE_CLAUSES)
+def test_get_filters_like_the_query(store, records, where):
+    expected = [
+        doc_id for doc_id, metadata in zip(records["ids"], records["metadatas"]) if matches_where(metadata, where)
+    ]
+    assert store.get(where=where, include=[])["ids"] == expected
+
+
+@pytest.mark.parametrize("where", WHERE_CLAUSES)
+def test_matches_chroma(records, store, queries, where):
+    chromadb = pytest.importorskip("chromadb")
+    from chromadb.config import Settings as ChromaSettings
+
+    client = chromadb.EphemeralClient(settings=ChromaSettings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection("vector_store_parity")
+    collection.upsert(**records)
+    try:
+        expected = collection.query(query_embeddings=queries, n_results=5, where=where)
+        result = store.query(queries, n_results=5, where=where)
+        assert result["ids"] == expected["ids"]
+        for distances, expected_distances in zip(result["distances"], expected["distances"]):
+            assert distances == pytest.approx(expected_distances, rel=1e-3, abs=1e-3)
+    finally:
+        client.delete_collection("vector_store_parity")
+
+
+def test_query_includes_only_requested_fields(store, queries):
+    result = store.query(queries[:1], n_results=2, include=["documents"])
+    assert result["metadatas"] is None and result["distances"] is None
+    assert len(result["documents"][0]) == 2
+
+
+def test_query_sees_upserts_and_deletes():
+    store = NumpyVectorStore("products")
+    store.upsert(["a", "b"], [[0.0, 0.0], [1.0, 0.0]], [{"n": 1}, {"n": 2}], ["a", "b"])
+    assert store.query([[0.9, 0.0]], n_results=1)["ids"] == [["b"]]
+
+    store.upsert(["b"], [[5.0, 5.0]], [{"n": 2}], ["b"])
+    store.upsert(["c"], [[1.0, 0.1]], [{"n": 3}], ["c"])
+    assert store.query([[0.9, 0.0]], n_results=1)["ids"] == [["c"]]
+
+    store.delete(["c"])
+    assert store.query([[0.9, 0.0]], n_results=3)["ids"] == [["a", "b"]]